@@ -10,7 +10,14 @@ from app.ddb import get_document_item
 from app.ddb.documents import update_document_status
 from app.ddb.workflows import get_workflow_item, query_workflows, update_workflow_status
 from app.markdown import transform_markdown_images
-from app.s3 import generate_presigned_url, get_s3_client, get_segment_key_by_index, list_segment_keys, parse_s3_uri
+from app.s3 import (
+    generate_presigned_url,
+    get_s3_client,
+    get_segment_key_by_index,
+    get_segment_state,
+    list_segment_keys,
+    parse_s3_uri,
+)
 
 
 def _get_display_file_name(project_id: str, document_id: str, fallback_name: str) -> str:
@@ -39,7 +46,9 @@ def _get_segment_from_s3(file_uri: str, s3_key: str) -> dict | None:
         bucket, _ = parse_s3_uri(file_uri)
 
         response = s3.get_object(Bucket=bucket, Key=s3_key)
-        return json.loads(response["Body"].read().decode("utf-8"))
+        data = json.loads(response["Body"].read().decode("utf-8"))
+        data.update(get_segment_state(bucket, s3_key))
+        return data
     except Exception as e:
         print(f"Error getting segment from S3 {s3_key}: {e}")
         return None
@@ -1,7 +1,13 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
 from urllib.parse import urlparse
 
 import boto3
+from botocore.exceptions import ClientError
+
+# Segment fields stored as state sidecar objects (mirrors the workflow functions)
+SEGMENT_STATE_FIELDS = ("status", "error", "ai_analysis", "page_description", "graph_entities")
 
 
 def parse_s3_uri(uri: str) -> tuple[str, str]:
@@ -100,6 +106,41 @@ def get_segment_key_by_index(file_uri: str, segment_index: int) -> tuple[str, st
     return bucket, f"{prefix}{segment_index:04d}.json"
 
 
+def get_segment_state(bucket: str, segment_key: str) -> dict:
+    """Read state sidecar fields written next to a segment JSON.
+
+    Mutable fields (status, ai_analysis, ...) are stored as
+    analysis/state/segment_XXXX/{field}.json and take precedence over
+    the same fields in the segment document.
+
+    Args:
+        bucket: S3 bucket name
+        segment_key: Key of the segment JSON (.../analysis/segment_XXXX.json)
+
+    Returns:
+        Dict of state fields found (may be empty). A sidecar that is missing
+        or cannot be read is left out, so the document's value is used.
+    """
+    analysis_dir, file_name = segment_key.rsplit("/", 1)
+    prefix = f"{analysis_dir}/state/{file_name.removesuffix('.json')}/"
+    s3 = get_s3_client()
+
+    def _get(field: str):
+        try:
+            body = s3.get_object(Bucket=bucket, Key=f"{prefix}{field}.json")["Body"].read()
+            return field, json.loads(body.decode("utf-8"))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in ("NoSuchKey", "404"):
+                print(f"Error getting segment state {prefix}{field}.json: {e}")
+        except ValueError as e:
+            print(f"Invalid segment state {prefix}{field}.json: {e}")
+        return None
+
+    with ThreadPoolExecutor(max_workers=len(SEGMENT_STATE_FIELDS)) as executor:
+        found = list(executor.map(_get, SEGMENT_STATE_FIELDS))
+    return dict(item for item in found if item is not None)
+
+
 def list_segment_keys(file_uri: str) -> list[str]:
     """List all segment JSON file keys from S3.
 
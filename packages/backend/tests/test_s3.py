@@ -0,0 +1,71 @@
+import io
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+from botocore.exceptions import ClientError
+
+from app.s3 import get_segment_state
+
+SEGMENT_KEY = "projects/p/documents/d/analysis/segment_0003.json"
+STATE_PREFIX = "projects/p/documents/d/analysis/state/segment_0003/"
+
+
+def _client_error(code: str) -> ClientError:
+    return ClientError({"Error": {"Code": code, "Message": code}}, "GetObject")
+
+
+class TestGetSegmentState:
+    @pytest.fixture
+    def mock_s3(self):
+        with patch("app.s3.get_s3_client") as mock:
+            s3 = MagicMock()
+            mock.return_value = s3
+            yield s3
+
+    def _objects(self, mock_s3, objects: dict):
+        def get_object(Bucket, Key):
+            value = objects.get(Key[len(STATE_PREFIX) :])
+            if isinstance(value, Exception):
+                raise value
+            if value is None:
+                raise _client_error("NoSuchKey")
+            return {"Body": io.BytesIO(value.encode("utf-8"))}
+
+        mock_s3.get_object.side_effect = get_object
+
+    def test_reads_known_sidecar_keys(self, mock_s3):
+        self._objects(
+            mock_s3,
+            {
+                "status.json": json.dumps("completed"),
+                "ai_analysis.json": json.dumps([{"analysis_query": "q", "content": "a"}]),
+            },
+        )
+
+        state = get_segment_state("bucket", SEGMENT_KEY)
+
+        assert state == {"status": "completed", "ai_analysis": [{"analysis_query": "q", "content": "a"}]}
+        mock_s3.list_objects_v2.assert_not_called()
+        requested = {call.kwargs["Key"] for call in mock_s3.get_object.call_args_list}
+        assert STATE_PREFIX + "page_description.json" in requested
+
+    def test_no_sidecars(self, mock_s3):
+        self._objects(mock_s3, {})
+        assert get_segment_state("bucket", SEGMENT_KEY) == {}
+
+    def test_unreadable_sidecar_is_skipped(self, mock_s3):
+        self._objects(
+            mock_s3,
+            {
+                "status.json": json.dumps("analyzing"),
+                "ai_analysis.json": _client_error("AccessDenied"),
+                "error.json": "{not json",
+            },
+        )
+
+        assert get_segment_state("bucket", SEGMENT_KEY) == {"status": "analyzing"}
+
+    def test_null_value_is_kept(self, mock_s3):
+        self._objects(mock_s3, {"page_description.json": "null"})
+        assert get_segment_state("bucket", SEGMENT_KEY) == {"page_description": None}
@@ -67,6 +67,17 @@ export interface PaddleOcrEndpointProps {
    * SNS Topic for async inference failure notifications
    */
   errorTopic?: ITopic;
+  /**
+   * Models loaded when the container starts, as comma-separated
+   * "model[:lang]" entries (e.g. 'pp-ocrv5,pp-structurev3:korean')
+   * @default 'pp-ocrv5'
+   */
+  preloadModels?: string;
+  /**
+   * Maximum number of model/language pipelines kept loaded at once
+   * @default 3
+   */
+  maxLoadedModels?: number;
 }
 
 export class PaddleOcrEndpoint extends Construct {
@@ -137,6 +148,8 @@ export class PaddleOcrEndpoint extends Construct {
           TS_MAX_RESPONSE_SIZE: '104857600',
           SAGEMAKER_MODEL_SERVER_TIMEOUT: '3600',
           SAGEMAKER_MODEL_SERVER_WORKERS: '1',
+          OCR_PRELOAD_MODELS: props.preloadModels ?? 'pp-ocrv5',
+          OCR_MAX_LOADED_MODELS: String(props.maxLoadedModels ?? 3),
         },
       },
     });
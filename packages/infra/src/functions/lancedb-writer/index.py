@@ -3,8 +3,13 @@ import os
 
 import boto3
 
+from shared.embeddings import EmbeddingError, generate_embeddings
+
 lambda_client = None
 LANCEDB_FUNCTION_NAME = os.environ.get('LANCEDB_FUNCTION_NAME', 'idp-v2-lance-service')
+# Synchronous invoke payloads are limited to 6MB; keep each add_records call well below it
+ADD_RECORDS_MAX_BYTES = int(os.environ.get('ADD_RECORDS_MAX_BYTES', str(4 * 1024 * 1024)))
+ADD_RECORDS_MAX_RECORDS = int(os.environ.get('ADD_RECORDS_MAX_RECORDS', '25'))
 
 
 def get_lambda_client():
@@ -33,40 +38,100 @@ def invoke_lancedb(action: str, params: dict) -> dict:
     return result
 
 
-def handler(event, _context):
-    print(f'Event: {json.dumps(event)}')
+def build_record_params(message: dict) -> dict:
+    return {
+        'workflow_id': message.get('workflow_id'),
+        'document_id': message.get('document_id', ''),
+        'project_id': message.get('project_id', 'default'),
+        'segment_index': message.get('segment_index', 0),
+        'qa_index': message.get('qa_index', 0),
+        'question': message.get('question', ''),
+        'content_combined': message.get('content_combined', ''),
+        'language': message.get('language'),
+        'file_uri': message.get('file_uri', ''),
+        'file_type': message.get('file_type', ''),
+        'image_uri': message.get('image_uri', ''),
+        'created_at': message.get('created_at', '')
+    }
+
+
+def chunk_records(items: list[tuple[str, dict]]) -> list[list[tuple[str, dict]]]:
+    """Split (messageId, params) items into add_records-sized chunks.
+
+    A chunk holds at most ADD_RECORDS_MAX_RECORDS records whose serialized
+    size stays within ADD_RECORDS_MAX_BYTES. A record larger than the limit
+    gets a chunk of its own so it fails without taking others with it.
+    """
+    chunks = []
+    current = []
+    current_bytes = 0
+    for message_id, params in items:
+        size = len(json.dumps(params).encode('utf-8'))
+        if current and (len(current) >= ADD_RECORDS_MAX_RECORDS or current_bytes + size > ADD_RECORDS_MAX_BYTES):
+            chunks.append(current)
+            current = []
+            current_bytes = 0
+        current.append((message_id, params))
+        current_bytes += size
+    if current:
+        chunks.append(current)
+    return chunks
 
-    for record in event.get('Records', []):
-        try:
-            message = json.loads(record['body'])
-            workflow_id = message.get('workflow_id')
-            segment_index = message.get('segment_index', 0)
-            qa_index = message.get('qa_index', 0)
-
-            print(f'Processing message: workflow_id={workflow_id}, segment_index={segment_index}, qa_index={qa_index}')
-
-            result = invoke_lancedb('add_record', {
-                'workflow_id': workflow_id,
-                'document_id': message.get('document_id', ''),
-                'project_id': message.get('project_id', 'default'),
-                'segment_index': segment_index,
-                'qa_index': qa_index,
-                'question': message.get('question', ''),
-                'content_combined': message.get('content_combined', ''),
-                'language': message.get('language'),
-                'file_uri': message.get('file_uri', ''),
-                'file_type': message.get('file_type', ''),
-                'image_uri': message.get('image_uri', ''),
-                'created_at': message.get('created_at', '')
-            })
-
-            if result.get('statusCode') != 200:
-                raise Exception(result.get('error', 'Unknown error'))
-
-            print(f'Saved workflow {workflow_id}, segment {segment_index}, qa {qa_index} to LanceDB')
 
+def handler(event, _context):
+    """Write an SQS batch to LanceDB with add_records calls per project.
+
+    Each project's records are sent in size-bounded chunks. Failed messages
+    (a failed chunk or individual records within one) are reported via
+    batchItemFailures so only they are retried; the rest of the batch is
+    deleted from the queue.
+    """
+    records = event.get('Records', [])
+    print(f'Received {len(records)} messages')
+
+    failed_ids = []
+    pending = []  # (messageId, params)
+    for record in records:
+        try:
+            pending.append((record['messageId'], build_record_params(json.loads(record['body']))))
         except Exception as e:
-            print(f'Error processing message: {e}')
-            raise
-
-    return {'statusCode': 200, 'processed': len(event.get('Records', []))}
+            print(f'Error parsing message {record.get("messageId")}: {e}')
+            failed_ids.append(record.get('messageId'))
+
+    # Embed the whole batch at once via the shared content-hash cache.
+    # On failure the LanceDB service falls back to embedding per record.
+    try:
+        vectors = generate_embeddings([params['content_combined'] for _, params in pending])
+        for (_, params), vector in zip(pending, vectors):
+            params['vector'] = vector
+    except EmbeddingError as e:
+        print(f'[WARN] Batch embedding failed, deferring to LanceDB service: {e}')
+
+    by_project = {}
+    for message_id, params in pending:
+        by_project.setdefault(params['project_id'], []).append((message_id, params))
+
+    for project_id, items in by_project.items():
+        chunks = chunk_records(items)
+        for chunk_index, chunk in enumerate(chunks):
+            message_ids = [message_id for message_id, _ in chunk]
+            try:
+                result = invoke_lancedb('add_records', {
+                    'project_id': project_id,
+                    'records': [params for _, params in chunk],
+                })
+                if result.get('statusCode') != 200:
+                    raise Exception(result.get('error', 'Unknown error'))
+
+                for failure in result.get('failed', []):
+                    print(f'Failed to add {failure.get("qa_id")}: {failure.get("error")}')
+                    failed_ids.append(message_ids[failure['index']])
+
+                print(f'Saved {result.get("added", 0)}/{len(chunk)} records for project {project_id} '
+                      f'to LanceDB (chunk {chunk_index + 1}/{len(chunks)})')
+
+            except Exception as e:
+                print(f'Error writing project {project_id} chunk {chunk_index + 1}/{len(chunks)}: {e}')
+                failed_ids.extend(message_ids)
+
+    return {'batchItemFailures': [{'itemIdentifier': message_id} for message_id in failed_ids]}
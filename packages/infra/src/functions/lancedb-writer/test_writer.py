@@ -0,0 +1,95 @@
+"""Tests for chunked add_records calls.
+
+Usage:
+    python -m pytest test_writer.py -v
+"""
+import importlib.util
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+_spec = importlib.util.spec_from_file_location('lancedb_writer', os.path.join(os.path.dirname(__file__), 'index.py'))
+writer = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(writer)
+
+
+def _params(project_id='p1', content='text', vector_size=0):
+    return {
+        'project_id': project_id,
+        'content_combined': content,
+        'vector': [0.123456789] * vector_size,
+    }
+
+
+def _event(bodies):
+    return {'Records': [{'messageId': f'm{i}', 'body': json.dumps(body)} for i, body in enumerate(bodies)]}
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    monkeypatch.setattr(writer, 'ADD_RECORDS_MAX_RECORDS', 3)
+    monkeypatch.setattr(writer, 'ADD_RECORDS_MAX_BYTES', 1000)
+
+
+class TestChunkRecords:
+    def test_record_count_limit(self, limits):
+        items = [(f'm{i}', _params()) for i in range(7)]
+        chunks = writer.chunk_records(items)
+        assert [len(c) for c in chunks] == [3, 3, 1]
+        assert [m for c in chunks for m, _ in c] == [f'm{i}' for i in range(7)]
+
+    def test_byte_limit(self, limits):
+        items = [(f'm{i}', _params(content='x' * 400)) for i in range(3)]
+        chunks = writer.chunk_records(items)
+        assert [len(c) for c in chunks] == [2, 1]
+        for chunk in chunks:
+            assert sum(len(json.dumps(p)) for _, p in chunk) <= 1000
+
+    def test_oversized_record_gets_own_chunk(self, limits):
+        items = [('small1', _params()), ('big', _params(content='x' * 2000)), ('small2', _params())]
+        chunks = writer.chunk_records(items)
+        assert [[m for m, _ in c] for c in chunks] == [['small1'], ['big'], ['small2']]
+
+    def test_empty(self):
+        assert writer.chunk_records([]) == []
+
+    def test_default_limit_fits_invoke_payload(self):
+        # 50 messages with 1024-float vectors and large content stay under 6MB per call
+        items = [(f'm{i}', _params(content='x' * 200_000, vector_size=1024)) for i in range(50)]
+        for chunk in writer.chunk_records(items):
+            payload = json.dumps({'action': 'add_records', 'params': {'project_id': 'p1', 'records': [p for _, p in chunk]}})
+            assert len(payload.encode('utf-8')) < 6 * 1024 * 1024
+
+
+class TestHandler:
+    def test_only_failed_chunk_is_retried(self, limits, monkeypatch):
+        monkeypatch.setattr(writer, 'generate_embeddings', lambda texts: [[0.0] for _ in texts])
+        calls = []
+
+        def fake_invoke(action, params):
+            calls.append([r['content_combined'] for r in params['records']])
+            if len(calls) == 2:
+                return {'statusCode': 500, 'error': 'Payload too large'}
+            return {'statusCode': 200, 'added': len(params['records']), 'failed': []}
+
+        monkeypatch.setattr(writer, 'invoke_lancedb', fake_invoke)
+        result = writer.handler(_event([{'project_id': 'p1', 'content_combined': f'c{i}'} for i in range(7)]), None)
+
+        assert calls == [['c0', 'c1', 'c2'], ['c3', 'c4', 'c5'], ['c6']]
+        assert [f['itemIdentifier'] for f in result['batchItemFailures']] == ['m3', 'm4', 'm5']
+
+    def test_record_failures_map_to_chunk_messages(self, limits, monkeypatch):
+        monkeypatch.setattr(writer, 'generate_embeddings', lambda texts: [[0.0] for _ in texts])
+
+        def fake_invoke(action, params):
+            failed = [{'index': 1, 'qa_id': 'q', 'error': 'bad'}] if params['records'][0]['content_combined'] == 'c3' else []
+            return {'statusCode': 200, 'added': len(params['records']) - len(failed), 'failed': failed}
+
+        monkeypatch.setattr(writer, 'invoke_lancedb', fake_invoke)
+        result = writer.handler(_event([{'project_id': 'p1', 'content_combined': f'c{i}'} for i in range(5)]), None)
+
+        assert [f['itemIdentifier'] for f in result['batchItemFailures']] == ['m4']
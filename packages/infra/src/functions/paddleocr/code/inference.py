@@ -5,17 +5,28 @@ Supports:
 - PP-StructureV3: Document structure analysis with table detection
 - PaddleOCR-VL: Vision-language model for complex documents
 
-Models are downloaded on-demand and cached in S3 for reuse.
+Models are downloaded on-demand and cached in S3 for reuse. Loaded pipelines
+stay resident in an in-process registry keyed by model and language, and are
+evicted least-recently-used when host or GPU memory runs low.
+
+A request may carry several inputs (`s3_uris`). Pages are downloaded and
+decoded into arrays by a loader thread while the model works through the
+previous batch, so the GPU is not idle during S3 reads and PDF rendering.
 """
 import os
 import json
-import tempfile
+import gc
 import logging
+import queue
 import shutil
 import tarfile
+import threading
+import time
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterator, List, Optional, Tuple, Union
+from collections import OrderedDict
 import boto3
+import numpy as np
 from botocore.exceptions import ClientError
 
 logging.basicConfig(level=logging.INFO)
@@ -35,7 +46,24 @@ os.environ["DISABLE_MODEL_SOURCE_CHECK"] = "True"
 MODEL_CACHE_BUCKET = os.environ.get("MODEL_CACHE_BUCKET", "")
 MODEL_CACHE_PREFIX = os.environ.get("MODEL_CACHE_PREFIX", "paddleocr/models")
 
+# Model registry: comma-separated "model[:lang]" entries loaded in model_fn,
+# e.g. "pp-ocrv5:korean,pp-structurev3"
+OCR_PRELOAD_MODELS = os.environ.get("OCR_PRELOAD_MODELS", "")
+OCR_MAX_LOADED_MODELS = int(os.environ.get("OCR_MAX_LOADED_MODELS", "3"))
+# Evict idle models before a load when free memory falls below these
+OCR_MIN_FREE_HOST_MEMORY_MB = int(os.environ.get("OCR_MIN_FREE_HOST_MEMORY_MB", "4096"))
+OCR_MIN_FREE_GPU_MEMORY_MB = int(os.environ.get("OCR_MIN_FREE_GPU_MEMORY_MB", "6144"))
+
+# Batched inference (model_options.batch_size overrides OCR_BATCH_SIZE)
+OCR_BATCH_SIZE = int(os.environ.get("OCR_BATCH_SIZE", "8"))
+# Decoded batches buffered ahead of the model by the loader thread
+OCR_PREFETCH_BATCHES = int(os.environ.get("OCR_PREFETCH_BATCHES", "2"))
+# Same zoom PaddleX applies when it reads a PDF itself (2.0 = 144 DPI)
+PDF_RENDER_SCALE = float(os.environ.get("PDF_RENDER_SCALE", "2.0"))
+
 s3_client = None
+# Cache keys whose files are already on local disk (restored or uploaded)
+_local_cache_keys = set()
 
 
 def get_s3_client():
@@ -145,6 +173,11 @@ def upload_to_s3_cache(model_key: str) -> bool:
         return False
 
 
+def get_batch_size(options: Dict[str, Any] = None) -> int:
+    """Pages per inference batch: model_options.batch_size, else OCR_BATCH_SIZE."""
+    return max(1, int((options or {}).get("batch_size") or OCR_BATCH_SIZE))
+
+
 class BaseOCRModel(ABC):
     """Abstract base class for OCR models."""
 
@@ -166,14 +199,42 @@ class BaseOCRModel(ABC):
         pass
 
     @abstractmethod
-    def predict(self, image_path: str, options: Dict[str, Any] = None) -> List[Any]:
+    def predict(self, inputs: Union[str, List[np.ndarray]], options: Dict[str, Any] = None) -> List[Any]:
+        """Run the model on a file path or a batch of decoded page images (BGR arrays)."""
         pass
 
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def unload(self) -> None:
+        """Drop the loaded pipeline so its host and GPU memory can be reclaimed."""
+        self._model = None
+
+    def restore_cached_files(self) -> None:
+        """Restore model files from the S3 cache once per process and cache key."""
+        cache_key = self.cache_key
+        if cache_key in _local_cache_keys:
+            logger.info(f"Model files for {cache_key} already on local disk")
+            return
+
+        # Try to load from S3 cache first
+        if not s3_cache_exists(cache_key):
+            logger.info(f"No S3 cache found for {cache_key}, will download from HuggingFace")
+        else:
+            logger.info(f"Found S3 cache for {cache_key}, downloading...")
+            if download_from_s3_cache(cache_key):
+                _local_cache_keys.add(cache_key)
+
     def ensure_cached(self) -> None:
         """Ensure model is cached in S3 after first download."""
+        if self.cache_key in _local_cache_keys:
+            return
         if MODEL_CACHE_BUCKET and not s3_cache_exists(self.cache_key):
             logger.info(f"Caching {self.cache_key} to S3 for future use...")
-            upload_to_s3_cache(self.cache_key)
+            if not upload_to_s3_cache(self.cache_key):
+                return
+        _local_cache_keys.add(self.cache_key)
 
     def format_output(self, results: List[Any], output_format: str = "markdown") -> Dict[str, Any]:
         """Format the prediction results."""
@@ -228,6 +289,44 @@ class BaseOCRModel(ABC):
         return output
 
 
+def _points_to_bboxes(points: np.ndarray) -> List[List[Any]]:
+    """(n, 4, 2) corner points -> [[x_min, y_min, x_max, y_max], ...]."""
+    return np.concatenate([points.min(axis=1), points.max(axis=1)], axis=1).tolist()
+
+
+def _stacked_bboxes(rows: List[Any], is_poly: bool) -> List[List[Any]]:
+    """Vectorized bboxes for uniform geometry. Raises ValueError for ragged rows."""
+    values = np.asarray(rows)
+    if is_poly and values.ndim == 3 and values.shape[1:] == (4, 2):
+        return _points_to_bboxes(values)
+    if not is_poly and values.ndim == 2 and values.shape[1] == 4:
+        return values.tolist()
+    if not is_poly and values.ndim == 2 and values.shape[1] == 8:
+        return _points_to_bboxes(values.reshape(-1, 4, 2))
+    return [[] for _ in rows]
+
+
+def _text_bboxes(rec_polys: List[Any], rec_boxes: List[Any], count: int) -> List[List[Any]]:
+    """Axis-aligned bounding boxes for PP-OCRv5 text lines, one per rec_text.
+
+    rec_polys (4 corner points) take precedence over rec_boxes (4 or 8 values).
+    Lines without usable geometry get an empty bbox.
+    """
+    is_poly = bool(rec_polys)
+    rows = list((rec_polys if is_poly else rec_boxes or [])[:count])
+    try:
+        bboxes = _stacked_bboxes(rows, is_poly)
+    except ValueError:
+        # Ragged geometry cannot be stacked into one array; convert line by line
+        bboxes = []
+        for row in rows:
+            try:
+                bboxes.extend(_stacked_bboxes([row], is_poly))
+            except ValueError:
+                bboxes.append([])
+    return bboxes + [[] for _ in range(count - len(bboxes))]
+
+
 class PPOcrV5Model(BaseOCRModel):
     """PP-OCRv5: General-purpose OCR with high accuracy."""
 
@@ -249,14 +348,7 @@ class PPOcrV5Model(BaseOCRModel):
         lang = opts.get("lang") or None
         self._current_lang = lang
 
-        cache_key = self.cache_key
-
-        # Try to load from S3 cache first
-        if not s3_cache_exists(cache_key):
-            logger.info(f"No S3 cache found for {cache_key}, will download from HuggingFace")
-        else:
-            logger.info(f"Found S3 cache for {cache_key}, downloading...")
-            download_from_s3_cache(cache_key)
+        self.restore_cached_files()
 
         logger.info(f"Loading PP-OCRv5 model with lang={lang}...")
         from paddleocr import PaddleOCR
@@ -268,6 +360,7 @@ class PPOcrV5Model(BaseOCRModel):
         }
         if lang:
             ocr_kwargs["lang"] = lang
+        ocr_kwargs["text_recognition_batch_size"] = get_batch_size(opts)
 
         self._model = PaddleOCR(**ocr_kwargs)
         logger.info(f"PP-OCRv5 model loaded successfully")
@@ -275,12 +368,12 @@ class PPOcrV5Model(BaseOCRModel):
         # Cache to S3 if not already cached
         self.ensure_cached()
 
-    def predict(self, image_path: str, options: Dict[str, Any] = None) -> List[Any]:
+    def predict(self, inputs: Union[str, List[np.ndarray]], options: Dict[str, Any] = None) -> List[Any]:
         opts = options or {}
         requested_lang = opts.get("lang") or None
         if self._model is None or self._current_lang != requested_lang:
             self.load(options)
-        return self._model.predict(input=image_path)
+        return self._model.predict(input=inputs)
 
     def format_output(self, results: List[Any], output_format: str = "markdown") -> Dict[str, Any]:
         output = {"success": True, "format": output_format, "results": [], "content": "", "blocks": []}
@@ -297,29 +390,13 @@ class PPOcrV5Model(BaseOCRModel):
                 output["content"] = "\n".join(t for t in rec_texts if t.strip())
 
                 # Create synthetic blocks from PP-OCRv5 results
+                bboxes = _text_bboxes(rec_polys, rec_boxes, len(rec_texts))
                 for idx, text in enumerate(rec_texts):
-                    # Get bounding box from rec_polys or rec_boxes
-                    bbox = []
-                    if rec_polys and idx < len(rec_polys):
-                        poly = rec_polys[idx]
-                        if poly and len(poly) == 4:
-                            xs = [p[0] for p in poly]
-                            ys = [p[1] for p in poly]
-                            bbox = [min(xs), min(ys), max(xs), max(ys)]
-                    elif rec_boxes and idx < len(rec_boxes):
-                        box = rec_boxes[idx]
-                        if len(box) == 4:
-                            bbox = box
-                        elif len(box) == 8:
-                            xs = [box[i] for i in range(0, 8, 2)]
-                            ys = [box[i] for i in range(1, 8, 2)]
-                            bbox = [min(xs), min(ys), max(xs), max(ys)]
-
                     output["blocks"].append({
                         "block_id": idx,
                         "block_label": "text",
                         "block_content": text,
-                        "block_bbox": bbox,
+                        "block_bbox": bboxes[idx],
                         "block_order": idx,
                         "group_id": 0,
                     })
@@ -348,14 +425,7 @@ class PPStructureV3Model(BaseOCRModel):
         lang = opts.get("lang") or None
         self._current_lang = lang
 
-        cache_key = self.cache_key
-
-        # Try to load from S3 cache first
-        if not s3_cache_exists(cache_key):
-            logger.info(f"No S3 cache found for {cache_key}, will download from HuggingFace")
-        else:
-            logger.info(f"Found S3 cache for {cache_key}, downloading...")
-            download_from_s3_cache(cache_key)
+        self.restore_cached_files()
 
         logger.info(f"Loading PP-StructureV3 model with lang={lang}...")
         from paddleocr import PPStructureV3
@@ -366,6 +436,7 @@ class PPStructureV3Model(BaseOCRModel):
         }
         if lang:
             ocr_kwargs["lang"] = lang
+        ocr_kwargs["text_recognition_batch_size"] = get_batch_size(opts)
 
         self._model = PPStructureV3(**ocr_kwargs)
         logger.info(f"PP-StructureV3 model loaded successfully")
@@ -373,12 +444,12 @@ class PPStructureV3Model(BaseOCRModel):
         # Cache to S3 if not already cached
         self.ensure_cached()
 
-    def predict(self, image_path: str, options: Dict[str, Any] = None) -> List[Any]:
+    def predict(self, inputs: Union[str, List[np.ndarray]], options: Dict[str, Any] = None) -> List[Any]:
         opts = options or {}
         requested_lang = opts.get("lang") or None
         if self._model is None or self._current_lang != requested_lang:
             self.load(options)
-        return self._model.predict(input=image_path)
+        return self._model.predict(input=inputs)
 
     def format_output(self, results: List[Any], output_format: str = "markdown") -> Dict[str, Any]:
         output = {"success": True, "format": output_format, "results": [], "content": "", "blocks": []}
@@ -433,14 +504,7 @@ class PaddleOCRVLModel(BaseOCRModel):
         return "paddleocr-vl"
 
     def load(self, options: Dict[str, Any] = None) -> None:
-        cache_key = self.cache_key
-
-        # Try to load from S3 cache first
-        if not s3_cache_exists(cache_key):
-            logger.info(f"No S3 cache found for {cache_key}, will download from HuggingFace")
-        else:
-            logger.info(f"Found S3 cache for {cache_key}, downloading...")
-            download_from_s3_cache(cache_key)
+        self.restore_cached_files()
 
         logger.info("Loading PaddleOCR-VL model...")
         from paddleocr import PaddleOCRVL
@@ -450,10 +514,10 @@ class PaddleOCRVLModel(BaseOCRModel):
         # Cache to S3 if not already cached
         self.ensure_cached()
 
-    def predict(self, image_path: str, options: Dict[str, Any] = None) -> List[Any]:
+    def predict(self, inputs: Union[str, List[np.ndarray]], options: Dict[str, Any] = None) -> List[Any]:
         if self._model is None:
             self.load(options)
-        return self._model.predict(input=image_path)
+        return self._model.predict(input=inputs)
 
 
 MODEL_REGISTRY: Dict[str, type] = {
@@ -462,20 +526,289 @@ MODEL_REGISTRY: Dict[str, type] = {
     "paddleocr-vl": PaddleOCRVLModel,
 }
 
-_model_cache: Dict[str, BaseOCRModel] = {}
+LANGUAGE_AWARE_MODELS = {"pp-ocrv5", "pp-structurev3"}
 
 
-def get_model(model_name: str) -> BaseOCRModel:
-    """Get or create a model instance from the registry."""
-    if model_name not in MODEL_REGISTRY:
-        available = ", ".join(MODEL_REGISTRY.keys())
-        raise ValueError(f"Unknown model: {model_name}. Available: {available}")
+def registry_key(model_name: str, options: Dict[str, Any] = None) -> str:
+    """Registry key for a model/language pair.
 
-    if model_name not in _model_cache:
-        logger.info(f"Creating new instance of {model_name}")
-        _model_cache[model_name] = MODEL_REGISTRY[model_name]()
+    Matches the S3 cache key, plus a "-b{n}" suffix when the recognition batch
+    size differs from OCR_BATCH_SIZE (it is fixed when the pipeline is built).
+    """
+    if model_name not in LANGUAGE_AWARE_MODELS:
+        return model_name
+    lang = (options or {}).get("lang") or "default"
+    batch_size = get_batch_size(options)
+    if batch_size != OCR_BATCH_SIZE:
+        return f"{model_name}-{lang}-b{batch_size}"
+    return f"{model_name}-{lang}"
 
-    return _model_cache[model_name]
+
+def host_memory_available_mb() -> Optional[float]:
+    """MemAvailable from /proc/meminfo, in MB."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def gpu_memory_available_mb() -> Optional[float]:
+    """Unreserved memory on the current GPU, in MB (None without CUDA)."""
+    try:
+        import paddle
+        if not paddle.is_compiled_with_cuda() or paddle.device.cuda.device_count() == 0:
+            return None
+        total = paddle.device.cuda.get_device_properties().total_memory
+        return (total - paddle.device.cuda.memory_reserved()) / (1024 * 1024)
+    except Exception:
+        return None
+
+
+def release_memory() -> None:
+    """Collect dropped pipelines and return cached GPU blocks to the device."""
+    gc.collect()
+    try:
+        import paddle
+        if paddle.is_compiled_with_cuda():
+            paddle.device.cuda.empty_cache()
+    except Exception as e:
+        logger.warning(f"Failed to release GPU memory: {e}")
+
+
+class ModelRegistry:
+    """Loaded OCR pipelines kept resident across requests.
+
+    Entries are keyed by model, language and recognition batch size, so
+    switching between models or languages reuses already-loaded pipelines
+    instead of reloading them.
+    Before a new load, least-recently-used entries are evicted while the
+    registry is full or free host/GPU memory is below the configured minimum.
+    """
+
+    def __init__(self, max_models: int = OCR_MAX_LOADED_MODELS):
+        self._max_models = max(1, max_models)
+        self._models: "OrderedDict[str, BaseOCRModel]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.metrics: Dict[str, Any] = {"hits": 0, "loads": 0, "evictions": 0, "load_seconds": {}}
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            return list(self._models.keys())
+
+    def _memory_low(self) -> bool:
+        host = host_memory_available_mb()
+        if host is not None and host < OCR_MIN_FREE_HOST_MEMORY_MB:
+            return True
+        gpu = gpu_memory_available_mb()
+        return gpu is not None and gpu < OCR_MIN_FREE_GPU_MEMORY_MB
+
+    def _evict_one(self) -> None:
+        key, ocr_model = self._models.popitem(last=False)
+        ocr_model.unload()
+        release_memory()
+        self.metrics["evictions"] += 1
+        logger.info(f"Evicted {key} from model registry (host free: {host_memory_available_mb()} MB, "
+                    f"GPU free: {gpu_memory_available_mb()} MB)")
+
+    def _make_room(self) -> None:
+        while self._models and (len(self._models) >= self._max_models or self._memory_low()):
+            self._evict_one()
+
+    def get(self, model_name: str, options: Dict[str, Any] = None) -> Tuple[BaseOCRModel, Dict[str, Any]]:
+        """Return a loaded model and load info ({"key", "hit", "load_seconds"})."""
+        if model_name not in MODEL_REGISTRY:
+            available = ", ".join(MODEL_REGISTRY.keys())
+            raise ValueError(f"Unknown model: {model_name}. Available: {available}")
+
+        key = registry_key(model_name, options)
+        with self._lock:
+            ocr_model = self._models.get(key)
+            if ocr_model is not None and ocr_model.loaded:
+                self._models.move_to_end(key)
+                self.metrics["hits"] += 1
+                return ocr_model, {"key": key, "hit": True, "load_seconds": 0.0}
+
+            self._make_room()
+            logger.info(f"Loading {key} into model registry")
+            ocr_model = MODEL_REGISTRY[model_name]()
+            start = time.time()
+            ocr_model.load(options)
+            load_seconds = round(time.time() - start, 2)
+
+            self._models[key] = ocr_model
+            self.metrics["loads"] += 1
+            self.metrics["load_seconds"][key] = load_seconds
+            logger.info(f"Loaded {key} in {load_seconds:.2f}s (resident: {list(self._models.keys())}, "
+                        f"host free: {host_memory_available_mb()} MB, GPU free: {gpu_memory_available_mb()} MB)")
+            return ocr_model, {"key": key, "hit": False, "load_seconds": load_seconds}
+
+    def preload(self, spec: str) -> None:
+        """Load models listed as comma-separated "model[:lang]" entries."""
+        for entry in filter(None, (part.strip() for part in spec.split(","))):
+            model_name, _, lang = entry.partition(":")
+            options = {"batch_size": OCR_BATCH_SIZE}
+            if lang:
+                options["lang"] = lang
+            try:
+                self.get(model_name, options)
+            except Exception as e:
+                logger.warning(f"Failed to preload {entry}: {e}")
+
+
+_registry = ModelRegistry()
+
+
+def get_model(model_name: str, options: Dict[str, Any] = None) -> BaseOCRModel:
+    """Get a loaded model instance for the model/language from the registry."""
+    ocr_model, _ = _registry.get(model_name, options)
+    return ocr_model
+
+
+def parse_s3_uri(uri: str) -> Tuple[str, str]:
+    """Split s3://bucket/key into (bucket, key)."""
+    path = uri.replace("s3://", "", 1)
+    bucket, _, key = path.partition("/")
+    return bucket, key
+
+
+def decode_pages(s3_uri: str, page_indices: Optional[List[int]] = None) -> Iterator[Tuple[int, np.ndarray]]:
+    """Download an input into memory and yield (page_index, BGR image) pairs.
+
+    PDFs are rendered page by page with pypdfium2 (only `page_indices` when
+    given); multi-page TIFFs yield one image per frame; other formats are
+    decoded with OpenCV.
+    """
+    import cv2
+
+    bucket, key = parse_s3_uri(s3_uri)
+    body = get_s3_client().get_object(Bucket=bucket, Key=key)["Body"].read()
+    suffix = os.path.splitext(key)[1].lower()
+
+    if suffix == ".pdf":
+        import pypdfium2 as pdfium
+
+        doc = pdfium.PdfDocument(body)
+        try:
+            for page_idx in (page_indices if page_indices is not None else range(len(doc))):
+                page = doc[page_idx]
+                try:
+                    bitmap = page.render(scale=PDF_RENDER_SCALE)
+                    # pdfium renders BGR(A); copy out of the bitmap buffer before it is freed
+                    image = np.array(bitmap.to_numpy()[:, :, :3])
+                    bitmap.close()
+                finally:
+                    page.close()
+                yield page_idx, image
+        finally:
+            doc.close()
+        return
+
+    buffer = np.frombuffer(body, dtype=np.uint8)
+    if suffix in (".tif", ".tiff"):
+        ok, frames = cv2.imdecodemulti(buffer, cv2.IMREAD_COLOR)
+        if not ok or not frames:
+            raise ValueError(f"Unable to decode image: {s3_uri}")
+        for page_idx, frame in enumerate(frames):
+            yield page_idx, frame
+        return
+
+    image = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError(f"Unable to decode image: {s3_uri}")
+    yield 0, image
+
+
+_LOADER_DONE = object()
+
+
+def _page_loader(s3_uris: List[str], pages: queue.Queue, stop: threading.Event,
+                 page_indices: Optional[List[int]] = None) -> None:
+    """Loader thread: decode every page of every input into the queue."""
+    def _put(item) -> bool:
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    try:
+        for doc_idx, s3_uri in enumerate(s3_uris):
+            for page_idx, image in decode_pages(s3_uri, page_indices):
+                if not _put((doc_idx, page_idx, image)):
+                    return
+        _put(_LOADER_DONE)
+    except Exception as e:
+        logger.error(f"Page loader failed: {e}")
+        _put(e)
+
+
+def predict_batched(
+    ocr_model: BaseOCRModel,
+    s3_uris: List[str],
+    options: Dict[str, Any],
+    batch_size: int,
+    page_indices: Optional[List[int]] = None,
+) -> Iterator[Tuple[int, int, Any]]:
+    """Run the model over all pages of all inputs in fixed-size batches.
+
+    Yields (input_index, page_index, result) in input/page order. Decoding
+    runs in a background thread bounded to OCR_PREFETCH_BATCHES batches ahead.
+    """
+    pages: queue.Queue = queue.Queue(maxsize=batch_size * max(1, OCR_PREFETCH_BATCHES))
+    stop = threading.Event()
+    loader = threading.Thread(target=_page_loader, args=(s3_uris, pages, stop, page_indices), daemon=True)
+    loader.start()
+
+    def _run(batch: List[Tuple[int, int, np.ndarray]]) -> List[Tuple[int, int, Any]]:
+        results = list(ocr_model.predict([image for _, _, image in batch], options))
+        if len(results) != len(batch):
+            raise RuntimeError(f"Model returned {len(results)} results for a batch of {len(batch)} pages")
+        return [(doc_idx, page_idx, res) for (doc_idx, page_idx, _), res in zip(batch, results)]
+
+    try:
+        batch = []
+        while True:
+            item = pages.get()
+            if item is _LOADER_DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            batch.append(item)
+            if len(batch) >= batch_size:
+                yield from _run(batch)
+                batch = []
+        if batch:
+            yield from _run(batch)
+    finally:
+        stop.set()
+        loader.join(timeout=5)
+
+
+def build_page(ocr_model: BaseOCRModel, page_idx: int, res: Any) -> Dict[str, Any]:
+    """Format one model result as a page entry."""
+    page_output = ocr_model.format_output([res], output_format="markdown")
+
+    # Extract image dimensions from result data
+    width, height = None, None
+    if hasattr(res, "json"):
+        res_data = res.json.get("res", {})
+        width = res_data.get("width")
+        height = res_data.get("height")
+
+    return {
+        "page_index": page_idx,
+        "content": page_output.get("content", ""),
+        "blocks": page_output.get("blocks", []),
+        "width": width,
+        "height": height,
+        "results": page_output.get("results", [])
+    }
 
 
 # SageMaker Entry Points
@@ -504,6 +837,12 @@ def model_fn(model_dir):
         logger.warning(f"Failed to check Paddle GPU status: {e}")
 
     s3_client = boto3.client("s3")
+
+    if OCR_PRELOAD_MODELS:
+        logger.info(f"Preloading models: {OCR_PRELOAD_MODELS}")
+        _registry.preload(OCR_PRELOAD_MODELS)
+        logger.info(f"Preload complete: {_registry.metrics}")
+
     logger.info("OCR service initialized. Models will be loaded on demand with S3 caching.")
     return {"initialized": True, "model_dir": model_dir}
 
@@ -520,77 +859,72 @@ def predict_fn(input_data, model):
 
     Supports:
     - Single images (PNG, TIFF, JPEG)
-    - PDF files (PaddleOCR handles PDF directly)
+    - PDF files (rendered to page images before inference)
+    - Several inputs per request via `s3_uris`; the response then carries one
+      entry per input under `documents`
+    - `page_indices` restricts PDF inputs to those pages (pages already in the
+      OCR cache are not sent); page_index keeps the original page number
+
+    Pages are fed to the model in batches of `model_options.batch_size`
+    (default OCR_BATCH_SIZE).
     """
-    global s3_client
-
     s3_uri = input_data.get("s3_uri")
+    s3_uris = input_data.get("s3_uris") or ([s3_uri] if s3_uri else [])
     output_key = input_data.get("output_key")
     model_name = input_data.get("model", "paddleocr-vl")
     model_options = input_data.get("model_options", {})
     metadata = input_data.get("metadata", {})
 
-    if not s3_uri:
-        raise ValueError("s3_uri is required")
-
-    logger.info(f"Processing with model: {model_name}, options: {model_options}")
+    if not s3_uris:
+        raise ValueError("s3_uri or s3_uris is required")
 
-    # Parse S3 URI
-    s3_uri_clean = s3_uri.replace("s3://", "")
-    bucket = s3_uri_clean.split("/")[0]
-    key = "/".join(s3_uri_clean.split("/")[1:])
+    batch_size = get_batch_size(model_options)
+    logger.info(f"Processing {len(s3_uris)} input(s) with model: {model_name}, "
+                f"batch size: {batch_size}, options: {model_options}")
 
-    # Download file to temp
-    suffix = os.path.splitext(key)[1].lower() or ".jpg"
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-        s3_client.download_file(bucket, key, tmp.name)
-        tmp_path = tmp.name
+    # Results are written next to the (first) input
+    bucket, _ = parse_s3_uri(s3_uris[0])
 
     try:
-        ocr_model = get_model(model_name)
-
-        # PaddleOCR handles both images and PDFs directly
-        logger.info(f"Processing file: {tmp_path} (type: {suffix})")
-        results = ocr_model.predict(tmp_path, model_options)
+        ocr_model, model_load = _registry.get(model_name, model_options)
 
-        # Format results - PaddleOCR returns list of results (one per page for PDF)
-        pages = []
-        all_content = []
+        start = time.time()
+        doc_pages: List[List[Dict[str, Any]]] = [[] for _ in s3_uris]
+        for doc_idx, page_idx, res in predict_batched(ocr_model, s3_uris, model_options, batch_size,
+                                                     input_data.get("page_indices")):
+            doc_pages[doc_idx].append(build_page(ocr_model, page_idx, res))
 
-        for page_idx, res in enumerate(results):
-            page_output = ocr_model.format_output([res], output_format="markdown")
+        total_pages = sum(len(pages) for pages in doc_pages)
+        elapsed = time.time() - start
+        logger.info(f"Processed {total_pages} pages in {elapsed:.1f}s "
+                    f"({total_pages / elapsed if elapsed else 0:.2f} pages/s)")
 
-            # Extract image dimensions from result data
-            width, height = None, None
-            if hasattr(res, "json"):
-                res_data = res.json.get("res", {})
-                width = res_data.get("width")
-                height = res_data.get("height")
-
-            pages.append({
-                "page_index": page_idx,
-                "content": page_output.get("content", ""),
-                "blocks": page_output.get("blocks", []),
-                "width": width,
-                "height": height,
-                "results": page_output.get("results", [])
-            })
-            all_content.append(page_output.get("content", ""))
+        documents = [{
+            "s3_uri": uri,
+            "pages": pages,
+            "page_count": len(pages),
+            "content": "\n\n---\n\n".join(page["content"] for page in pages),
+        } for uri, pages in zip(s3_uris, doc_pages)]
 
         output = {
             "success": True,
             "format": "markdown",
-            "pages": pages,
-            "page_count": len(pages),
-            "content": "\n\n---\n\n".join(all_content),
             "model": model_name,
             "model_options": model_options,
+            "model_load": model_load,
             "metadata": metadata
         }
+        if input_data.get("s3_uris"):
+            output["documents"] = documents
+            output["page_count"] = total_pages
+        else:
+            output["pages"] = documents[0]["pages"]
+            output["page_count"] = documents[0]["page_count"]
+            output["content"] = documents[0]["content"]
 
         # Upload result to S3 if output_key specified
         if output_key:
-            s3_client.put_object(
+            get_s3_client().put_object(
                 Bucket=bucket,
                 Key=output_key,
                 Body=json.dumps(output, ensure_ascii=False),
@@ -605,7 +939,7 @@ def predict_fn(input_data, model):
         error_output = {"success": False, "error": str(e), "model": model_name}
         if output_key:
             error_key = output_key.replace("output/", "failure/")
-            s3_client.put_object(
+            get_s3_client().put_object(
                 Bucket=bucket,
                 Key=error_key,
                 Body=json.dumps(error_output, ensure_ascii=False),
@@ -613,11 +947,6 @@ def predict_fn(input_data, model):
             )
         raise
 
-    finally:
-        # Clean up temp file
-        if os.path.exists(tmp_path):
-            os.unlink(tmp_path)
-
 
 def output_fn(prediction, accept):
     """Format output response."""
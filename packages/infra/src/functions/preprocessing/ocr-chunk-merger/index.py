@@ -1,16 +1,25 @@
 """OCR Chunk Merger Lambda
 
-Triggered by S3 EventBridge when chunk_*.json files are created.
-Checks if all chunks for a workflow are complete, then merges them into result.json.
-
-Uses S3 file listing as the sole source of truth (no DDB for chunk tracking).
+Called by Step Functions once the OCR chunk Map completes.
+Checks chunk completion, then merges all chunks into result.jsonl.
+
+Completion is tracked by an atomic per-workflow counter (DDB SK: OCR_CHUNKS)
+that ocr-lambda-processor increments per chunk, so chunk keys are derived
+from the chunk count instead of listing the chunks/ prefix. Listing is only
+used as a fallback when the counter is missing or behind.
+Pages the orchestrator found in the OCR cache have no chunk; they are read
+from the cache and interleaved with chunk pages by page index.
 Idempotent: if two instances run concurrently, both produce the same merged result.
 """
+import heapq
 import json
 import os
 import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 import boto3
+from botocore.config import Config
 
 from shared.ddb_client import (
     update_preprocess_status,
@@ -18,8 +27,14 @@ from shared.ddb_client import (
     PreprocessType,
     record_step_complete,
     record_step_error,
+    get_ocr_chunk_progress,
     StepName,
 )
+from shared.ocr_cache import load_cache_manifest, read_cached_pages
+from shared.page_results import save_ocr_result
+
+# Chunk JSON files fetched concurrently during the merge
+MERGE_READ_WORKERS = int(os.environ.get('MERGE_READ_WORKERS', '16'))
 
 s3_client = None
 
@@ -27,10 +42,14 @@ s3_client = None
 def get_s3_client():
     global s3_client
     if s3_client is None:
-        s3_client = boto3.client('s3')
+        s3_client = boto3.client('s3', config=Config(max_pool_connections=MERGE_READ_WORKERS))
     return s3_client
 
 
+def get_chunk_key(base_path: str, chunk_index: int) -> str:
+    return f'{base_path}/paddleocr/chunks/chunk_{chunk_index:04d}.json'
+
+
 def extract_base_path(chunk_key: str) -> str:
     """Extract document base path from a chunk key.
 
@@ -65,43 +84,48 @@ def list_chunk_files(s3, bucket: str, base_path: str) -> tuple[list[str], list[s
     return json_keys, failed_keys
 
 
-def merge_chunk_results(s3, bucket: str, chunk_keys: list[str]) -> dict:
-    """Read all chunk JSON files and merge into a single result.
+def merge_chunk_results(s3, bucket: str, base_path: str, chunk_keys: list[str],
+                        cache_manifest: dict | None = None) -> tuple[str, int]:
+    """Stream chunk JSON files (and cached pages) into paddleocr/result.jsonl.
 
-    Pages are sorted by page_index to maintain correct order.
+    Up to MERGE_READ_WORKERS chunks are fetched ahead concurrently while pages
+    are written in chunk order. Chunks cover consecutive page ranges, so
+    sorting pages within each chunk keeps page order without holding every
+    page in memory. Returns (output_uri, page_count).
     """
-    all_pages = []
-    all_content = []
-    model = None
-    model_options = {}
-
-    # Sort by chunk index to maintain order
-    sorted_keys = sorted(chunk_keys)
+    meta = {'format': 'markdown'}
+    if cache_manifest:
+        meta['model'] = cache_manifest.get('model')
 
-    for key in sorted_keys:
+    def _read_chunk(key):
         response = s3.get_object(Bucket=bucket, Key=key)
-        chunk_data = json.loads(response['Body'].read().decode('utf-8'))
+        return json.loads(response['Body'].read().decode('utf-8'))
 
-        all_pages.extend(chunk_data.get('pages', []))
-        if chunk_data.get('content'):
-            all_content.append(chunk_data['content'])
+    def _iter_pages():
+        keys = iter(sorted(chunk_keys))
+        with ThreadPoolExecutor(max_workers=MERGE_READ_WORKERS) as executor:
+            pending = deque(executor.submit(_read_chunk, key) for _, key in zip(range(MERGE_READ_WORKERS), keys))
+            while pending:
+                chunk_data = pending.popleft().result()
+                next_key = next(keys, None)
+                if next_key is not None:
+                    pending.append(executor.submit(_read_chunk, next_key))
 
-        if model is None:
-            model = chunk_data.get('model')
-            model_options = chunk_data.get('model_options', {})
+                if 'model_options' not in meta:
+                    meta['model'] = chunk_data.get('model')
+                    meta['model_options'] = chunk_data.get('model_options', {})
 
-    # Sort pages by page_index for correct ordering
-    all_pages.sort(key=lambda p: p.get('page_index', 0))
+                yield from sorted(chunk_data.get('pages', []), key=lambda p: p.get('page_index', 0))
 
-    return {
-        'success': True,
-        'format': 'markdown',
-        'model': model,
-        'model_options': model_options,
-        'pages': all_pages,
-        'page_count': len(all_pages),
-        'content': '\n\n---\n\n'.join(all_content),
-    }
+    pages = _iter_pages()
+    cached_pages = (cache_manifest or {}).get('cached_pages', [])
+    if cached_pages:
+        print(f'Merging {len(cached_pages)} pages from OCR cache')
+        cached = read_cached_pages(bucket, cache_manifest['page_keys'], sorted(cached_pages))
+        pages = heapq.merge(pages, cached, key=lambda p: p.get('page_index', 0))
+
+    # meta is filled by the first chunk, before the header is written on commit
+    return save_ocr_result(bucket, base_path, pages, meta=meta)
 
 
 def cleanup_chunks(s3, bucket: str, base_path: str) -> None:
@@ -162,9 +186,17 @@ def handler(event, _context):
         return {**event, 'merge_status': 'error', 'reason': 'missing_total_chunks'}
 
     # Count completed and failed chunks
-    json_keys, failed_keys = list_chunk_files(s3, bucket, base_path)
-    completed = len(json_keys)
-    failed = len(failed_keys)
+    progress = get_ocr_chunk_progress(workflow_id) or {}
+    completed = progress.get('completed', 0)
+    failed = progress.get('failed', 0)
+    if completed + failed >= total_chunks:
+        json_keys = [get_chunk_key(base_path, i) for i in range(total_chunks)]
+    else:
+        # Counter missing (workflow started before tracking) or behind: list once
+        print(f'[{workflow_id}] Chunk counter incomplete ({progress}), listing chunk files')
+        json_keys, failed_keys = list_chunk_files(s3, bucket, base_path)
+        completed = len(json_keys)
+        failed = len(failed_keys)
     total_done = completed + failed
 
     print(f'[{workflow_id}] Chunk progress: {completed} completed, {failed} failed, {total_done}/{total_chunks} total')
@@ -187,18 +219,8 @@ def handler(event, _context):
     # All chunks succeeded -> merge
     print(f'[{workflow_id}] Merging {completed} chunks...')
 
-    merged = merge_chunk_results(s3, bucket, json_keys)
-
-    # Save merged result.json
-    output_key = f'{base_path}/paddleocr/result.json'
-    s3.put_object(
-        Bucket=bucket,
-        Key=output_key,
-        Body=json.dumps(merged, ensure_ascii=False, indent=2),
-        ContentType='application/json',
-    )
-    ocr_output_uri = f's3://{bucket}/{output_key}'
-    page_count = merged.get('page_count', 0)
+    cache_manifest = load_cache_manifest(bucket, base_path, workflow_id)
+    ocr_output_uri, page_count = merge_chunk_results(s3, bucket, base_path, json_keys, cache_manifest)
     print(f'[{workflow_id}] Merged result saved: {ocr_output_uri} ({page_count} pages)')
 
     # Update DDB
@@ -2,8 +2,11 @@
 
 Triggered by SNS when SageMaker async inference completes.
 Saves results to standard location and updates DynamoDB status.
+When the orchestrator sent only pages missing from the OCR cache, the returned
+pages are cached and merged with the cached ones by page index.
 Scale-in is handled by CloudWatch alarm (10 min fallback).
 """
+import heapq
 import json
 import os
 
@@ -15,6 +18,8 @@ from shared.ddb_client import (
     record_step_error,
     StepName,
 )
+from shared.ocr_cache import load_cache_manifest, read_cached_pages, write_cached_pages
+from shared.page_results import save_ocr_result
 from shared.s3_analysis import get_s3_client, parse_s3_uri
 
 OUTPUT_BUCKET = os.environ.get('OUTPUT_BUCKET', '')
@@ -37,23 +42,6 @@ def download_json_from_s3(uri: str) -> dict:
     return json.loads(response['Body'].read().decode('utf-8'))
 
 
-def save_ocr_result(bucket: str, base_path: str, ocr_result: dict) -> str:
-    """Save OCR result to paddleocr/ folder under document path."""
-    client = get_s3()
-    output_key = f'{base_path}/paddleocr/result.json'
-
-    client.put_object(
-        Bucket=bucket,
-        Key=output_key,
-        Body=json.dumps(ocr_result, ensure_ascii=False, indent=2),
-        ContentType='application/json'
-    )
-
-    output_uri = f's3://{bucket}/{output_key}'
-    print(f'OCR result saved to: {output_uri}')
-    return output_uri
-
-
 def handle_success(response_location: str, request_payload: dict):
     """Handle successful inference."""
     metadata = request_payload.get('metadata', {})
@@ -82,9 +70,34 @@ def handle_success(response_location: str, request_payload: dict):
         record_step_error(workflow_id, StepName.PADDLEOCR_PROCESSOR, error)
         return
 
+    pages = result.get('pages', [])
+    cache_manifest = load_cache_manifest(bucket, base_path, workflow_id)
+    if cache_manifest:
+        page_keys = cache_manifest.get('page_keys', [])
+        written = write_cached_pages(bucket, page_keys, pages)
+        print(f'Cached {written} OCR pages')
+        cached_pages = sorted(cache_manifest.get('cached_pages', []))
+        if cached_pages:
+            print(f'Merging {len(cached_pages)} pages from OCR cache')
+            pages = heapq.merge(
+                sorted(pages, key=lambda p: p.get('page_index', 0)),
+                read_cached_pages(bucket, page_keys, cached_pages),
+                key=lambda p: p.get('page_index', 0),
+            )
+
     # Save to standard location
-    ocr_output_uri = save_ocr_result(bucket, base_path, result)
-    page_count = len(result.get('pages', [])) or 1
+    ocr_output_uri, page_count = save_ocr_result(
+        bucket,
+        base_path,
+        pages,
+        meta={
+            'format': result.get('format', 'markdown'),
+            'model': result.get('model'),
+            'model_options': result.get('model_options', {}),
+        },
+        content=result.get('content', ''),
+    )
+    page_count = page_count or 1
 
     print(f'OCR completed: {page_count} pages')
     update_preprocess_status(
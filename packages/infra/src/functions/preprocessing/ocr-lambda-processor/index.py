@@ -2,10 +2,13 @@
 
 Invokes the Rust PaddleOCR Lambda for OCR processing.
 Transforms the Rust response into the standard format expected by ocr-chunk-merger.
+OCR'd pages are also stored in the content-addressed OCR cache when the
+orchestrator recorded cache keys for this workflow.
 """
 import json
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 import boto3
 
@@ -15,11 +18,16 @@ from shared.ddb_client import (
     PreprocessType,
     record_step_complete,
     record_step_error,
+    increment_ocr_chunk_progress,
     StepName,
 )
+from shared.ocr_cache import load_cache_manifest, write_cached_pages
+from shared.page_results import save_ocr_result
 
 OUTPUT_BUCKET = os.environ.get('OUTPUT_BUCKET', '')
 RUST_OCR_FUNCTION_NAME = os.environ.get('RUST_OCR_FUNCTION_NAME', 'idp-v2-paddle-ocr')
+# A chunk that failed once is re-run as this many concurrent sub-ranges
+OCR_RESPLIT_PARTS = int(os.environ.get('OCR_RESPLIT_PARTS', '4'))
 
 s3_client = None
 lambda_client = None
@@ -82,6 +90,40 @@ def invoke_rust_ocr(file_uri: str, lang: str, use_doc_orientation_classify: bool
     return resp_payload
 
 
+def split_page_range(from_page: int, to_page: int, parts: int) -> list[tuple[int, int]]:
+    """Split inclusive [from_page, to_page] into up to `parts` inclusive ranges."""
+    page_total = to_page - from_page + 1
+    step = max(1, -(-page_total // parts))
+    return [(start, min(start + step - 1, to_page)) for start in range(from_page, to_page + 1, step)]
+
+
+def invoke_rust_ocr_split(file_uri: str, lang: str, use_doc_orientation_classify: bool,
+                          from_page: int, to_page: int, deadline: float) -> dict:
+    """OCR a page range as concurrent smaller ranges.
+
+    A sub-range that fails is split again while it has more than one page and
+    the invocation has at least twice the failed attempt's duration left.
+    """
+    ranges = split_page_range(from_page, to_page, OCR_RESPLIT_PARTS)
+    print(f'Re-splitting pages {from_page}-{to_page} into {len(ranges)} ranges')
+
+    def _run(page_range):
+        started = time.time()
+        try:
+            return invoke_rust_ocr(file_uri, lang, use_doc_orientation_classify, *page_range)['pages']
+        except Exception as e:
+            elapsed = time.time() - started
+            start, end = page_range
+            if end > start and deadline - time.time() > elapsed * 2:
+                print(f'[WARN] Pages {start}-{end} failed after {elapsed:.1f}s, splitting again: {e}')
+                return invoke_rust_ocr_split(file_uri, lang, use_doc_orientation_classify, start, end, deadline)['pages']
+            raise
+
+    with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+        pages = [page for part in executor.map(_run, ranges) for page in part]
+    return {'pages': sorted(pages, key=lambda p: p['page'])}
+
+
 def transform_rust_response(rust_response: dict, ocr_model: str, ocr_options: dict | None) -> dict:
     pages = []
     all_content = []
@@ -132,6 +174,19 @@ def transform_rust_response(rust_response: dict, ocr_model: str, ocr_options: di
     }
 
 
+def cache_ocr_pages(bucket: str, base_path: str, workflow_id: str, pages: list[dict]) -> None:
+    """Store OCR'd pages in the OCR cache (best effort)."""
+    try:
+        manifest = load_cache_manifest(bucket, base_path, workflow_id)
+        if not manifest:
+            return
+        written = write_cached_pages(bucket, manifest.get('page_keys', []), pages)
+        if written:
+            print(f'[{workflow_id}] Cached {written} OCR pages')
+    except Exception as e:
+        print(f'[WARN] [{workflow_id}] Failed to update OCR cache: {e}')
+
+
 def process_file(
     file_uri: str,
     workflow_id: str,
@@ -142,6 +197,8 @@ def process_file(
     start_page: int | None = None,
     end_page: int | None = None,
     total_chunks: int | None = None,
+    resplit: bool = False,
+    deadline: float | None = None,
 ) -> dict:
     is_chunk = chunk_index is not None
     s3 = get_s3_client()
@@ -161,11 +218,17 @@ def process_file(
         # Invoke Rust OCR Lambda
         invoke_start = time.time()
         print(f'[{workflow_id}]{chunk_label} Invoking Rust OCR: lang={lang}, from={from_page}, to={to_page}')
-        rust_response = invoke_rust_ocr(file_uri, lang, use_orientation, from_page, to_page)
+        if resplit and from_page is not None and to_page > from_page:
+            rust_response = invoke_rust_ocr_split(
+                file_uri, lang, use_orientation, from_page, to_page, deadline or time.time() + 600,
+            )
+        else:
+            rust_response = invoke_rust_ocr(file_uri, lang, use_orientation, from_page, to_page)
         print(f'[{workflow_id}]{chunk_label} Rust OCR completed in {time.time() - invoke_start:.1f}s')
 
         # Transform response
         output = transform_rust_response(rust_response, ocr_model, ocr_options)
+        cache_ocr_pages(bucket, base_path, workflow_id, output['pages'])
 
         if is_chunk:
             output_key = f'{base_path}/paddleocr/chunks/chunk_{chunk_index:04d}.json'
@@ -176,20 +239,20 @@ def process_file(
                 ContentType='application/json',
             )
             output_uri = f's3://{bucket}/{output_key}'
-            print(f'[{workflow_id}] Chunk {chunk_index} result saved to: {output_uri}')
+            progress = increment_ocr_chunk_progress(workflow_id)
+            print(f'[{workflow_id}] Chunk {chunk_index} result saved to: {output_uri} '
+                  f'({progress.get("completed", 0)}/{progress.get("total", total_chunks)} chunks done)')
             return {'status': 'completed', 'output_uri': output_uri, 'page_count': output['page_count'], 'chunk_index': chunk_index}
         else:
-            output_key = f'{base_path}/paddleocr/result.json'
-            s3.put_object(
-                Bucket=bucket,
-                Key=output_key,
-                Body=json.dumps(output, ensure_ascii=False, indent=2),
-                ContentType='application/json',
+            ocr_output_uri, page_count = save_ocr_result(
+                bucket,
+                base_path,
+                output['pages'],
+                meta={'format': output['format'], 'model': ocr_model, 'model_options': output['model_options']},
+                content=output['content'],
             )
-            ocr_output_uri = f's3://{bucket}/{output_key}'
             print(f'[{workflow_id}] Result saved to: {ocr_output_uri}')
 
-            page_count = output['page_count']
             update_preprocess_status(
                 document_id=document_id,
                 workflow_id=workflow_id,
@@ -203,7 +266,9 @@ def process_file(
             return {'status': 'completed', 'output_uri': ocr_output_uri, 'page_count': page_count}
 
     except Exception:
-        if is_chunk:
+        # The first attempt is retried by Step Functions as a re-split chunk,
+        # so only the re-split attempt records the chunk as failed
+        if is_chunk and resplit:
             try:
                 failed_key = f'{base_path}/paddleocr/chunks/chunk_{chunk_index:04d}.failed'
                 s3.put_object(
@@ -213,6 +278,7 @@ def process_file(
                     ContentType='application/octet-stream',
                 )
                 print(f'[{workflow_id}] Saved failure marker: {failed_key}')
+                increment_ocr_chunk_progress(workflow_id, failed=True)
             except Exception as marker_err:
                 print(f'[{workflow_id}] Failed to save failure marker: {marker_err}')
         raise
@@ -233,8 +299,12 @@ def handler(event, context):
     total_chunks = event.get('total_chunks')
     is_chunk = chunk_index is not None
 
+    resplit = event.get('resplit', False)
+
     remaining_ms = context.get_remaining_time_in_millis() if context else 900000
     chunk_label = f', chunk={chunk_index}/{total_chunks}' if is_chunk else ''
+    if resplit:
+        chunk_label += ', resplit'
     print(f'[{workflow_id}] Starting OCR (model={ocr_model}{chunk_label}, timeout={remaining_ms/1000:.0f}s)')
 
     try:
@@ -248,6 +318,8 @@ def handler(event, context):
             start_page=start_page,
             end_page=end_page,
             total_chunks=total_chunks,
+            resplit=resplit,
+            deadline=time.time() + remaining_ms / 1000 - 30,
         )
         return {'statusCode': 200, 'body': json.dumps(result)}
 
@@ -2,11 +2,15 @@
 
 Routes OCR processing to Lambda (CPU) or SageMaker (GPU).
 For PDFs, creates page-range payloads for Step Functions Map state.
+Pages found in the content-addressed OCR cache (shared/ocr_cache.py) are not
+dispatched; when every page is cached the result is assembled here directly.
 Called by Step Functions.
 """
+import ctypes
+import hashlib
 import json
 import os
-import tempfile
+import time
 from datetime import datetime, timezone
 
 import boto3
@@ -17,17 +21,41 @@ from shared.ddb_client import (
     PreprocessType,
     record_step_start,
     record_step_skipped,
+    record_step_complete,
     record_step_error,
+    reset_ocr_chunk_progress,
     StepName,
 )
+from shared.ocr_cache import (
+    OCR_CACHE_ENABLED,
+    find_cached_pages,
+    get_cache_object_key,
+    read_cached_pages,
+    save_cache_manifest,
+)
+from shared.page_results import save_ocr_result
 from shared.s3_analysis import get_s3_client, parse_s3_uri
+from shared.s3_range_file import S3RangeFile, get_pdf_page_count
 
 SAGEMAKER_ENDPOINT_NAME = os.environ.get('SAGEMAKER_ENDPOINT_NAME', '')
 OUTPUT_BUCKET = os.environ.get('OUTPUT_BUCKET', '')
 CHUNK_PAGE_SIZE = int(os.environ.get('CHUNK_PAGE_SIZE', '10'))
 
+# Adaptive chunking: chunks are balanced by estimated OCR cost, with an
+# average of CHUNK_PAGE_SIZE pages and at most OCR_CHUNK_MAX_PAGES pages
+OCR_CHUNK_MAX_PAGES = int(os.environ.get('OCR_CHUNK_MAX_PAGES', str(CHUNK_PAGE_SIZE * 3)))
+# Upper bound on the pdfium cost pass; unscanned pages get the mean cost
+OCR_PLAN_TIME_BUDGET_SECONDS = float(os.environ.get('OCR_PLAN_TIME_BUDGET_SECONDS', '60'))
+# Page cost model (relative units, 1.0 = text-free US Letter page)
+REFERENCE_PAGE_AREA = 612 * 792
+COST_PER_PAGE_OBJECT = 0.001
+COST_PER_IMAGE_MB = 1.0
+
 LAMBDA_OCR_MODELS = {'pp-ocrv5', 'pp-structurev3'}
 
+# Single-frame image types cached by file digest (multi-frame TIFF/GIF are not)
+CACHEABLE_IMAGE_TYPES = {'image/jpeg', 'image/png', 'image/bmp', 'image/webp'}
+
 SUPPORTED_MIME_TYPES = {
     'application/pdf',
     'image/jpeg',
@@ -90,25 +118,138 @@ def get_document_base_path(file_uri: str) -> tuple[str, str]:
     return bucket, base_path
 
 
-def get_pdf_page_count(bucket: str, key: str) -> int:
+def pdf_page_digest(page, image_data: list[bytes]) -> str:
+    """Digest of what a PDF page renders: geometry, page objects, text, image data.
+
+    pdfium does not expose raw content streams, so the digest covers each
+    object's type and bounds, the extracted text and raw image bytes.
+    """
+    digest = hashlib.sha256()
+    width, height = page.get_size()
+    digest.update(f'{width:.2f}x{height:.2f}/{page.get_rotation()}'.encode())
+    for obj in page.get_objects(max_depth=2):
+        bounds = ','.join(f'{v:.1f}' for v in obj.get_bounds())
+        digest.update(f'|{obj.type}:{bounds}'.encode())
+    for data in image_data:
+        digest.update(hashlib.sha256(data).digest())
+    textpage = page.get_textpage()
+    try:
+        digest.update(textpage.get_text_range().encode('utf-8'))
+    finally:
+        textpage.close()
+    return digest.hexdigest()
+
+
+def scan_pdf_pages(file_uri: str, page_count: int, time_budget: float,
+                   with_digests: bool) -> tuple[list[float], list[str | None]]:
+    """Estimate relative OCR cost per page from a quick pdfium pass.
+
+    Signals: page area (render size), page object count (content stream
+    complexity, e.g. dense tables) and compressed image bytes (scans with more
+    ink compress worse). Pages not reached within time_budget get the mean.
+
+    With with_digests, the same pass computes an OCR cache digest per page;
+    pages not reached get None (always OCR'd).
+    """
     import pypdfium2 as pdfium
-    s3 = get_s3_client()
-    with tempfile.NamedTemporaryFile(suffix='.pdf', dir='/tmp', delete=True) as tmp:
-        s3.download_file(bucket, key, tmp.name)
-        doc = pdfium.PdfDocument(tmp.name)
-        count = len(doc)
+
+    deadline = time.time() + time_budget
+    costs = []
+    digests = []
+    doc = pdfium.PdfDocument(S3RangeFile.from_uri(file_uri))
+    try:
+        for page_num in range(page_count):
+            if time.time() > deadline:
+                break
+            page = doc[page_num]
+            try:
+                width, height = page.get_size()
+                area_factor = min(4.0, max(0.25, width * height / REFERENCE_PAGE_AREA))
+                object_count = pdfium.raw.FPDFPage_CountObjects(page.raw)
+                image_bytes = 0
+                image_data = []
+                for obj in page.get_objects(filter=[pdfium.raw.FPDF_PAGEOBJ_IMAGE], max_depth=2):
+                    size = pdfium.raw.FPDFImageObj_GetImageDataRaw(obj.raw, None, 0)
+                    image_bytes += size
+                    if with_digests and size:
+                        buffer = ctypes.create_string_buffer(size)
+                        pdfium.raw.FPDFImageObj_GetImageDataRaw(obj.raw, buffer, size)
+                        image_data.append(buffer.raw)
+                costs.append(
+                    area_factor
+                    + object_count * COST_PER_PAGE_OBJECT
+                    + image_bytes / (1024 * 1024) * COST_PER_IMAGE_MB
+                )
+                if with_digests:
+                    digests.append(pdf_page_digest(page, image_data))
+            finally:
+                page.close()
+    finally:
         doc.close()
-        return count
+
+    if len(costs) < page_count:
+        print(f'Page scan reached {len(costs)}/{page_count} pages in {time_budget:.0f}s, using mean cost for the rest')
+        mean = sum(costs) / len(costs) if costs else 1.0
+        costs.extend([mean] * (page_count - len(costs)))
+    digests.extend([None] * (page_count - len(digests)))
+    return costs, digests
 
 
-def build_page_range_payloads(workflow_id, document_id, project_id, file_uri, page_count, ocr_model, ocr_options):
+def image_digest(file_uri: str) -> str:
+    bucket, key = parse_s3_uri(file_uri)
+    response = get_s3_client().get_object(Bucket=bucket, Key=key)
+    digest = hashlib.sha256()
+    for block in iter(lambda: response['Body'].read(1024 * 1024), b''):
+        digest.update(block)
+    return digest.hexdigest()
+
+
+def plan_page_ranges(page_costs: list[float]) -> list[tuple[int, int]]:
+    """Split pages into consecutive [start, end) ranges of roughly equal cost.
+
+    The target cost is CHUNK_PAGE_SIZE pages of average cost, so the chunk
+    count stays close to fixed-size chunking while dense pages get smaller
+    chunks and blank pages larger ones.
+    """
+    page_count = len(page_costs)
+    if page_count == 0:
+        return []
+    target = CHUNK_PAGE_SIZE * sum(page_costs) / page_count
+
+    ranges = []
+    start = 0
+    cost = 0.0
+    for page_num, page_cost in enumerate(page_costs):
+        pages_in_chunk = page_num - start
+        if pages_in_chunk and (cost + page_cost > target or pages_in_chunk >= OCR_CHUNK_MAX_PAGES):
+            ranges.append((start, page_num))
+            start = page_num
+            cost = 0.0
+        cost += page_cost
+    ranges.append((start, page_count))
+    return ranges
+
+
+def pending_runs(page_count: int, cached_pages: set[int]) -> list[tuple[int, int]]:
+    """Consecutive [start, end) runs of pages that are not cached."""
+    runs = []
+    start = None
+    for page_num in range(page_count + 1):
+        pending = page_num < page_count and page_num not in cached_pages
+        if pending and start is None:
+            start = page_num
+        elif not pending and start is not None:
+            runs.append((start, page_num))
+            start = None
+    return runs
+
+
+def build_page_range_payloads(workflow_id, document_id, project_id, file_uri, page_ranges, ocr_model, ocr_options):
     """Build payloads with page ranges for Step Functions Map state."""
     payloads = []
-    total_chunks = (page_count + CHUNK_PAGE_SIZE - 1) // CHUNK_PAGE_SIZE
+    total_chunks = len(page_ranges)
 
-    for chunk_idx in range(total_chunks):
-        start_page = chunk_idx * CHUNK_PAGE_SIZE
-        end_page = min(start_page + CHUNK_PAGE_SIZE, page_count)
+    for chunk_idx, (start_page, end_page) in enumerate(page_ranges):
         payloads.append({
             'workflow_id': workflow_id,
             'document_id': document_id,
@@ -139,7 +280,93 @@ def build_single_payload(workflow_id, document_id, project_id, file_uri, ocr_mod
     }]
 
 
-def invoke_async_inference(file_uri, workflow_id, document_id, project_id, ocr_model, ocr_options=None):
+def scan_document(workflow_id, file_uri, file_type, page_count, context) -> tuple[list[float], list[str | None]]:
+    """Per-page cost estimates and OCR cache digests (None = not cacheable)."""
+    if file_type != 'application/pdf':
+        digest = None
+        if OCR_CACHE_ENABLED and file_type in CACHEABLE_IMAGE_TYPES:
+            try:
+                digest = image_digest(file_uri)
+            except Exception as e:
+                print(f'[WARN] [{workflow_id}] Failed to hash image for OCR cache: {e}')
+        return [1.0], [digest]
+
+    if page_count <= CHUNK_PAGE_SIZE and not OCR_CACHE_ENABLED:
+        return [1.0] * page_count, [None] * page_count
+
+    # Leave at least a minute of the invocation for the rest of the handler
+    time_budget = OCR_PLAN_TIME_BUDGET_SECONDS
+    if context:
+        time_budget = min(time_budget, context.get_remaining_time_in_millis() / 1000 - 60)
+
+    try:
+        scan_start = time.time()
+        page_costs, digests = scan_pdf_pages(file_uri, page_count, max(0.0, time_budget), OCR_CACHE_ENABLED)
+        print(f'[{workflow_id}] Scanned {page_count} pages in {time.time() - scan_start:.1f}s')
+        return page_costs, digests
+    except Exception as e:
+        # Uniform costs give fixed CHUNK_PAGE_SIZE chunks
+        print(f'[WARN] [{workflow_id}] Page scan failed, using fixed chunks without OCR cache: {e}')
+        return [1.0] * page_count, [None] * page_count
+
+
+def plan_ocr_page_ranges(workflow_id, page_costs, cached_pages) -> list[tuple[int, int]]:
+    """Cost-balanced page ranges covering only the pages that are not cached."""
+    page_ranges = []
+    for run_start, run_end in pending_runs(len(page_costs), cached_pages):
+        page_ranges.extend(
+            (run_start + start, run_start + end)
+            for start, end in plan_page_ranges(page_costs[run_start:run_end])
+        )
+    if page_ranges:
+        sizes = [end - start for start, end in page_ranges]
+        print(f'[{workflow_id}] Planned {len(page_ranges)} OCR chunks '
+              f'(pages per chunk: min {min(sizes)}, max {max(sizes)})')
+    return page_ranges
+
+
+def resolve_cached_pages(workflow_id, file_uri, ocr_model, ocr_options, digests) -> tuple[list[str | None], set[int]]:
+    """Look up page digests in the OCR cache and record the result for this workflow.
+
+    Returns (page cache keys, cached page indices).
+    """
+    bucket, base_path = get_document_base_path(file_uri)
+    page_keys = [
+        get_cache_object_key(base_path, ocr_model, ocr_options, digest) if digest else None
+        for digest in digests
+    ]
+    if not any(page_keys):
+        return page_keys, set()
+
+    cached_pages = find_cached_pages(bucket, page_keys)
+    save_cache_manifest(bucket, base_path, workflow_id, ocr_model, page_keys, cached_pages)
+    print(f'[{workflow_id}] OCR cache: {len(cached_pages)}/{len(page_keys)} pages cached')
+    return page_keys, set(cached_pages)
+
+
+def complete_from_cache(workflow_id, document_id, file_uri, ocr_model, ocr_options, page_keys) -> tuple[str, int]:
+    """Assemble the OCR result from cache entries when every page is cached."""
+    bucket, base_path = get_document_base_path(file_uri)
+    ocr_output_uri, page_count = save_ocr_result(
+        bucket,
+        base_path,
+        read_cached_pages(bucket, page_keys, range(len(page_keys))),
+        meta={'format': 'markdown', 'model': ocr_model, 'model_options': ocr_options or {}, 'cached': True},
+    )
+    update_preprocess_status(
+        document_id=document_id,
+        workflow_id=workflow_id,
+        processor=PreprocessType.OCR,
+        status=PreprocessStatus.COMPLETED,
+        output_uri=ocr_output_uri,
+        page_count=page_count,
+    )
+    record_step_complete(workflow_id, StepName.PADDLEOCR_PROCESSOR)
+    return ocr_output_uri, page_count
+
+
+def invoke_async_inference(file_uri, workflow_id, document_id, project_id, ocr_model, ocr_options=None,
+                           page_indices=None):
     client = get_sagemaker_runtime()
     s3_client = get_s3_client()
 
@@ -160,6 +387,9 @@ def invoke_async_inference(file_uri, workflow_id, document_id, project_id, ocr_m
             'bucket': bucket,
         }
     }
+    # Only pages missing from the OCR cache are sent to the endpoint
+    if page_indices is not None:
+        inference_request['page_indices'] = page_indices
 
     input_key = f'{base_path}/paddleocr/input.json'
     s3_client.put_object(
@@ -212,22 +442,35 @@ def handler(event, context):
             status=PreprocessStatus.PROCESSING
         )
 
-        if ocr_model in LAMBDA_OCR_MODELS:
-            if file_type == 'application/pdf':
-                bucket, _ = get_document_base_path(file_uri)
-                _, file_key = parse_s3_uri(file_uri)
-                page_count = get_pdf_page_count(bucket, file_key)
-                print(f'[{workflow_id}] PDF has {page_count} pages (chunk size: {CHUNK_PAGE_SIZE})')
+        is_pdf = file_type == 'application/pdf'
+        page_count = get_pdf_page_count(file_uri) if is_pdf else 1
+        if is_pdf:
+            print(f'[{workflow_id}] PDF has {page_count} pages (chunk size: {CHUNK_PAGE_SIZE})')
+
+        page_costs, digests = scan_document(workflow_id, file_uri, file_type, page_count, context)
+        page_keys, cached_pages = resolve_cached_pages(workflow_id, file_uri, ocr_model, ocr_options, digests)
 
+        if len(cached_pages) == page_count:
+            ocr_output_uri, cached_count = complete_from_cache(
+                workflow_id, document_id, file_uri, ocr_model, ocr_options, page_keys,
+            )
+            print(f'[{workflow_id}] All {cached_count} pages served from OCR cache: {ocr_output_uri}')
+            return {**event, 'ocr_status': 'COMPLETED', 'ocr_backend': 'cache'}
+
+        if ocr_model in LAMBDA_OCR_MODELS:
+            if is_pdf:
+                page_ranges = plan_ocr_page_ranges(workflow_id, page_costs, cached_pages)
                 ocr_chunks = build_page_range_payloads(
                     workflow_id, document_id, project_id, file_uri,
-                    page_count, ocr_model, ocr_options,
+                    page_ranges, ocr_model, ocr_options,
                 )
             else:
                 ocr_chunks = build_single_payload(
                     workflow_id, document_id, project_id, file_uri, ocr_model, ocr_options,
                 )
 
+            reset_ocr_chunk_progress(workflow_id, len(ocr_chunks))
+
             return {
                 **event,
                 'ocr_status': 'IN_PROGRESS',
@@ -241,6 +484,7 @@ def handler(event, context):
                 file_uri=file_uri, workflow_id=workflow_id,
                 document_id=document_id, project_id=project_id,
                 ocr_model=ocr_model, ocr_options=ocr_options,
+                page_indices=[p for p in range(page_count) if p not in cached_pages] if cached_pages else None,
             )
             return {**event, 'ocr_status': 'IN_PROGRESS', 'ocr_backend': 'sagemaker'}
 
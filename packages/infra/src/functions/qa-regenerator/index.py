@@ -11,7 +11,7 @@ import yaml
 from PIL import Image
 
 from shared.ddb_client import get_steps, get_table, now_iso
-from shared.s3_analysis import get_segment_analysis, save_segment_analysis
+from shared.s3_analysis import get_segment_analysis, save_segment_state
 
 BEDROCK_MODEL_ID = os.environ['BEDROCK_MODEL_ID']
 LANCEDB_FUNCTION_NAME = os.environ.get('LANCEDB_FUNCTION_NAME', 'idp-v2-lance-service')
@@ -279,8 +279,7 @@ def handler(event, _context):
     # Handle delete mode early - no Bedrock call needed
     if mode == 'delete':
         deleted_item = ai_analysis.pop(qa_index)
-        segment_data['ai_analysis'] = ai_analysis
-        save_segment_analysis(file_uri, segment_index, segment_data)
+        save_segment_state(file_uri, segment_index, ai_analysis=ai_analysis)
 
         # Delete the specific QA record from LanceDB
         delete_result = invoke_lancedb('delete_record', {
@@ -382,8 +381,7 @@ def handler(event, _context):
         qa_index = len(ai_analysis) - 1
     else:
         ai_analysis[qa_index] = new_item
-    segment_data['ai_analysis'] = ai_analysis
-    save_segment_analysis(file_uri, segment_index, segment_data)
+    save_segment_state(file_uri, segment_index, ai_analysis=ai_analysis)
 
     # 9. Update LanceDB: delete old QA record, add new one
     delete_result = invoke_lancedb('delete_record', {
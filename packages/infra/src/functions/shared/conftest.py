@@ -0,0 +1,75 @@
+"""Shared fixtures for the shared module tests."""
+import io
+import os
+import sys
+
+import pytest
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+class StubS3:
+    """In-memory S3 client covering the calls the shared modules make.
+
+    Objects carry an ETag ("v1", "v2", ...) that changes on every write, and
+    put_object enforces IfMatch / IfNoneMatch. Ranged GETs are recorded in
+    `ranges`. `before_put` hooks run right before a put is evaluated, to
+    simulate a concurrent writer landing between a read and a write.
+    """
+
+    class exceptions:
+        class NoSuchKey(ClientError):
+            def __init__(self):
+                super().__init__({'Error': {'Code': 'NoSuchKey', 'Message': 'Not Found'}}, 'GetObject')
+
+    def __init__(self):
+        self.objects = {}
+        self.versions = {}
+        self.content_types = {}
+        self.ranges = []
+        self.puts = []
+        self.before_put = []
+
+    def store(self, key: str, body):
+        """Write an object directly, bypassing conditions and hooks."""
+        self.objects[key] = body.encode('utf-8') if isinstance(body, str) else body
+        self.versions[key] = self.versions.get(key, 0) + 1
+
+    def etag(self, key: str) -> str:
+        return f'"v{self.versions[key]}"'
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({'Error': {'Code': '404', 'Message': 'Not Found'}}, 'HeadObject')
+        return {'ContentLength': len(self.objects[Key]), 'ETag': self.etag(Key)}
+
+    def get_object(self, Bucket, Key, Range=None):
+        if Key not in self.objects:
+            raise self.exceptions.NoSuchKey()
+        data = self.objects[Key]
+        if Range:
+            start, end = (int(x) for x in Range[len('bytes='):].split('-'))
+            self.ranges.append((start, end))
+            data = data[start:end + 1]
+        return {'Body': io.BytesIO(data), 'ETag': self.etag(Key)}
+
+    def put_object(self, Bucket, Key, Body, IfMatch=None, IfNoneMatch=None, ContentType=None):
+        if self.before_put:
+            self.before_put.pop(0)(self)
+        self.puts.append(Key)
+        exists = Key in self.objects
+        if (IfMatch and (not exists or IfMatch != self.etag(Key))) or (IfNoneMatch == '*' and exists):
+            raise ClientError({'Error': {'Code': 'PreconditionFailed', 'Message': 'conflict'}}, 'PutObject')
+        self.store(Key, Body)
+        self.content_types[Key] = ContentType
+        return {'ETag': self.etag(Key)}
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None):
+        self.store(Key, Fileobj.read())
+        self.content_types[Key] = (ExtraArgs or {}).get('ContentType')
+
+
+@pytest.fixture
+def stub_s3():
+    return StubS3()
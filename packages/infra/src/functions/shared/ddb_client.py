@@ -516,6 +516,40 @@ def update_workflow_total_segments(
     return decimal_to_python(response.get('Attributes', {}))
 
 
+def reset_ocr_chunk_progress(workflow_id: str, total_chunks: int) -> None:
+    """Initialize the per-workflow OCR chunk counter (SK: OCR_CHUNKS)"""
+    table = get_table()
+    table.put_item(Item={
+        'PK': f'WF#{workflow_id}',
+        'SK': 'OCR_CHUNKS',
+        'total': total_chunks,
+        'completed': 0,
+        'failed': 0,
+        'updated_at': now_iso(),
+    })
+
+
+def increment_ocr_chunk_progress(workflow_id: str, failed: bool = False) -> dict:
+    """Atomically count a finished OCR chunk and return the updated counters"""
+    table = get_table()
+    response = table.update_item(
+        Key={'PK': f'WF#{workflow_id}', 'SK': 'OCR_CHUNKS'},
+        UpdateExpression='ADD #counter :one SET updated_at = :updated_at',
+        ExpressionAttributeNames={'#counter': 'failed' if failed else 'completed'},
+        ExpressionAttributeValues={':one': 1, ':updated_at': now_iso()},
+        ReturnValues='ALL_NEW',
+    )
+    return decimal_to_python(response.get('Attributes', {}))
+
+
+def get_ocr_chunk_progress(workflow_id: str) -> Optional[dict]:
+    """Get OCR chunk counters (total, completed, failed)"""
+    table = get_table()
+    response = table.get_item(Key={'PK': f'WF#{workflow_id}', 'SK': 'OCR_CHUNKS'})
+    item = response.get('Item')
+    return decimal_to_python(item) if item else None
+
+
 def record_step_start(workflow_id: str, step_name: str, **kwargs) -> dict:
     """Update step status to in_progress in STEP row"""
     table = get_table()
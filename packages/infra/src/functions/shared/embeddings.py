@@ -1,9 +1,23 @@
+import hashlib
 import json
 import os
+import random
 import re
-from typing import List
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
 
 import boto3
+from botocore.config import Config
+from botocore.exceptions import (
+    ClientError,
+    ConnectTimeoutError,
+    EndpointConnectionError,
+    ReadTimeoutError,
+)
 
 
 _HTML_TAG_RE = re.compile(r'<[^>]+>')
@@ -28,32 +42,340 @@ def strip_markup(text: str) -> str:
 EMBEDDING_MODEL_ID = os.environ.get(
     'EMBEDDING_MODEL_ID', 'amazon.nova-2-multimodal-embeddings-v1:0'
 )
+EMBEDDING_DIMENSION = 1024
 
+# Upper bound of concurrent invoke_model calls per batch
+EMBEDDING_MAX_CONCURRENCY = int(os.environ.get('EMBEDDING_MAX_CONCURRENCY', '8'))
+# Attempts per text before the batch fails
+EMBEDDING_MAX_RETRIES = int(os.environ.get('EMBEDDING_MAX_RETRIES', '5'))
+
+# Content-hash embedding cache (in-process LRU in front of DynamoDB)
+EMBEDDING_CACHE_ENABLED = os.environ.get('EMBEDDING_CACHE_ENABLED', 'true').lower() == 'true'
+EMBEDDING_CACHE_LRU_SIZE = int(os.environ.get('EMBEDDING_CACHE_LRU_SIZE', '4096'))
+# DynamoDB TTL of cache items; hits in the second half of the window extend it
+EMBEDDING_CACHE_TTL_DAYS = int(os.environ.get('EMBEDDING_CACHE_TTL_DAYS', '30'))
+
+# Error codes worth retrying; throttling codes also shrink the concurrency window
+_THROTTLING_CODES = ('ThrottlingException', 'TooManyRequestsException')
+_RETRYABLE_CODES = _THROTTLING_CODES + (
+    'ServiceUnavailableException',
+    'ModelNotReadyException',
+    'InternalServerException',
+    'ModelTimeoutException',
+)
+# Transport failures (botocore retries are disabled); treated like throttling
+_CONNECTION_ERRORS = (ReadTimeoutError, ConnectTimeoutError, EndpointConnectionError)
+
+_bedrock_client = None
 
-def generate_single_embedding(text: str, client=None) -> List[float]:
-    if client is None:
-        client = boto3.client(
-            'bedrock-runtime', region_name=os.environ.get('AWS_REGION', 'us-east-1')
-        )
 
-    try:
-        clean_text = strip_markup(text)
-        response = client.invoke_model(
-            modelId=EMBEDDING_MODEL_ID,
-            body=json.dumps(
-                {
-                    'taskType': 'SINGLE_EMBEDDING',
-                    'singleEmbeddingParams': {
-                        'embeddingPurpose': 'GENERIC_INDEX',
-                        'embeddingDimension': 1024,
-                        'text': {'truncationMode': 'END', 'value': clean_text},
-                    },
-                }
+class EmbeddingError(Exception):
+    """Raised when an embedding could not be generated after retries."""
+
+
+def get_bedrock_client():
+    global _bedrock_client
+    if _bedrock_client is None:
+        # Retries are handled here (with adaptive concurrency), not by botocore
+        _bedrock_client = boto3.client(
+            'bedrock-runtime',
+            region_name=os.environ.get('AWS_REGION', 'us-east-1'),
+            config=Config(
+                max_pool_connections=max(10, EMBEDDING_MAX_CONCURRENCY),
+                retries={'max_attempts': 1, 'mode': 'standard'},
             ),
-            contentType='application/json',
         )
-        result = json.loads(response['body'].read())
-        return result['embeddings'][0]['embedding']
-    except Exception as e:
-        print(f'Error generating embedding: {e}')
-        return [0.0] * 1024
+    return _bedrock_client
+
+
+def content_hash(clean_text: str) -> str:
+    """sha256 of the strip_markup output, used as the embedding cache key."""
+    return hashlib.sha256(clean_text.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """Content-hash embedding cache shared across workflows.
+
+    Lookups go to an in-process LRU first and then to DynamoDB items
+    (PK: EMB#{model_id}#{dimension}, SK: sha256 of the cleaned text) in the
+    backend table. Vectors are stored as packed float32 bytes. Items carry an
+    expires_at TTL attribute, so entries that stop being hit are removed by
+    DynamoDB. Cache errors are logged and treated as misses so they never
+    fail embedding.
+    """
+
+    def __init__(
+        self,
+        table=None,
+        resource=None,
+        lru_size: int = EMBEDDING_CACHE_LRU_SIZE,
+        ttl_seconds: int = EMBEDDING_CACHE_TTL_DAYS * 86400,
+    ):
+        self._table = table
+        self._resource = resource
+        self._lru: OrderedDict = OrderedDict()
+        self._lru_size = lru_size
+        self._ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _pk(model_id: str, dimension: int) -> str:
+        return f'EMB#{model_id}#{dimension}'
+
+    def _write_items(self, pk: str, vectors: Dict[str, bytes]):
+        """Put packed vectors with a fresh expires_at."""
+        expires_at = int(time.time()) + self._ttl_seconds
+        with self._table.batch_writer(overwrite_by_pkeys=['PK', 'SK']) as batch:
+            for h, raw in vectors.items():
+                batch.put_item(Item={
+                    'PK': pk,
+                    'SK': h,
+                    'vector': raw,
+                    'expires_at': expires_at,
+                })
+
+    def _lru_get(self, key: tuple) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._lru.get(key)
+            if vector is not None:
+                self._lru.move_to_end(key)
+            return vector
+
+    def _lru_put(self, key: tuple, vector: List[float]):
+        with self._lock:
+            self._lru[key] = vector
+            self._lru.move_to_end(key)
+            while len(self._lru) > self._lru_size:
+                self._lru.popitem(last=False)
+
+    def get_many(self, model_id: str, dimension: int, hashes: List[str]) -> Dict[str, List[float]]:
+        """Return cached vectors for the given content hashes (misses are omitted).
+
+        DynamoDB hits in the second half of their TTL window are rewritten with
+        a fresh expires_at, so vectors that keep being reused do not expire.
+        """
+        found = {}
+        remote = []
+        for h in set(hashes):
+            vector = self._lru_get((model_id, dimension, h))
+            if vector is not None:
+                found[h] = vector
+            else:
+                remote.append(h)
+
+        if not remote or self._table is None:
+            return found
+
+        pk = self._pk(model_id, dimension)
+        refresh_before = time.time() + self._ttl_seconds / 2
+        stale = {}
+        try:
+            for i in range(0, len(remote), 100):
+                request = {self._table.name: {
+                    'Keys': [{'PK': pk, 'SK': h} for h in remote[i:i + 100]],
+                    'ProjectionExpression': '#sk, #vector, #expires_at',
+                    'ExpressionAttributeNames': {'#sk': 'SK', '#vector': 'vector', '#expires_at': 'expires_at'},
+                }}
+                while request:
+                    response = self._resource.batch_get_item(RequestItems=request)
+                    for item in response.get('Responses', {}).get(self._table.name, []):
+                        raw = item['vector']
+                        raw = raw.value if hasattr(raw, 'value') else raw
+                        vector = array('f')
+                        vector.frombytes(raw)
+                        vector = vector.tolist()
+                        found[item['SK']] = vector
+                        self._lru_put((model_id, dimension, item['SK']), vector)
+                        if item.get('expires_at', 0) < refresh_before:
+                            stale[item['SK']] = raw
+                    request = response.get('UnprocessedKeys') or None
+        except Exception as e:
+            print(f'[WARN] Embedding cache lookup failed: {e}')
+
+        if stale:
+            try:
+                self._write_items(pk, stale)
+            except Exception as e:
+                print(f'[WARN] Embedding cache TTL refresh failed: {e}')
+
+        return found
+
+    def put_many(self, model_id: str, dimension: int, vectors: Dict[str, List[float]]):
+        """Store vectors keyed by content hash."""
+        for h, vector in vectors.items():
+            self._lru_put((model_id, dimension, h), vector)
+
+        if not vectors or self._table is None:
+            return
+
+        pk = self._pk(model_id, dimension)
+        try:
+            self._write_items(pk, {h: array('f', vector).tobytes() for h, vector in vectors.items()})
+        except Exception as e:
+            print(f'[WARN] Embedding cache write failed: {e}')
+
+
+_embedding_cache = None
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Process-wide embedding cache, or None when disabled."""
+    global _embedding_cache
+    if not EMBEDDING_CACHE_ENABLED:
+        return None
+    if _embedding_cache is None:
+        table = resource = None
+        if os.environ.get('BACKEND_TABLE_NAME'):
+            from .ddb_client import get_ddb_resource, get_table
+            table, resource = get_table(), get_ddb_resource()
+        _embedding_cache = EmbeddingCache(table=table, resource=resource)
+    return _embedding_cache
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD limiter for in-flight requests.
+
+    The window is halved whenever a request is throttled and grows by one
+    after a full window of successful requests, up to max_concurrency.
+    """
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = self.max_concurrency
+        self._in_flight = 0
+        self._successes = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self._in_flight >= self.limit:
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self, throttled: bool = False):
+        with self._cond:
+            self._in_flight -= 1
+            if throttled:
+                self.limit = max(1, self.limit // 2)
+                self._successes = 0
+            else:
+                self._successes += 1
+                if self._successes >= self.limit and self.limit < self.max_concurrency:
+                    self.limit += 1
+                    self._successes = 0
+            self._cond.notify_all()
+
+
+def invoke_embedding(
+    client, text: str, model_id: str = EMBEDDING_MODEL_ID, dimension: int = EMBEDDING_DIMENSION
+) -> List[float]:
+    """Single invoke_model call for already cleaned, non-empty text."""
+    response = client.invoke_model(
+        modelId=model_id,
+        body=json.dumps(
+            {
+                'taskType': 'SINGLE_EMBEDDING',
+                'singleEmbeddingParams': {
+                    'embeddingPurpose': 'GENERIC_INDEX',
+                    'embeddingDimension': dimension,
+                    'text': {'truncationMode': 'END', 'value': text},
+                },
+            }
+        ),
+        contentType='application/json',
+    )
+    result = json.loads(response['body'].read())
+    return result['embeddings'][0]['embedding']
+
+
+def _embed_with_retry(
+    client,
+    text: str,
+    limiter: AdaptiveConcurrencyLimiter,
+    model_id: str,
+    dimension: int,
+    max_retries: int,
+) -> List[float]:
+    last_error = None
+    for attempt in range(max_retries):
+        limiter.acquire()
+        throttled = False
+        try:
+            return invoke_embedding(client, text, model_id, dimension)
+        except ClientError as e:
+            code = e.response.get('Error', {}).get('Code', '')
+            if code not in _RETRYABLE_CODES:
+                raise EmbeddingError(f'Embedding request rejected ({code}): {e}') from e
+            throttled = code in _THROTTLING_CODES
+            last_error = e
+        except _CONNECTION_ERRORS as e:
+            throttled = True
+            last_error = e
+        finally:
+            limiter.release(throttled=throttled)
+
+        delay = min(20.0, 0.5 * (2 ** attempt)) * (0.5 + random.random())
+        print(f'[WARN] Embedding attempt {attempt + 1}/{max_retries} failed ({last_error}), retrying in {delay:.1f}s')
+        time.sleep(delay)
+
+    raise EmbeddingError(f'Embedding failed after {max_retries} attempts: {last_error}')
+
+
+def generate_embeddings(
+    texts: List[str],
+    client=None,
+    model_id: str = EMBEDDING_MODEL_ID,
+    dimension: int = EMBEDDING_DIMENSION,
+    max_concurrency: int = EMBEDDING_MAX_CONCURRENCY,
+    max_retries: int = EMBEDDING_MAX_RETRIES,
+    use_cache: bool = True,
+) -> List[List[float]]:
+    """Generate embeddings for many texts with bounded, adaptive concurrency.
+
+    Texts are cleaned with strip_markup; empty texts map to a zero vector
+    without a model call. Identical cleaned texts are embedded once, and
+    vectors found in the content-hash cache are reused. Throttled requests
+    shrink the concurrency window and are retried with exponential backoff;
+    connection and read timeouts are handled the same way.
+
+    Returns:
+        Embeddings in the same order as texts
+
+    Raises:
+        EmbeddingError: If any text could not be embedded
+    """
+    if client is None:
+        client = get_bedrock_client()
+
+    cleaned = [strip_markup(t or '') for t in texts]
+    hashes = [content_hash(t) if t else '' for t in cleaned]
+    by_hash: Dict[str, List[float]] = {}
+
+    unique = {h: i for i, h in enumerate(hashes) if h}
+    cache = get_embedding_cache() if use_cache else None
+    if cache is not None and unique:
+        by_hash.update(cache.get_many(model_id, dimension, list(unique)))
+
+    misses = [h for h in unique if h not in by_hash]
+    if misses:
+        limiter = AdaptiveConcurrencyLimiter(min(max_concurrency, len(misses)))
+
+        def _embed(h: str) -> List[float]:
+            return _embed_with_retry(client, cleaned[unique[h]], limiter, model_id, dimension, max_retries)
+
+        with ThreadPoolExecutor(max_workers=limiter.max_concurrency) as executor:
+            computed = dict(zip(misses, executor.map(_embed, misses)))
+
+        by_hash.update(computed)
+        if cache is not None:
+            cache.put_many(model_id, dimension, computed)
+
+    if unique:
+        print(f'Embeddings: {len(unique)} unique texts, {len(unique) - len(misses)} cached, {len(misses)} generated')
+
+    return [by_hash[h] if h else [0.0] * dimension for h in hashes]
+
+
+def generate_single_embedding(text: str, client=None) -> List[float]:
+    """Generate one embedding. Raises EmbeddingError on failure."""
+    return generate_embeddings([text], client=client)[0]
@@ -1,4 +1,3 @@
-import json
 import os
 from datetime import datetime
 from typing import Any, List, Optional
@@ -9,7 +8,7 @@ from lancedb.embeddings import TextEmbeddingFunction, register
 from lancedb.pydantic import LanceModel, Vector
 from pydantic import PrivateAttr
 
-from .embeddings import EMBEDDING_MODEL_ID, strip_markup
+from .embeddings import EMBEDDING_DIMENSION, EMBEDDING_MODEL_ID, generate_embeddings, get_bedrock_client
 
 LANCEDB_BUCKET_SSM_KEY = '/idp-v2/lancedb/storage/bucket-name'
 LANCEDB_LOCK_TABLE_SSM_KEY = '/idp-v2/lancedb/lock/table-name'
@@ -45,44 +44,17 @@ class BedrockEmbeddingFunction(TextEmbeddingFunction):
 
     def __init__(self, **data):
         super().__init__(**data)
-        self._client = boto3.client(
-            'bedrock-runtime', region_name=os.environ.get('AWS_REGION', 'us-east-1')
-        )
-        self._ndims = 1024
+        self._client = get_bedrock_client()
+        self._ndims = EMBEDDING_DIMENSION
 
     def ndims(self) -> int:
         return self._ndims
 
     def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
-        embeddings = []
-        for text in texts:
-            clean_text = strip_markup(text or '')
-            if not clean_text:
-                embeddings.append([0.0] * self._ndims)
-                continue
-            try:
-                response = self._client.invoke_model(
-                    modelId=self.model_id,
-                    body=json.dumps(
-                        {
-                            'taskType': 'SINGLE_EMBEDDING',
-                            'singleEmbeddingParams': {
-                                'embeddingPurpose': 'GENERIC_INDEX',
-                                'embeddingDimension': 1024,
-                                'text': {'truncationMode': 'END', 'value': clean_text},
-                            },
-                        }
-                    ),
-                    contentType='application/json',
-                )
-                result = json.loads(response['body'].read())
-                embedding = result['embeddings'][0]['embedding']
-                embeddings.append(embedding)
-            except Exception as e:
-                print(f'Error generating embedding: {e}')
-                embeddings.append([0.0] * self._ndims)
-
-        return embeddings
+        # Raises EmbeddingError instead of indexing zero vectors for failed texts
+        return generate_embeddings(
+            texts, client=self._client, model_id=self.model_id, dimension=self._ndims
+        )
 
 
 bedrock_embeddings = BedrockEmbeddingFunction.create()
@@ -0,0 +1,164 @@
+"""
+Content-addressed OCR page cache
+
+Identical pages (re-uploads, re-analysis runs, templated forms and contracts)
+are OCR'd once per project. A page is identified by a digest of its content
+(raw bytes for single-frame images, a pdfium digest of the page objects for
+PDF pages) combined with the OCR model and options:
+
+  projects/{project_id}/documents/_ocr_cache/{model}/{key[:2]}/{key}.json
+
+The cache lives under documents/ so its writes do not match the S3 upload
+trigger, and it is removed together with the project.
+
+The OCR orchestrator resolves cache hits and records them per workflow in
+  {document_base}/paddleocr/cache_manifest.json
+so that processors only fill misses and mergers read hits back.
+"""
+import hashlib
+import json
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, Optional
+
+from botocore.exceptions import ClientError
+
+from .s3_analysis import get_s3_client
+
+OCR_CACHE_ENABLED = os.environ.get('OCR_CACHE_ENABLED', 'true').lower() == 'true'
+# Bump to invalidate every entry when OCR output changes (model upgrade, new fields)
+OCR_CACHE_VERSION = 1
+# Concurrent S3 requests for cache lookups, reads and writes
+OCR_CACHE_WORKERS = int(os.environ.get('OCR_CACHE_WORKERS', '16'))
+
+CACHE_DIR_NAME = '_ocr_cache'
+
+
+def get_cache_prefix(base_path: str) -> Optional[str]:
+    """projects/{p}/documents/{d} -> projects/{p}/documents/_ocr_cache"""
+    parts = base_path.split('/')
+    if 'documents' not in parts:
+        return None
+    return '/'.join(parts[:parts.index('documents') + 1] + [CACHE_DIR_NAME])
+
+
+def get_cache_object_key(base_path: str, ocr_model: str, ocr_options: Optional[dict], digest: str) -> Optional[str]:
+    """S3 key of the cache entry for a page digest under this model and options."""
+    prefix = get_cache_prefix(base_path)
+    if prefix is None or not digest:
+        return None
+    key = hashlib.sha256(json.dumps({
+        'version': OCR_CACHE_VERSION,
+        'model': ocr_model,
+        'options': ocr_options or {},
+        'page': digest,
+    }, sort_keys=True).encode('utf-8')).hexdigest()
+    return f'{prefix}/{ocr_model}/{key[:2]}/{key}.json'
+
+
+def find_cached_pages(bucket: str, page_keys: list[Optional[str]]) -> list[int]:
+    """Return indices of pages whose cache entry exists."""
+    s3 = get_s3_client()
+
+    def _exists(key):
+        if key is None:
+            return False
+        try:
+            s3.head_object(Bucket=bucket, Key=key)
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] not in ('404', 'NoSuchKey', 'NotFound', '403'):
+                print(f'[WARN] OCR cache lookup failed for {key}: {e}')
+            return False
+
+    with ThreadPoolExecutor(max_workers=OCR_CACHE_WORKERS) as executor:
+        found = list(executor.map(_exists, page_keys))
+    return [page_index for page_index, hit in enumerate(found) if hit]
+
+
+def read_cached_pages(bucket: str, page_keys: list[Optional[str]], page_indices: Iterable[int]) -> Iterator[dict]:
+    """Yield cached page records in the given order, with page_index set.
+
+    Up to OCR_CACHE_WORKERS entries are fetched ahead concurrently.
+    """
+    s3 = get_s3_client()
+
+    def _read(page_index):
+        response = s3.get_object(Bucket=bucket, Key=page_keys[page_index])
+        page = json.loads(response['Body'].read().decode('utf-8'))
+        page['page_index'] = page_index
+        return page
+
+    indices = iter(page_indices)
+    with ThreadPoolExecutor(max_workers=OCR_CACHE_WORKERS) as executor:
+        pending = deque(executor.submit(_read, i) for _, i in zip(range(OCR_CACHE_WORKERS), indices))
+        while pending:
+            page = pending.popleft().result()
+            next_index = next(indices, None)
+            if next_index is not None:
+                pending.append(executor.submit(_read, next_index))
+            yield page
+
+
+def write_cached_pages(bucket: str, page_keys: list[Optional[str]], pages: list[dict]) -> int:
+    """Store OCR page records under their cache keys (best effort).
+
+    Returns the number of entries written.
+    """
+    s3 = get_s3_client()
+
+    def _write(page):
+        page_index = page.get('page_index')
+        if page_index is None or not 0 <= page_index < len(page_keys) or page_keys[page_index] is None:
+            return False
+        entry = {k: v for k, v in page.items() if k != 'page_index'}
+        try:
+            s3.put_object(
+                Bucket=bucket,
+                Key=page_keys[page_index],
+                Body=json.dumps(entry, ensure_ascii=False),
+                ContentType='application/json',
+            )
+            return True
+        except Exception as e:
+            print(f'[WARN] Failed to write OCR cache entry for page {page_index}: {e}')
+            return False
+
+    with ThreadPoolExecutor(max_workers=OCR_CACHE_WORKERS) as executor:
+        return sum(executor.map(_write, pages))
+
+
+def _manifest_key(base_path: str) -> str:
+    return f'{base_path}/paddleocr/cache_manifest.json'
+
+
+def save_cache_manifest(bucket: str, base_path: str, workflow_id: str, ocr_model: str,
+                        page_keys: list[Optional[str]], cached_pages: list[int]) -> None:
+    """Record the page cache keys and hits resolved for this workflow."""
+    get_s3_client().put_object(
+        Bucket=bucket,
+        Key=_manifest_key(base_path),
+        Body=json.dumps({
+            'workflow_id': workflow_id,
+            'model': ocr_model,
+            'page_keys': page_keys,
+            'cached_pages': cached_pages,
+        }),
+        ContentType='application/json',
+    )
+
+
+def load_cache_manifest(bucket: str, base_path: str, workflow_id: str) -> Optional[dict]:
+    """Load the cache manifest written for this workflow, if any."""
+    try:
+        response = get_s3_client().get_object(Bucket=bucket, Key=_manifest_key(base_path))
+        manifest = json.loads(response['Body'].read().decode('utf-8'))
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ('NoSuchKey', '404'):
+            print(f'[WARN] Failed to read OCR cache manifest: {e}')
+        return None
+    # A manifest from an earlier run of the same document must not be reused
+    if manifest.get('workflow_id') != workflow_id:
+        return None
+    return manifest
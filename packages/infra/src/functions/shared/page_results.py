@@ -0,0 +1,180 @@
+"""
+Line-delimited per-page result files
+
+Preprocessors (format-parser, PaddleOCR) write one JSON record per page or
+chunk instead of a single document-sized JSON object, so neither the writer
+nor segment-builder has to hold the whole document in memory.
+
+Layout of result.jsonl:
+  line 1:  {"format": "jsonl-pages", "version": 1, "count": N, "meta": {...},
+            "index": [[record_index, offset, length], ...]}
+  line 2+: one JSON record per line; offsets are relative to the end of line 1
+
+Readers fetch the header once and then individual records by index through
+ranged GETs.
+"""
+import io
+import json
+import tempfile
+from typing import Iterable, Iterator, Optional
+
+from botocore.exceptions import ClientError
+
+from .s3_analysis import get_s3_client, parse_s3_uri
+from .s3_range_file import S3RangeFile
+
+PAGE_RESULTS_FORMAT = 'jsonl-pages'
+PAGE_RESULTS_VERSION = 1
+PAGE_RESULTS_CONTENT_TYPE = 'application/x-ndjson'
+
+
+class _ChainedReader(io.RawIOBase):
+    """Read a header bytes object followed by the contents of a file."""
+
+    def __init__(self, header: bytes, body):
+        super().__init__()
+        self._header = io.BytesIO(header)
+        self._body = body
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        n = self._header.readinto(buffer)
+        if n:
+            return n
+        return self._body.readinto(buffer)
+
+
+class PageResultsWriter:
+    """Incrementally write page records to a temp file, then upload once.
+
+    Usage:
+        with PageResultsWriter(bucket, key, meta={'model': 'pp-ocrv5'}) as writer:
+            for page in pages:
+                writer.add(page)
+            uri = writer.commit()
+    """
+
+    def __init__(self, bucket: str, key: str, meta: Optional[dict] = None, client=None):
+        self.bucket = bucket
+        self.key = key
+        self.meta = meta or {}
+        self._client = client or get_s3_client()
+        self._body = tempfile.TemporaryFile(dir='/tmp')
+        self._index = []
+        self._offset = 0
+
+    def __enter__(self) -> 'PageResultsWriter':
+        return self
+
+    def __exit__(self, *exc):
+        self._body.close()
+
+    @property
+    def count(self) -> int:
+        return len(self._index)
+
+    def add(self, record: dict, index: Optional[int] = None):
+        """Append a record; `index` defaults to its position in the file."""
+        line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+        self._body.write(line)
+        self._index.append([self.count if index is None else index, self._offset, len(line)])
+        self._offset += len(line)
+
+    def commit(self) -> str:
+        """Upload header + records and return the S3 URI."""
+        header = json.dumps({
+            'format': PAGE_RESULTS_FORMAT,
+            'version': PAGE_RESULTS_VERSION,
+            'count': self.count,
+            'meta': self.meta,
+            'index': self._index,
+        }, ensure_ascii=False).encode('utf-8') + b'\n'
+
+        self._body.seek(0)
+        self._client.upload_fileobj(
+            _ChainedReader(header, self._body),
+            self.bucket,
+            self.key,
+            ExtraArgs={'ContentType': PAGE_RESULTS_CONTENT_TYPE},
+        )
+        uri = f's3://{self.bucket}/{self.key}'
+        print(f'Saved {self.count} records to {uri} ({(len(header) + self._offset) / (1024 * 1024):.1f}MB)')
+        return uri
+
+
+class PageResultsReader:
+    """Lazy, thread-safe access to a result.jsonl file by record index."""
+
+    def __init__(self, stream: S3RangeFile):
+        self._stream = stream
+        header_line = self._read_header_line()
+        header = json.loads(header_line)
+        if header.get('format') != PAGE_RESULTS_FORMAT:
+            raise ValueError(f'Not a page results file: s3://{stream.bucket}/{stream.key}')
+        self._body_offset = len(header_line)
+        self.meta = header.get('meta', {})
+        self._index = {index: (offset, length) for index, offset, length in header.get('index', [])}
+        self._order = [entry[0] for entry in header.get('index', [])]
+
+    def _read_header_line(self) -> bytes:
+        step = 64 * 1024
+        data = b''
+        while True:
+            chunk = self._stream.read_at(len(data), step)
+            if not chunk:
+                raise ValueError('Page results header is not terminated')
+            data += chunk
+            newline = data.find(b'\n')
+            if newline >= 0:
+                return data[:newline + 1]
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, index: int) -> bool:
+        return index in self._index
+
+    def indices(self) -> list[int]:
+        return list(self._order)
+
+    def get(self, index: int) -> Optional[dict]:
+        location = self._index.get(index)
+        if location is None:
+            return None
+        offset, length = location
+        return json.loads(self._stream.read_at(self._body_offset + offset, length))
+
+    def __iter__(self) -> Iterator[tuple[int, dict]]:
+        for index in self._order:
+            yield index, self.get(index)
+
+    def stats(self) -> str:
+        return self._stream.stats()
+
+
+def open_page_results(uri: str) -> Optional[PageResultsReader]:
+    """Open a result.jsonl file. Returns None if it does not exist."""
+    bucket, key = parse_s3_uri(uri)
+    try:
+        stream = S3RangeFile(bucket, key)
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('NoSuchKey', '404', 'NotFound'):
+            return None
+        raise
+    return PageResultsReader(stream)
+
+
+def save_ocr_result(bucket: str, base_path: str, pages: Iterable[dict], meta: dict, content: str = '') -> tuple[str, int]:
+    """Write OCR pages to paddleocr/result.jsonl.
+
+    Results without pages (single images) are stored as one record holding
+    `content`. Returns (uri, page_count).
+    """
+    with PageResultsWriter(bucket, f'{base_path}/paddleocr/result.jsonl', meta=meta) as writer:
+        for page in pages:
+            writer.add(page)
+        if writer.count == 0 and content:
+            writer.add({'content': content})
+        return writer.commit(), writer.count
@@ -3,14 +3,34 @@ S3 Analysis Data Helper
 
 Handles reading/writing segment analysis data to S3.
 Storage format: s3://bucket/projects/{project_id}/documents/{document_id}/analysis/segment_XXXX.json
+
+Small, frequently mutated fields (see SEGMENT_STATE_FIELDS) are stored as
+separate sidecar objects next to the segment document:
+  analysis/state/segment_XXXX/{field}.json
+so that status flips and analysis appends never rewrite the large segment
+document (paddleocr_blocks, format_parser, ...), and writers of different
+fields never overwrite each other. Readers GET the known sidecar keys and
+overlay the ones that exist on the document.
+
+Writers of the same field are not always exclusive: ai_analysis is written by
+segment-analyzer, qa-regenerator and the reanalysis clear. Appends go through
+conditional_update_json (ETag) so they merge with concurrent writes; blind
+writes are only used for a field's sole writer or for an intended reset.
 """
 import json
 import os
+import random
+import time
 from enum import Enum
-from typing import Optional
+from typing import Any, Callable, Optional
 from urllib.parse import urlparse
 
 import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+# Connection pool size for the shared S3 client (threaded segment readers/writers)
+S3_MAX_POOL_CONNECTIONS = int(os.environ.get('S3_MAX_POOL_CONNECTIONS', '50'))
 
 
 class SegmentStatus(str, Enum):
@@ -23,13 +43,30 @@ class SegmentStatus(str, Enum):
     COMPLETED = 'completed'
     FAILED = 'failed'
 
+# Fields stored in per-field sidecar objects instead of the segment document
+SEGMENT_STATE_FIELDS = ('status', 'error', 'ai_analysis', 'page_description', 'graph_entities')
+
+# Attempts for conditional (ETag) read-modify-write before giving up
+SEGMENT_WRITE_MAX_ATTEMPTS = int(os.environ.get('SEGMENT_WRITE_MAX_ATTEMPTS', '5'))
+
+# S3 error codes returned when a conditional PUT loses a race
+CONDITIONAL_WRITE_CONFLICT_CODES = ('PreconditionFailed', 'ConditionalRequestConflict')
+
+
+class SegmentWriteConflict(Exception):
+    """Raised when a conditional segment write keeps losing to concurrent writers."""
+
 s3_client = None
 
 
 def get_s3_client():
     global s3_client
     if s3_client is None:
-        s3_client = boto3.client('s3', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
+        s3_client = boto3.client(
+            's3',
+            region_name=os.environ.get('AWS_REGION', 'us-east-1'),
+            config=Config(max_pool_connections=S3_MAX_POOL_CONNECTIONS),
+        )
     return s3_client
 
 
@@ -41,6 +78,27 @@ def parse_s3_uri(uri: str) -> tuple:
     return bucket, key
 
 
+def get_analysis_base_dir(file_uri: str) -> str:
+    """Get the document directory (parent of analysis/) for a file URI."""
+    _, key = parse_s3_uri(file_uri)
+
+    # If /analysis/ already in path, extract base directory before it
+    if '/analysis/' in key:
+        return key.split('/analysis/')[0]
+    # Remove file name, get directory
+    return key.rsplit('/', 1)[0]
+
+
+def get_segment_state_prefix(file_uri: str, segment_index: int) -> str:
+    """
+    Generate S3 key prefix for a segment's state sidecar objects.
+
+    Returns:
+        Prefix like: projects/{project_id}/documents/{document_id}/analysis/state/segment_0000/
+    """
+    return f'{get_analysis_base_dir(file_uri)}/analysis/state/segment_{segment_index:04d}/'
+
+
 def get_analysis_s3_key(file_uri: str, segment_index: int) -> str:
     """
     Generate S3 key for segment analysis file.
@@ -77,55 +135,207 @@ def get_summary_s3_key(file_uri: str) -> str:
     Returns:
         S3 key like: projects/{project_id}/documents/{document_id}/analysis/summary.json
     """
-    _, key = parse_s3_uri(file_uri)
+    return f'{get_analysis_base_dir(file_uri)}/analysis/summary.json'
 
-    # If /analysis/ already in path, extract base directory before it
-    if '/analysis/' in key:
-        base_dir = key.split('/analysis/')[0]
+
+def split_segment_state(data: dict) -> tuple[dict, dict]:
+    """Split segment data into (document fields, state sidecar fields)."""
+    document = {k: v for k, v in data.items() if k not in SEGMENT_STATE_FIELDS}
+    state = {k: v for k, v in data.items() if k in SEGMENT_STATE_FIELDS}
+    return document, state
+
+
+def save_segment_state(file_uri: str, segment_index: int, **fields) -> dict:
+    """
+    Write segment state fields to their sidecar objects.
+
+    Each field is a blind PUT of its own small object, so no read is needed
+    and concurrent writers of different fields cannot lose each other's updates.
+    A concurrent writer of the same field is overwritten; use
+    conditional_update_json where a field has several writers.
+    Multiple fields are written concurrently (one round trip).
+
+    Args:
+        file_uri: Original file URI
+        segment_index: Segment index
+        **fields: State fields to write (must be in SEGMENT_STATE_FIELDS)
+
+    Returns:
+        Dict of the fields that were written
+    """
+    client = get_s3_client()
+    bucket, _ = parse_s3_uri(file_uri)
+    prefix = get_segment_state_prefix(file_uri, segment_index)
+
+    for field in fields:
+        if field not in SEGMENT_STATE_FIELDS:
+            raise ValueError(f'Not a segment state field: {field}')
+
+    def _put(item):
+        field, value = item
+        client.put_object(
+            Bucket=bucket,
+            Key=f'{prefix}{field}.json',
+            Body=json.dumps(value, ensure_ascii=False),
+            ContentType='application/json'
+        )
+
+    if len(fields) > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=len(fields)) as executor:
+            list(executor.map(_put, fields.items()))
     else:
-        # Remove file name, get directory
-        base_dir = key.rsplit('/', 1)[0]
+        for item in fields.items():
+            _put(item)
 
-    return f'{base_dir}/analysis/summary.json'
+    return fields
 
 
-def save_segment_analysis(
-    file_uri: str,
-    segment_index: int,
-    data: dict
-) -> str:
+def get_segment_state(file_uri: str, segment_index: int) -> dict:
     """
-    Save segment analysis data to S3.
+    Read all state sidecar fields of a segment.
 
     Args:
-        file_uri: Original file URI to determine bucket and path
+        file_uri: Original file URI
         segment_index: Segment index
-        data: Segment data dict (segment_index, image_uri, bda_indexer, format_parser, image_analysis)
 
     Returns:
-        S3 key where data was saved
+        Dict of state fields that have a sidecar object (may be empty). A
+        sidecar that cannot be read is left out, so the document's value is used.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    client = get_s3_client()
+    bucket, _ = parse_s3_uri(file_uri)
+    prefix = get_segment_state_prefix(file_uri, segment_index)
+
+    def _get(field):
+        key = f'{prefix}{field}.json'
+        try:
+            body = client.get_object(Bucket=bucket, Key=key)['Body'].read()
+            return field, json.loads(body.decode('utf-8'))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') not in ('NoSuchKey', '404'):
+                print(f'[WARN] Error getting segment state {key}: {e}')
+        except ValueError as e:
+            print(f'[WARN] Invalid segment state {key}: {e}')
+        return None
+
+    with ThreadPoolExecutor(max_workers=len(SEGMENT_STATE_FIELDS)) as executor:
+        found = list(executor.map(_get, SEGMENT_STATE_FIELDS))
+    return dict(item for item in found if item is not None)
+
+
+def conditional_update_json(
+    bucket: str,
+    key: str,
+    mutate: Callable[[Any], Any],
+    default: Optional[Callable[[], Any]] = None,
+    max_attempts: int = SEGMENT_WRITE_MAX_ATTEMPTS,
+) -> Optional[Any]:
+    """
+    Read-modify-write a JSON object with optimistic concurrency.
+
+    The object is read together with its ETag and written back with
+    If-Match (or If-None-Match: * when it did not exist). When another writer
+    got there first, the object is re-read and mutate is re-applied to the
+    fresh value, so concurrent updates are merged instead of lost.
+
+    Args:
+        bucket: S3 bucket
+        key: S3 key of the JSON object
+        mutate: Function receiving the current value and returning the new value
+        default: Factory for the initial value when the object does not exist.
+            If None, a missing object is left untouched and None is returned.
+        max_attempts: Maximum read-modify-write attempts
+
+    Returns:
+        The value that was written, or None if the object does not exist and no default was given
+
+    Raises:
+        SegmentWriteConflict: If every attempt lost to a concurrent writer
     """
     client = get_s3_client()
+
+    for attempt in range(max_attempts):
+        try:
+            response = client.get_object(Bucket=bucket, Key=key)
+            current = json.loads(response['Body'].read().decode('utf-8'))
+            condition = {'IfMatch': response['ETag']}
+        except client.exceptions.NoSuchKey:
+            if default is None:
+                return None
+            current = default()
+            condition = {'IfNoneMatch': '*'}
+
+        updated = mutate(current)
+        try:
+            client.put_object(
+                Bucket=bucket,
+                Key=key,
+                Body=json.dumps(updated, ensure_ascii=False),
+                ContentType='application/json',
+                **condition
+            )
+            return updated
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') not in CONDITIONAL_WRITE_CONFLICT_CODES:
+                raise
+            delay = min(2.0, 0.05 * (2 ** attempt)) * (0.5 + random.random())
+            print(f'[WARN] Conditional write conflict on {key} (attempt {attempt + 1}/{max_attempts}), retrying in {delay:.2f}s')
+            time.sleep(delay)
+
+    raise SegmentWriteConflict(f'Gave up updating {key} after {max_attempts} conflicting attempts')
+
+
+def _put_segment_document(file_uri: str, segment_index: int, document: dict) -> str:
+    """Write the segment document object as-is. Returns the S3 key."""
+    client = get_s3_client()
     bucket, _ = parse_s3_uri(file_uri)
     s3_key = get_analysis_s3_key(file_uri, segment_index)
 
     client.put_object(
         Bucket=bucket,
         Key=s3_key,
-        Body=json.dumps(data, ensure_ascii=False, indent=2),
+        Body=json.dumps(document, ensure_ascii=False),
         ContentType='application/json'
     )
+    return s3_key
+
+
+def save_segment_analysis(
+    file_uri: str,
+    segment_index: int,
+    data: dict
+) -> str:
+    """
+    Save segment analysis data to S3.
+    State fields (status, ai_analysis, ...) are written to their sidecar objects.
+
+    Args:
+        file_uri: Original file URI to determine bucket and path
+        segment_index: Segment index
+        data: Segment data dict (segment_index, image_uri, bda_indexer, format_parser, image_analysis)
+
+    Returns:
+        S3 key where data was saved
+    """
+    document, state = split_segment_state(data)
+    s3_key = _put_segment_document(file_uri, segment_index, document)
+    if state:
+        save_segment_state(file_uri, segment_index, **state)
 
     return s3_key
 
 
-def get_segment_analysis(file_uri: str, segment_index: int) -> Optional[dict]:
+def get_segment_analysis(file_uri: str, segment_index: int, include_state: bool = True) -> Optional[dict]:
     """
     Get segment analysis data from S3.
 
     Args:
         file_uri: Original file URI
         segment_index: Segment index
+        include_state: Overlay state sidecar fields on the document (default True)
 
     Returns:
         Segment data dict or None if not found
@@ -136,13 +346,17 @@ def get_segment_analysis(file_uri: str, segment_index: int) -> Optional[dict]:
 
     try:
         response = client.get_object(Bucket=bucket, Key=s3_key)
-        return json.loads(response['Body'].read().decode('utf-8'))
+        data = json.loads(response['Body'].read().decode('utf-8'))
     except client.exceptions.NoSuchKey:
         return None
     except Exception as e:
         print(f'Error getting segment analysis from {s3_key}: {e}')
         return None
 
+    if include_state:
+        data.update(get_segment_state(file_uri, segment_index))
+    return data
+
 
 def update_segment_analysis(
     file_uri: str,
@@ -151,7 +365,8 @@ def update_segment_analysis(
 ) -> Optional[dict]:
     """
     Update segment analysis data in S3.
-    Reads existing data, merges updates, saves back.
+    State fields are written directly to their sidecar objects; other fields
+    are merged into the segment document (read-modify-write).
 
     Args:
         file_uri: Original file URI
@@ -159,24 +374,35 @@ def update_segment_analysis(
         **updates: Fields to update
 
     Returns:
-        Updated data dict or None if failed
+        Updated document dict, or the written state fields if only state fields were updated
     """
-    data = get_segment_analysis(file_uri, segment_index)
-    if data is None:
-        data = {
+    document_updates, state_updates = split_segment_state(updates)
+
+    if state_updates:
+        save_segment_state(file_uri, segment_index, **state_updates)
+    if not document_updates:
+        return state_updates
+
+    bucket, _ = parse_s3_uri(file_uri)
+
+    def _default():
+        return {
             'segment_index': segment_index,
             'segment_type': 'PAGE',
-            'status': SegmentStatus.INDEXING,
             'image_uri': '',
             'bda_indexer': '',
             'format_parser': '',
             'paddleocr': '',
             'paddleocr_blocks': None,
-            'ai_analysis': []
         }
 
-    data.update(updates)
-    save_segment_analysis(file_uri, segment_index, data)
+    def _apply(data: dict) -> dict:
+        # Inline state fields of legacy documents are kept as-is; sidecars take precedence on read
+        data.update(document_updates)
+        return data
+
+    data = conditional_update_json(bucket, get_analysis_s3_key(file_uri, segment_index), _apply, default=_default)
+    data.update(state_updates)
     return data
 
 
@@ -196,7 +422,7 @@ def update_segment_status(
         error: Error message if status is FAILED
 
     Returns:
-        Updated data dict or None if failed
+        Dict of the written state fields
     """
     updates = {'status': status}
     if error:
@@ -213,6 +439,7 @@ def add_segment_ai_analysis(
     """
     Add AI analysis result to segment's ai_analysis array.
     Unified for all content types (document, image, video, audio).
+    Only the ai_analysis sidecar is read and rewritten.
 
     Args:
         file_uri: Original file URI
@@ -221,31 +448,95 @@ def add_segment_ai_analysis(
         content: Analysis answer/content
 
     Returns:
-        Updated data dict or None if failed
+        Dict with the updated ai_analysis list
     """
-    data = get_segment_analysis(file_uri, segment_index)
-    if data is None:
-        data = {
-            'segment_index': segment_index,
-            'segment_type': 'PAGE',
-            'image_uri': '',
-            'bda_indexer': '',
-            'format_parser': '',
-            'paddleocr': '',
-            'paddleocr_blocks': None,
-            'ai_analysis': []
-        }
-
-    ai_analysis = data.get('ai_analysis', [])
-    analysis_entry = {
+    return append_segment_ai_analysis(file_uri, segment_index, [{
         'analysis_query': analysis_query,
         'content': content
-    }
-    ai_analysis.append(analysis_entry)
-    data['ai_analysis'] = ai_analysis
+    }])
 
-    save_segment_analysis(file_uri, segment_index, data)
-    return data
+
+def append_segment_ai_analysis(file_uri: str, segment_index: int, entries: list) -> Optional[dict]:
+    """
+    Append entries to segment's ai_analysis array in one conditional write.
+
+    The sidecar is updated with conditional_update_json, so entries written
+    concurrently by other writers (qa-regenerator, reanalysis clear) are kept.
+
+    Args:
+        file_uri: Original file URI
+        segment_index: Segment index
+        entries: ai_analysis entries ({'analysis_query', 'content'}) in order
+
+    Returns:
+        Dict with the updated ai_analysis list
+    """
+    bucket, _ = parse_s3_uri(file_uri)
+    key = f'{get_segment_state_prefix(file_uri, segment_index)}ai_analysis.json'
+
+    def _default() -> list:
+        # Legacy segment documents keep ai_analysis inline
+        data = get_segment_analysis(file_uri, segment_index, include_state=False) or {}
+        return list(data.get('ai_analysis', []))
+
+    def _append(ai_analysis: list) -> list:
+        return list(ai_analysis or []) + list(entries)
+
+    ai_analysis = conditional_update_json(bucket, key, _append, default=_default)
+    return {'ai_analysis': ai_analysis}
+
+
+class SegmentStateBuffer:
+    """
+    Collect a segment's state updates in memory and write them on commit.
+
+    Status and error are blind PUTs. New ai_analysis entries are appended with
+    a single conditional write (append_segment_ai_analysis) instead of one
+    read-modify-write per entry, so concurrent qa-regenerator or clear writes
+    are merged rather than overwritten. Both are written concurrently.
+
+    Usage:
+        state = SegmentStateBuffer(file_uri, segment_index)
+        state.set_status(SegmentStatus.ANALYZING)
+        state.commit()
+        state.add_ai_analysis('Page 1 Analysis', response_text)
+        state.commit()
+    """
+
+    def __init__(self, file_uri: str, segment_index: int):
+        self.file_uri = file_uri
+        self.segment_index = segment_index
+        self._pending = {}
+        self._pending_analysis = []
+
+    def set_status(self, status: SegmentStatus, error: str = None):
+        self._pending['status'] = status
+        if error:
+            self._pending['error'] = error
+
+    def add_ai_analysis(self, analysis_query: str, content: str):
+        self._pending_analysis.append({
+            'analysis_query': analysis_query,
+            'content': content
+        })
+
+    def commit(self) -> dict:
+        """Write everything collected since the last commit. Returns the written fields."""
+        from concurrent.futures import ThreadPoolExecutor
+
+        fields, entries = self._pending, self._pending_analysis
+        if not entries:
+            written = save_segment_state(self.file_uri, self.segment_index, **fields) if fields else {}
+        elif not fields:
+            written = append_segment_ai_analysis(self.file_uri, self.segment_index, entries)
+        else:
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                state = executor.submit(save_segment_state, self.file_uri, self.segment_index, **fields)
+                analysis = executor.submit(append_segment_ai_analysis, self.file_uri, self.segment_index, entries)
+                written = {**state.result(), **analysis.result()}
+        self._pending = {}
+        self._pending_analysis = []
+        return written
 
 
 def get_all_segment_analyses(file_uri: str, segment_count: int,
@@ -264,8 +555,10 @@ def get_all_segment_analyses(file_uri: str, segment_count: int,
     """
     from concurrent.futures import ThreadPoolExecutor, as_completed
 
+    include_state = not fields or any(f in SEGMENT_STATE_FIELDS for f in fields)
+
     def _fetch(idx):
-        data = get_segment_analysis(file_uri, idx)
+        data = get_segment_analysis(file_uri, idx, include_state=include_state)
         if data is None:
             return None
         if fields:
@@ -378,15 +671,9 @@ def clear_segment_ai_analysis(file_uri: str, segment_index: int) -> Optional[dic
         segment_index: Segment index
 
     Returns:
-        Updated data dict or None if failed
+        Dict with the cleared ai_analysis list
     """
-    data = get_segment_analysis(file_uri, segment_index)
-    if data is None:
-        return None
-
-    data['ai_analysis'] = []
-    save_segment_analysis(file_uri, segment_index, data)
-    return data
+    return save_segment_state(file_uri, segment_index, ai_analysis=[])
 
 
 def save_reanalysis_instructions(
@@ -407,12 +694,11 @@ def save_reanalysis_instructions(
     """
     from datetime import datetime, timezone
 
-    data = get_segment_analysis(file_uri, segment_index)
-    if data is None:
-        return None
+    bucket, _ = parse_s3_uri(file_uri)
 
-    data['reanalysis_instructions'] = instructions
-    data['reanalysis_at'] = datetime.now(timezone.utc).isoformat()
+    def _apply(data: dict) -> dict:
+        data['reanalysis_instructions'] = instructions
+        data['reanalysis_at'] = datetime.now(timezone.utc).isoformat()
+        return data
 
-    save_segment_analysis(file_uri, segment_index, data)
-    return data
+    return conditional_update_json(bucket, get_analysis_s3_key(file_uri, segment_index), _apply)
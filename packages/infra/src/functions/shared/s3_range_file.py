@@ -0,0 +1,196 @@
+"""
+Random-access S3 file object
+
+S3RangeFile exposes an S3 object as a seekable, read-only binary stream backed
+by ranged GETs and an LRU block cache, so PDF libraries (pypdfium2, pypdf) can
+open large documents without downloading them to /tmp. Only the blocks that are
+actually touched (trailer, xref, page tree, the pages being processed) are fetched.
+
+PDF page counts are cached once per document in
+  {document_base}/preprocessed/pdf_info.json
+keyed by the source object's ETag.
+"""
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from botocore.exceptions import ClientError
+
+from .s3_analysis import get_s3_client, parse_s3_uri
+
+# Bytes per ranged GET and number of blocks kept in memory per open file
+S3_RANGE_BLOCK_SIZE = int(os.environ.get('S3_RANGE_BLOCK_SIZE', str(2 * 1024 * 1024)))
+S3_RANGE_CACHE_BLOCKS = int(os.environ.get('S3_RANGE_CACHE_BLOCKS', '32'))
+
+
+class S3RangeFile(io.RawIOBase):
+    """Seekable read-only stream over an S3 object using ranged GETs."""
+
+    def __init__(
+        self,
+        bucket: str,
+        key: str,
+        client=None,
+        block_size: int = S3_RANGE_BLOCK_SIZE,
+        cache_blocks: int = S3_RANGE_CACHE_BLOCKS,
+    ):
+        super().__init__()
+        self.bucket = bucket
+        self.key = key
+        self._client = client or get_s3_client()
+        self._block_size = block_size
+        self._cache_blocks = max(1, cache_blocks)
+        self._blocks: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._pos = 0
+
+        head = self._client.head_object(Bucket=bucket, Key=key)
+        self.size = head['ContentLength']
+        self.etag = head.get('ETag', '').strip('"')
+        self.requests = 0
+        self.bytes_fetched = 0
+
+    @classmethod
+    def from_uri(cls, uri: str, **kwargs) -> 'S3RangeFile':
+        bucket, key = parse_s3_uri(uri)
+        return cls(bucket, key, **kwargs)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError(f'Invalid whence: {whence}')
+        if pos < 0:
+            raise ValueError(f'Negative seek position: {pos}')
+        self._pos = pos
+        return pos
+
+    def _get_block(self, index: int) -> bytes:
+        with self._lock:
+            block = self._blocks.get(index)
+            if block is not None:
+                self._blocks.move_to_end(index)
+                return block
+
+        start = index * self._block_size
+        end = min(start + self._block_size, self.size) - 1
+        response = self._client.get_object(Bucket=self.bucket, Key=self.key, Range=f'bytes={start}-{end}')
+        block = response['Body'].read()
+
+        with self._lock:
+            self.requests += 1
+            self.bytes_fetched += len(block)
+            self._blocks[index] = block
+            while len(self._blocks) > self._cache_blocks:
+                self._blocks.popitem(last=False)
+        return block
+
+    def read_at(self, offset: int, length: int) -> bytes:
+        """Read without touching the stream position (safe across threads)."""
+        end = min(offset + length, self.size)
+        parts = []
+        while offset < end:
+            index, block_offset = divmod(offset, self._block_size)
+            chunk = self._get_block(index)[block_offset:block_offset + end - offset]
+            if not chunk:
+                break
+            parts.append(chunk)
+            offset += len(chunk)
+        return b''.join(parts)
+
+    def readinto(self, buffer) -> int:
+        view = memoryview(buffer).cast('B')
+        data = self.read_at(self._pos, len(view))
+        view[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def stats(self) -> str:
+        return f'{self.requests} range requests, {self.bytes_fetched / (1024 * 1024):.1f}MB of {self.size / (1024 * 1024):.1f}MB'
+
+
+def _get_document_base_path(file_uri: str) -> tuple[str, str]:
+    """Extract bucket and document base path from file URI."""
+    bucket, key = parse_s3_uri(file_uri)
+    key_parts = key.split('/')
+    if 'documents' in key_parts:
+        doc_idx = key_parts.index('documents')
+        base_path = '/'.join(key_parts[:doc_idx + 2])
+    else:
+        base_path = '/'.join(key_parts[:-1])
+    return bucket, base_path
+
+
+def _pdf_info_key(file_uri: str) -> tuple[str, str]:
+    bucket, base_path = _get_document_base_path(file_uri)
+    return bucket, f'{base_path}/preprocessed/pdf_info.json'
+
+
+def get_cached_pdf_page_count(file_uri: str, etag: str) -> Optional[int]:
+    """Return the cached page count if it was recorded for this ETag."""
+    bucket, key = _pdf_info_key(file_uri)
+    try:
+        response = get_s3_client().get_object(Bucket=bucket, Key=key)
+        info = json.loads(response['Body'].read().decode('utf-8'))
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ('NoSuchKey', '404'):
+            print(f'[WARN] Failed to read cached PDF page count: {e}')
+        return None
+    if info.get('etag') != etag:
+        return None
+    return info.get('page_count')
+
+
+def cache_pdf_page_count(file_uri: str, etag: str, page_count: int):
+    """Record the page count for the source object version (best effort)."""
+    bucket, key = _pdf_info_key(file_uri)
+    try:
+        get_s3_client().put_object(
+            Bucket=bucket,
+            Key=key,
+            Body=json.dumps({'etag': etag, 'page_count': page_count}),
+            ContentType='application/json',
+        )
+    except Exception as e:
+        print(f'[WARN] Failed to cache PDF page count: {e}')
+
+
+def get_pdf_page_count(file_uri: str) -> int:
+    """Page count of a PDF in S3, computed once per document version.
+
+    On a cache miss the PDF is opened through S3RangeFile, so only the
+    trailer, xref and page tree are read.
+    """
+    import pypdfium2 as pdfium
+
+    stream = S3RangeFile.from_uri(file_uri)
+    cached = get_cached_pdf_page_count(file_uri, stream.etag)
+    if cached is not None:
+        print(f'PDF page count (cached): {cached}')
+        return cached
+
+    doc = pdfium.PdfDocument(stream)
+    try:
+        page_count = len(doc)
+    finally:
+        doc.close()
+    print(f'PDF page count: {page_count} ({stream.stats()})')
+
+    cache_pdf_page_count(file_uri, stream.etag, page_count)
+    return page_count
@@ -0,0 +1,109 @@
+"""
+Batched analysis of text-only segments
+
+Text-only segments (TEXT chunks from text files and spreadsheets, WEB pages)
+are analyzed without tools, so adjacent ones are grouped into a single
+analysis request. Segment-builder emits one Map item per group:
+
+  3                                                   # single segment
+  {"segment_index": 4, "segment_indices": [4, 5, 6]}  # batch
+
+SegmentAnalyzer and the per-segment finalizers accept either form and process
+every index of the item.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+ANALYSIS_BATCH_ENABLED = os.environ.get('ANALYSIS_BATCH_ENABLED', 'true').lower() == 'true'
+# Estimated input + output tokens per batch. The text prompt asks for the
+# original text back, so a segment costs its content twice plus the analysis
+# sections; the default keeps the output around half of the analyzer's
+# BEDROCK_MAX_TOKENS (16384)
+ANALYSIS_BATCH_TOKEN_BUDGET = int(os.environ.get('ANALYSIS_BATCH_TOKEN_BUDGET', '16000'))
+# Estimated output tokens per segment beyond the reproduced text (overview, key information)
+ANALYSIS_BATCH_OUTPUT_OVERHEAD = int(os.environ.get('ANALYSIS_BATCH_OUTPUT_OVERHEAD', '800'))
+ANALYSIS_BATCH_MAX_SEGMENTS = int(os.environ.get('ANALYSIS_BATCH_MAX_SEGMENTS', '8'))
+
+BATCHABLE_SEGMENT_TYPES = ('TEXT', 'WEB')
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: ~4 ASCII characters per token, ~1 token per other character (CJK)."""
+    if not text:
+        return 0
+    ascii_chars = sum(1 for c in text if c < '\x80')
+    return ascii_chars // 4 + (len(text) - ascii_chars)
+
+
+def estimate_analysis_tokens(content_tokens: int) -> int:
+    """Estimated input + output tokens of analyzing a text segment in a batch."""
+    return 2 * content_tokens + ANALYSIS_BATCH_OUTPUT_OVERHEAD
+
+
+def is_batchable_segment(segment_data: dict) -> bool:
+    """Text-only segments are analyzed without tools and can share a request."""
+    return segment_data.get('segment_type') in BATCHABLE_SEGMENT_TYPES and not segment_data.get('image_uri')
+
+
+def plan_analysis_items(
+    segment_count: int,
+    batchable_tokens: dict[int, int],
+    token_budget: int = ANALYSIS_BATCH_TOKEN_BUDGET,
+    max_segments: int = ANALYSIS_BATCH_MAX_SEGMENTS,
+) -> list:
+    """Group adjacent batchable segments into Map items.
+
+    Args:
+        segment_count: Number of segments
+        batchable_tokens: Estimated content tokens of each batchable segment (others are absent)
+        token_budget: Maximum estimated input + output tokens per batch
+        max_segments: Maximum segments per batch
+
+    Returns:
+        Map items: an int per single segment, a dict per batch of two or more
+    """
+    items = []
+    group, group_tokens = [], 0
+
+    def _flush():
+        if len(group) == 1:
+            items.append(group[0])
+        elif group:
+            items.append({'segment_index': group[0], 'segment_indices': list(group)})
+        group.clear()
+
+    for i in range(segment_count):
+        content_tokens = batchable_tokens.get(i)
+        if content_tokens is None or not ANALYSIS_BATCH_ENABLED:
+            _flush()
+            items.append(i)
+            continue
+        tokens = estimate_analysis_tokens(content_tokens)
+        if group and (len(group) >= max_segments or group_tokens + tokens > token_budget):
+            _flush()
+        if not group:
+            group_tokens = 0
+        group.append(i)
+        group_tokens += tokens
+    _flush()
+
+    return items
+
+
+def get_segment_indices(event: dict) -> list[int]:
+    """Segment indices of a Map item event (a single index or a batch)."""
+    item = event.get('segment_index', 0)
+    indices = event.get('segment_indices')
+    if isinstance(item, dict):
+        indices = indices or item.get('segment_indices')
+        item = item.get('segment_index', 0)
+    return list(indices) if indices else [item]
+
+
+def map_segments(fn: Callable[[int], dict], segment_indices: list[int], max_workers: int = 8) -> list[dict]:
+    """Run fn for every segment index concurrently, preserving order."""
+    if len(segment_indices) == 1:
+        return [fn(segment_indices[0])]
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(segment_indices)))) as executor:
+        return list(executor.map(fn, segment_indices))
@@ -0,0 +1,86 @@
+"""Tests for the result.jsonl page results writer and reader.
+
+Usage:
+    python -m pytest test_page_results.py -v
+"""
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from shared.page_results import PageResultsReader, PageResultsWriter
+from shared.s3_range_file import S3RangeFile
+
+PAGES = [
+    {'page': 0, 'content': 'first page'},
+    {'page': 1, 'content': '두 번째 페이지'},
+    {'page': 2, 'content': 'x' * 500},
+]
+
+
+def _write(stub_s3, records, indices=None, meta=None):
+    with PageResultsWriter('bucket', 'result.jsonl', meta=meta, client=stub_s3) as writer:
+        for i, record in enumerate(records):
+            writer.add(record, index=indices[i] if indices else None)
+        return writer.commit()
+
+
+def _open(stub_s3, block_size=64):
+    return PageResultsReader(S3RangeFile('bucket', 'result.jsonl', client=stub_s3, block_size=block_size))
+
+
+class TestPageResults:
+    def test_round_trip(self, stub_s3):
+        uri = _write(stub_s3, PAGES, meta={'model': 'pp-ocrv5'})
+        assert uri == 's3://bucket/result.jsonl'
+        assert stub_s3.content_types['result.jsonl'] == 'application/x-ndjson'
+
+        reader = _open(stub_s3)
+        assert len(reader) == 3
+        assert reader.meta == {'model': 'pp-ocrv5'}
+        assert reader.indices() == [0, 1, 2]
+        assert list(reader) == list(enumerate(PAGES))
+
+    def test_file_layout(self, stub_s3):
+        _write(stub_s3, PAGES[:2])
+        lines = stub_s3.objects['result.jsonl'].decode('utf-8').splitlines()
+        header = json.loads(lines[0])
+        assert header['format'] == 'jsonl-pages'
+        assert header['count'] == 2
+        assert [json.loads(line) for line in lines[1:]] == PAGES[:2]
+
+    def test_get_reads_only_its_record(self, stub_s3):
+        _write(stub_s3, PAGES)
+        reader = _open(stub_s3, block_size=16)
+        stub_s3.ranges.clear()
+        assert reader.get(1) == PAGES[1]
+        fetched = sum(end - start + 1 for start, end in stub_s3.ranges)
+        assert fetched < 100
+
+    def test_explicit_indices(self, stub_s3):
+        _write(stub_s3, PAGES, indices=[4, 2, 9])
+        reader = _open(stub_s3)
+        assert reader.indices() == [4, 2, 9]
+        assert 9 in reader and 0 not in reader
+        assert reader.get(2) == PAGES[1]
+        assert reader.get(0) is None
+
+    def test_empty_file(self, stub_s3):
+        _write(stub_s3, [])
+        reader = _open(stub_s3)
+        assert len(reader) == 0
+        assert list(reader) == []
+
+    def test_long_header_spans_reads(self, stub_s3):
+        _write(stub_s3, [{'n': i} for i in range(5000)])
+        reader = _open(stub_s3, block_size=1024)
+        assert len(reader) == 5000
+        assert reader.get(4999) == {'n': 4999}
+
+    def test_rejects_other_json(self, stub_s3):
+        stub_s3.store('result.jsonl', b'{"pages": []}\n')
+        with pytest.raises(ValueError):
+            _open(stub_s3)
@@ -0,0 +1,70 @@
+"""Tests for conditional (If-Match) JSON updates in S3.
+
+Usage:
+    python -m pytest test_s3_analysis.py -v
+"""
+import json
+import os
+import sys
+
+import pytest
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from shared import s3_analysis
+from shared.s3_analysis import SegmentWriteConflict, conditional_update_json
+
+
+@pytest.fixture
+def s3(stub_s3, monkeypatch):
+    monkeypatch.setattr(s3_analysis, 'get_s3_client', lambda: stub_s3)
+    monkeypatch.setattr(s3_analysis.time, 'sleep', lambda seconds: None)
+    return stub_s3
+
+
+def _append(value):
+    return lambda current: current + [value]
+
+
+class TestConditionalUpdateJson:
+    def test_updates_existing_object(self, s3):
+        s3.store('k', json.dumps(['a']))
+        assert conditional_update_json('b', 'k', _append('b')) == ['a', 'b']
+        assert json.loads(s3.objects['k']) == ['a', 'b']
+
+    def test_missing_object_without_default(self, s3):
+        assert conditional_update_json('b', 'k', _append('x')) is None
+        assert s3.puts == []
+
+    def test_missing_object_uses_default(self, s3):
+        assert conditional_update_json('b', 'k', _append('x'), default=list) == ['x']
+        assert json.loads(s3.objects['k']) == ['x']
+
+    def test_retries_on_precondition_failed(self, s3):
+        s3.store('k', json.dumps(['a']))
+        s3.before_put.append(lambda c: c.store('k', json.dumps(['a', 'concurrent'])))
+
+        assert conditional_update_json('b', 'k', _append('mine')) == ['a', 'concurrent', 'mine']
+        assert json.loads(s3.objects['k']) == ['a', 'concurrent', 'mine']
+        assert len(s3.puts) == 2
+
+    def test_concurrent_create_is_merged(self, s3):
+        s3.before_put.append(lambda c: c.store('k', json.dumps(['first'])))
+        assert conditional_update_json('b', 'k', _append('second'), default=list) == ['first', 'second']
+
+    def test_gives_up_after_max_attempts(self, s3):
+        s3.store('k', json.dumps([]))
+        s3.before_put.extend([lambda c: c.store('k', json.dumps([]))] * 3)
+
+        with pytest.raises(SegmentWriteConflict):
+            conditional_update_json('b', 'k', _append('x'), max_attempts=3)
+        assert len(s3.puts) == 3
+
+    def test_other_errors_are_raised(self, s3, monkeypatch):
+        def put_object(**kwargs):
+            raise ClientError({'Error': {'Code': 'AccessDenied', 'Message': 'denied'}}, 'PutObject')
+
+        monkeypatch.setattr(s3, 'put_object', put_object)
+        with pytest.raises(ClientError):
+            conditional_update_json('b', 'k', _append('x'), default=list)
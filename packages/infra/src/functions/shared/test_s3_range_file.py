@@ -0,0 +1,134 @@
+"""Tests for S3RangeFile and the ETag-keyed PDF page count cache.
+
+Usage:
+    python -m pytest test_s3_range_file.py -v
+"""
+import io
+import json
+import os
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from shared import s3_range_file
+from shared.s3_range_file import S3RangeFile, get_pdf_page_count
+
+DATA = bytes(range(256)) * 4  # 1024 bytes
+
+
+@pytest.fixture
+def s3(stub_s3):
+    stub_s3.store('doc.pdf', DATA)
+    return stub_s3
+
+
+class TestS3RangeFile:
+    def test_read_across_block_boundary(self, s3):
+        stream = S3RangeFile('bucket', 'doc.pdf', client=s3, block_size=100)
+        assert stream.read_at(95, 10) == DATA[95:105]
+        assert s3.ranges == [(0, 99), (100, 199)]
+
+    def test_read_spanning_several_blocks(self, s3):
+        stream = S3RangeFile('bucket', 'doc.pdf', client=s3, block_size=100)
+        assert stream.read_at(50, 300) == DATA[50:350]
+        assert [start for start, _ in s3.ranges] == [0, 100, 200, 300]
+
+    def test_last_block_is_short(self, s3):
+        stream = S3RangeFile('bucket', 'doc.pdf', client=s3, block_size=100)
+        assert stream.read_at(1000, 100) == DATA[1000:]
+        assert s3.ranges == [(1000, 1023)]
+        assert stream.read_at(1024, 10) == b''
+
+    def test_seek_and_read(self, s3):
+        stream = S3RangeFile('bucket', 'doc.pdf', client=s3, block_size=100)
+        assert stream.seek(-24, io.SEEK_END) == 1000
+        assert stream.read(4) == DATA[1000:1004]
+        assert stream.seek(10, io.SEEK_CUR) == 1014
+        assert stream.read() == DATA[1014:]
+        stream.seek(199)
+        assert stream.read(2) == DATA[199:201]
+        assert stream.tell() == 201
+
+    def test_negative_seek_rejected(self, s3):
+        stream = S3RangeFile('bucket', 'doc.pdf', client=s3, block_size=100)
+        with pytest.raises(ValueError):
+            stream.seek(-1)
+
+    def test_read_at_keeps_position(self, s3):
+        stream = S3RangeFile('bucket', 'doc.pdf', client=s3, block_size=100)
+        stream.seek(300)
+        stream.read_at(0, 10)
+        assert stream.tell() == 300
+
+    def test_cached_blocks_are_not_refetched(self, s3):
+        stream = S3RangeFile('bucket', 'doc.pdf', client=s3, block_size=100, cache_blocks=2)
+        stream.read_at(0, 10)
+        stream.read_at(20, 10)
+        assert stream.requests == 1
+        assert stream.bytes_fetched == 100
+
+    def test_lru_eviction(self, s3):
+        stream = S3RangeFile('bucket', 'doc.pdf', client=s3, block_size=100, cache_blocks=2)
+        stream.read_at(0, 1)    # block 0
+        stream.read_at(100, 1)  # block 1
+        stream.read_at(0, 1)    # block 0 becomes most recent
+        stream.read_at(200, 1)  # block 2 evicts block 1
+        assert stream.requests == 3
+
+        stream.read_at(0, 1)
+        assert stream.requests == 3
+        stream.read_at(100, 1)
+        assert stream.requests == 4
+        assert [start for start, _ in s3.ranges] == [0, 100, 200, 100]
+
+    def test_etag_is_unquoted(self, s3):
+        assert S3RangeFile('bucket', 'doc.pdf', client=s3).etag == 'v1'
+
+
+class TestPdfPageCountCache:
+    URI = 's3://bucket/projects/p/documents/d/doc.pdf'
+    INFO_KEY = 'projects/p/documents/d/preprocessed/pdf_info.json'
+
+    @pytest.fixture
+    def env(self, stub_s3, monkeypatch):
+        s3 = stub_s3
+        s3.store('projects/p/documents/d/doc.pdf', DATA)
+        monkeypatch.setattr(s3_range_file, 'get_s3_client', lambda: s3)
+
+        opened = []
+
+        class PdfDocument:
+            def __init__(self, stream):
+                opened.append(stream)
+
+            def __len__(self):
+                return 7
+
+            def close(self):
+                pass
+
+        monkeypatch.setitem(sys.modules, 'pypdfium2', types.SimpleNamespace(PdfDocument=PdfDocument))
+        return s3, opened
+
+    def test_miss_counts_and_caches(self, env):
+        s3, opened = env
+        assert get_pdf_page_count(self.URI) == 7
+        assert len(opened) == 1
+        assert json.loads(s3.objects[self.INFO_KEY]) == {'etag': 'v1', 'page_count': 7}
+
+    def test_hit_skips_pdf_parsing(self, env):
+        s3, opened = env
+        s3.store(self.INFO_KEY, json.dumps({'etag': 'v1', 'page_count': 3}))
+        assert get_pdf_page_count(self.URI) == 3
+        assert opened == []
+        assert s3.puts == []
+
+    def test_stale_etag_recounts(self, env):
+        s3, opened = env
+        s3.store(self.INFO_KEY, json.dumps({'etag': 'old-etag', 'page_count': 3}))
+        assert get_pdf_page_count(self.URI) == 7
+        assert len(opened) == 1
+        assert json.loads(s3.objects[self.INFO_KEY])['etag'] == 'v1'
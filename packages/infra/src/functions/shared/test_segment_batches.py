@@ -0,0 +1,68 @@
+"""Tests for batching text-only segments into analysis Map items.
+
+Usage:
+    python -m pytest test_segment_batches.py -v
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from shared import segment_batches
+from shared.segment_batches import (
+    estimate_analysis_tokens,
+    get_segment_indices,
+    plan_analysis_items,
+)
+
+
+def _batch(*indices):
+    return {'segment_index': indices[0], 'segment_indices': list(indices)}
+
+
+class TestPlanAnalysisItems:
+    def test_groups_adjacent_batchable_segments(self):
+        items = plan_analysis_items(5, {0: 10, 1: 10, 3: 10, 4: 10}, token_budget=100_000, max_segments=8)
+        assert items == [_batch(0, 1), 2, _batch(3, 4)]
+
+    def test_budget_is_inclusive(self):
+        budget = 3 * estimate_analysis_tokens(100)
+        items = plan_analysis_items(4, {i: 100 for i in range(4)}, token_budget=budget, max_segments=8)
+        assert items == [_batch(0, 1, 2), 3]
+
+    def test_budget_counts_input_and_output(self):
+        # Two segments fit by content alone but not once the output is estimated
+        items = plan_analysis_items(2, {0: 1000, 1: 1000}, token_budget=2500, max_segments=8)
+        assert items == [0, 1]
+
+    def test_oversized_segment_runs_alone(self):
+        items = plan_analysis_items(3, {0: 10, 1: 50_000, 2: 10}, token_budget=10_000, max_segments=8)
+        assert items == [0, 1, 2]
+
+    def test_max_segments(self):
+        items = plan_analysis_items(7, {i: 1 for i in range(7)}, token_budget=100_000, max_segments=3)
+        assert items == [_batch(0, 1, 2), _batch(3, 4, 5), 6]
+
+    def test_single_segment_stays_an_int(self):
+        assert plan_analysis_items(1, {0: 10}) == [0]
+
+    def test_no_batchable_segments(self):
+        assert plan_analysis_items(3, {}) == [0, 1, 2]
+
+    def test_no_segments(self):
+        assert plan_analysis_items(0, {}) == []
+
+    def test_disabled(self, monkeypatch):
+        monkeypatch.setattr(segment_batches, 'ANALYSIS_BATCH_ENABLED', False)
+        assert plan_analysis_items(3, {0: 1, 1: 1, 2: 1}) == [0, 1, 2]
+
+
+class TestGetSegmentIndices:
+    def test_single_index(self):
+        assert get_segment_indices({'segment_index': 3}) == [3]
+
+    def test_batch_item(self):
+        assert get_segment_indices({'segment_index': _batch(4, 5, 6)}) == [4, 5, 6]
+
+    def test_flattened_batch(self):
+        assert get_segment_indices({'segment_index': 4, 'segment_indices': [4, 5]}) == [4, 5]
@@ -2,9 +2,11 @@
 
 Sends QA pairs to LanceDB write queue for vector indexing.
 Runs in parallel with entity-extractor and page-description-generator in the Distributed Map.
+Batched Map items (see shared.segment_batches) are finalized per segment.
 """
 import json
 import os
+import time
 from datetime import datetime, timezone
 
 import boto3
@@ -14,10 +16,16 @@ from shared.s3_analysis import (
     update_segment_status,
     SegmentStatus,
 )
+from shared.segment_batches import get_segment_indices, map_segments
 
 sqs_client = None
 LANCEDB_WRITE_QUEUE_URL = os.environ.get('LANCEDB_WRITE_QUEUE_URL')
 
+# SendMessageBatch limits: 10 entries and 256 KB total payload per call
+SQS_BATCH_MAX_ENTRIES = 10
+SQS_BATCH_MAX_BYTES = 256 * 1024
+SQS_SEND_MAX_ATTEMPTS = int(os.environ.get('SQS_SEND_MAX_ATTEMPTS', '3'))
+
 
 def get_sqs_client():
     global sqs_client
@@ -33,20 +41,72 @@ def build_qa_content(analysis_query: str, content: str) -> str:
     return content
 
 
-def handler(event, _context):
-    print(f'Event: {json.dumps(event)}')
-
+def chunk_message_bodies(bodies: list[str]) -> list[list[tuple[str, str]]]:
+    """Split message bodies into SendMessageBatch-sized chunks of (Id, body).
+
+    A chunk holds at most SQS_BATCH_MAX_ENTRIES messages whose combined
+    UTF-8 size stays within SQS_BATCH_MAX_BYTES.
+    """
+    chunks = []
+    current = []
+    current_bytes = 0
+    for i, body in enumerate(bodies):
+        size = len(body.encode('utf-8'))
+        if current and (len(current) >= SQS_BATCH_MAX_ENTRIES or current_bytes + size > SQS_BATCH_MAX_BYTES):
+            chunks.append(current)
+            current = []
+            current_bytes = 0
+        current.append((str(i), body))
+        current_bytes += size
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def send_messages_batched(client, queue_url: str, bodies: list[str]) -> int:
+    """Send messages with SendMessageBatch, retrying entries that failed.
+
+    Returns:
+        Number of messages sent
+
+    Raises:
+        Exception: If an entry is rejected (sender fault) or still fails
+            after SQS_SEND_MAX_ATTEMPTS attempts
+    """
+    sent = 0
+    for chunk in chunk_message_bodies(bodies):
+        entries = [{'Id': entry_id, 'MessageBody': body} for entry_id, body in chunk]
+        for attempt in range(SQS_SEND_MAX_ATTEMPTS):
+            response = client.send_message_batch(QueueUrl=queue_url, Entries=entries)
+            sent += len(response.get('Successful', []))
+
+            failed = response.get('Failed', [])
+            if not failed:
+                break
+
+            rejected = [f for f in failed if f.get('SenderFault')]
+            if rejected:
+                raise Exception(f'SQS rejected message {rejected[0]["Id"]}: {rejected[0].get("Message")}')
+
+            if attempt == SQS_SEND_MAX_ATTEMPTS - 1:
+                raise Exception(f'{len(failed)} messages failed after {SQS_SEND_MAX_ATTEMPTS} attempts: {failed[0].get("Message")}')
+
+            print(f'[WARN] Retrying {len(failed)} failed SQS entries (attempt {attempt + 1})')
+            failed_ids = {f['Id'] for f in failed}
+            entries = [e for e in entries if e['Id'] in failed_ids]
+            time.sleep(0.2 * (2 ** attempt))
+    return sent
+
+
+def finalize_segment(event: dict, segment_index: int) -> dict:
+    """Queue the QA pairs of one segment for indexing and mark it COMPLETED."""
     workflow_id = event.get('workflow_id')
     document_id = event.get('document_id', '')
     project_id = event.get('project_id', 'default')
-    segment_index = event.get('segment_index', 0)
     file_uri = event.get('file_uri', '')
     file_type = event.get('file_type', '')
     language = event.get('language', 'en')
 
-    if isinstance(segment_index, dict):
-        segment_index = segment_index.get('segment_index', 0)
-
     segment_data = get_segment_analysis(file_uri, segment_index)
     if not segment_data:
         print(f'Segment not found in S3 for file {file_uri}, segment {segment_index}')
@@ -64,39 +124,32 @@ def handler(event, _context):
     # Send per-QA pair messages to SQS
     ai_analysis = segment_data.get('ai_analysis', [])
     created_at = datetime.now(timezone.utc).isoformat()
-    sent_count = 0
+    messages = []
+    for qa_index, analysis in enumerate(ai_analysis):
+        analysis_query = analysis.get('analysis_query', '')
+        content = analysis.get('content', '')
+        if not content:
+            continue
+
+        qa_content = build_qa_content(analysis_query, content)
+        messages.append(json.dumps({
+            'workflow_id': workflow_id,
+            'document_id': document_id,
+            'project_id': project_id,
+            'segment_index': segment_index,
+            'qa_index': qa_index,
+            'question': analysis_query,
+            'content_combined': qa_content,
+            'language': language,
+            'file_uri': file_uri,
+            'file_type': file_type,
+            'image_uri': image_uri,
+            'created_at': created_at,
+        }))
 
     try:
-        client = get_sqs_client()
-
-        for qa_index, analysis in enumerate(ai_analysis):
-            analysis_query = analysis.get('analysis_query', '')
-            content = analysis.get('content', '')
-            if not content:
-                continue
-
-            qa_content = build_qa_content(analysis_query, content)
-            message = {
-                'workflow_id': workflow_id,
-                'document_id': document_id,
-                'project_id': project_id,
-                'segment_index': segment_index,
-                'qa_index': qa_index,
-                'question': analysis_query,
-                'content_combined': qa_content,
-                'language': language,
-                'file_uri': file_uri,
-                'file_type': file_type,
-                'image_uri': image_uri,
-                'created_at': created_at,
-            }
-
-            response = client.send_message(
-                QueueUrl=LANCEDB_WRITE_QUEUE_URL,
-                MessageBody=json.dumps(message),
-            )
-            sent_count += 1
-            print(f'Sent segment {segment_index} QA {qa_index} to SQS, MessageId: {response["MessageId"]}')
+        sent_count = send_messages_batched(get_sqs_client(), LANCEDB_WRITE_QUEUE_URL, messages)
+        print(f'Sent segment {segment_index}: {sent_count} QA messages to SQS')
 
         # Update status to COMPLETED
         update_segment_status(file_uri, segment_index, SegmentStatus.COMPLETED)
@@ -117,3 +170,19 @@ def handler(event, _context):
             'status': 'failed',
             'error': str(e),
         }
+
+
+def handler(event, _context):
+    print(f'Event: {json.dumps(event)}')
+
+    segment_indices = get_segment_indices(event)
+    results = map_segments(lambda i: finalize_segment(event, i), segment_indices)
+    if len(results) == 1:
+        return results[0]
+    return {
+        'workflow_id': event.get('workflow_id'),
+        'segment_index': segment_indices[0],
+        'segment_indices': segment_indices,
+        'status': 'queued' if all(r['status'] == 'queued' for r in results) else 'partial',
+        'results': results,
+    }
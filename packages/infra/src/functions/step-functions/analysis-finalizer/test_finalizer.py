@@ -0,0 +1,50 @@
+"""Tests for SendMessageBatch chunking in the analysis finalizer.
+
+Usage:
+    python -m pytest test_finalizer.py -v
+"""
+import importlib.util
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+_spec = importlib.util.spec_from_file_location('analysis_finalizer', os.path.join(os.path.dirname(__file__), 'index.py'))
+finalizer = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(finalizer)
+
+
+def _ids(chunks):
+    return [[entry_id for entry_id, _ in chunk] for chunk in chunks]
+
+
+class TestChunkMessageBodies:
+    def test_entry_limit(self):
+        chunks = finalizer.chunk_message_bodies(['{}'] * 23)
+        assert [len(c) for c in chunks] == [10, 10, 3]
+        assert [entry_id for c in chunks for entry_id, _ in c] == [str(i) for i in range(23)]
+
+    def test_byte_limit(self):
+        body = 'x' * (100 * 1024)
+        chunks = finalizer.chunk_message_bodies([body] * 5)
+        assert _ids(chunks) == [['0', '1'], ['2', '3'], ['4']]
+
+    def test_exact_byte_limit_fits(self):
+        half = 'x' * (finalizer.SQS_BATCH_MAX_BYTES // 2)
+        assert _ids(finalizer.chunk_message_bodies([half, half, 'y'])) == [['0', '1'], ['2']]
+
+    def test_size_is_utf8_bytes(self):
+        # 3 bytes per character: two of these exceed 256 KB together
+        body = '가' * (50 * 1024)
+        assert _ids(finalizer.chunk_message_bodies([body, body])) == [['0'], ['1']]
+
+    def test_oversized_body_gets_own_chunk(self):
+        big = 'x' * (finalizer.SQS_BATCH_MAX_BYTES + 1)
+        assert _ids(finalizer.chunk_message_bodies(['a', big, 'b'])) == [['0'], ['1'], ['2']]
+
+    def test_bodies_are_preserved(self):
+        chunks = finalizer.chunk_message_bodies(['a', 'b'])
+        assert chunks == [[('0', 'a'), ('1', 'b')]]
+
+    def test_empty(self):
+        assert finalizer.chunk_message_bodies([]) == []
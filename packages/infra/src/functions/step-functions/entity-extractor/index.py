@@ -2,6 +2,7 @@
 
 Extracts knowledge graph entities from segment analysis results.
 Runs in parallel with page-description-generator and analysis-finalizer in the Distributed Map.
+Batched Map items (see shared.segment_batches) are extracted per segment.
 
 Modes:
   - default: Extract entities and save to S3 segment data (graph_entities)
@@ -14,20 +15,16 @@ from shared.s3_analysis import (
     get_segment_analysis,
     update_segment_analysis,
 )
+from shared.segment_batches import get_segment_indices, map_segments
 
 
-def handler(event, _context):
-    print(f'Event: {json.dumps(event)}')
-
+def extract_segment_entities(event: dict, segment_index: int) -> dict:
+    """Extract and store the graph entities of one segment."""
     workflow_id = event.get('workflow_id')
-    segment_index = event.get('segment_index', 0)
     file_uri = event.get('file_uri', '')
     language = event.get('language', 'en')
     mode = event.get('mode', 'default')
 
-    if isinstance(segment_index, dict):
-        segment_index = segment_index.get('segment_index', 0)
-
     segment_data = get_segment_analysis(file_uri, segment_index)
     if not segment_data:
         print(f'Segment not found: {file_uri}, segment {segment_index}')
@@ -68,3 +65,20 @@ def handler(event, _context):
         'status': 'completed',
         'entity_count': len(entities),
     }
+
+
+def handler(event, _context):
+    print(f'Event: {json.dumps(event)}')
+
+    segment_indices = get_segment_indices(event)
+    results = map_segments(lambda i: extract_segment_entities(event, i), segment_indices)
+    if len(results) == 1:
+        return results[0]
+    return {
+        'workflow_id': event.get('workflow_id'),
+        'segment_index': segment_indices[0],
+        'segment_indices': segment_indices,
+        'status': 'completed',
+        'entity_count': sum(r.get('entity_count', 0) for r in results),
+        'results': results,
+    }
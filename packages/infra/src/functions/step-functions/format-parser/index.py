@@ -9,15 +9,25 @@ Extracts text from documents (PDF, DOCX, PPTX, DWG, Markdown, TXT, Excel, CSV).
 - Markdown/TXT: Direct text reading
 
 Text files are chunked (4000 chars, 200 overlap) for optimal processing.
-Saves result to S3 as format-parser/result.json for segment-builder to merge.
+Saves result to S3 as format-parser/result.jsonl (one record per page/chunk)
+for segment-builder to merge.
+
+Large PDFs are sharded by page range (like the OCR and render Maps):
+- default mode: returns text_shards for the ExtractTextShards Map
+- mode=extract_pages: extracts one range in worker processes, saves a shard
+- mode=merge_pages: streams the shards into format-parser/result.jsonl
 """
 import csv
 import json
+import multiprocessing
 import os
 import re
 import subprocess
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import wait
 
+import boto3
 import pypdf
 from pypdf.generic import DecodedStreamObject, NameObject
 
@@ -52,6 +62,13 @@ DXF_MIME_TYPES = (
     'image/vnd.dxf',
 )
 
+# PDFs with more pages than this are split into page-range shards
+PDF_SHARD_PAGES = int(os.environ.get('PDF_SHARD_PAGES', '500'))
+# Text extraction worker processes per invocation (0 = cpu_count)
+PDF_EXTRACT_WORKERS = int(os.environ.get('PDF_EXTRACT_WORKERS', '0'))
+# Shards fetched concurrently while merging
+SHARD_READ_WORKERS = 8
+
 from shared.ddb_client import (
     update_workflow_status,
     get_entity_prefix,
@@ -63,6 +80,8 @@ from shared.ddb_client import (
     StepName,
 )
 from shared.s3_analysis import get_s3_client, parse_s3_uri
+from shared.page_results import PageResultsWriter
+from shared.s3_range_file import S3RangeFile, get_pdf_page_count
 
 BT_ET_PATTERN = re.compile(rb'BT\b.*?ET\b', re.DOTALL)
 
@@ -81,92 +100,231 @@ def get_document_base_path(file_uri: str) -> tuple:
     return bucket, base_path
 
 
+def strip_page_graphics(page, page_num: int):
+    """Strip non-text content from one page in-place, keeping only BT..ET text blocks."""
+    contents = page.get('/Contents')
+    if contents is None:
+        return
+
+    try:
+        obj = contents.get_object()
+        if isinstance(obj, pypdf.generic.ArrayObject):
+            raw = b''.join(item.get_object().get_data() for item in obj)
+            blocks = BT_ET_PATTERN.findall(raw)
+            new_obj = DecodedStreamObject()
+            new_obj.set_data(b'\n'.join(blocks))
+            page[NameObject('/Contents')] = new_obj
+        else:
+            raw = obj.get_data()
+            blocks = BT_ET_PATTERN.findall(raw)
+            obj.set_data(b'\n'.join(blocks))
+    except Exception as e:
+        print(f'[format-parser] Page {page_num}: strip_graphics failed: {e}')
+
+
 def strip_graphics_inplace(reader: pypdf.PdfReader):
     """Strip non-text content from PDF in-place, keeping only BT..ET text blocks."""
     for page_num, page in enumerate(reader.pages):
-        contents = page.get('/Contents')
-        if contents is None:
-            continue
+        strip_page_graphics(page, page_num)
+
 
+def extract_page_texts(reader: pypdf.PdfReader, start_page: int, end_page: int) -> list[dict]:
+    """Strip graphics and extract text for pages [start_page, end_page)."""
+    pages = []
+    for page_num in range(start_page, end_page):
+        page = reader.pages[page_num]
+        strip_page_graphics(page, page_num)
         try:
-            obj = contents.get_object()
-            if isinstance(obj, pypdf.generic.ArrayObject):
-                raw = b''.join(item.get_object().get_data() for item in obj)
-                blocks = BT_ET_PATTERN.findall(raw)
-                new_obj = DecodedStreamObject()
-                new_obj.set_data(b'\n'.join(blocks))
-                page[NameObject('/Contents')] = new_obj
-            else:
-                raw = obj.get_data()
-                blocks = BT_ET_PATTERN.findall(raw)
-                obj.set_data(b'\n'.join(blocks))
+            text = (page.extract_text() or '').strip()
         except Exception as e:
-            print(f'[format-parser] Page {page_num}: strip_graphics failed: {e}')
+            print(f'[format-parser] Page {page_num}: extract_text failed: {e}')
+            text = ''
+        pages.append({
+            'page_index': page_num,
+            'text': text,
+        })
+    return pages
 
 
-def process_pdf(file_uri: str) -> dict:
-    """Download PDF, extract text per page, and save as result.json."""
-    s3_client = get_s3_client()
-    bucket, key = parse_s3_uri(file_uri)
+def extract_worker(file_uri: str, start_page: int, end_page: int, conn):
+    """Worker process: extract a contiguous page range and send ('done', pages, stats).
 
-    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp:
-        tmp_path = tmp.name
-        s3_client.download_file(bucket, key, tmp_path)
+    Sends ('error', message) on failure.
+    """
+    try:
+        # botocore clients must not be shared across fork
+        client = boto3.client('s3', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
+        stream = S3RangeFile.from_uri(file_uri, client=client)
+        reader = pypdf.PdfReader(stream)
+        conn.send(('done', extract_page_texts(reader, start_page, end_page), stream.stats()))
+    except Exception as e:
+        conn.send(('error', f'pages {start_page}-{end_page - 1}: {e}'))
+    finally:
+        conn.close()
 
-    file_size = os.path.getsize(tmp_path)
-    print(f'[format-parser] Downloaded PDF: {file_size} bytes')
 
-    try:
-        with open(tmp_path, 'rb') as f:
-            reader = pypdf.PdfReader(f)
-            num_pages = len(reader.pages)
-            print(f'[format-parser] PDF has {num_pages} pages')
+def extract_pages_parallel(file_uri: str, start_page: int, end_page: int) -> list[dict]:
+    """Extract text for pages [start_page, end_page) across worker processes.
 
-            print(f'[format-parser] Stripping graphics from content streams...')
-            strip_graphics_inplace(reader)
+    Each worker gets a contiguous sub-range so its ranged reads stay local.
+    Uses fork + Pipe because Lambda has no /dev/shm for multiprocessing.Pool.
+    """
+    page_total = end_page - start_page
+    workers = max(1, min(PDF_EXTRACT_WORKERS or os.cpu_count() or 1, page_total))
+
+    if workers == 1:
+        stream = S3RangeFile.from_uri(file_uri)
+        pages = extract_page_texts(pypdf.PdfReader(stream), start_page, end_page)
+        print(f'[format-parser] Extracted pages {start_page}-{end_page - 1} ({stream.stats()})')
+        return pages
+
+    ctx = multiprocessing.get_context('fork')
+    step = (page_total + workers - 1) // workers
+    processes = []
+    readers = {}
+    for range_start in range(start_page, end_page, step):
+        range_end = min(range_start + step, end_page)
+        reader, writer = ctx.Pipe(duplex=False)
+        process = ctx.Process(target=extract_worker, args=(file_uri, range_start, range_end, writer))
+        process.start()
+        writer.close()
+        processes.append(process)
+        readers[reader] = range_start
+
+    results = {}
+    errors = []
+    pending = list(readers)
+    while pending:
+        for reader in wait(pending):
+            try:
+                message = reader.recv()
+            except EOFError:
+                message = ('error', f'worker for page {readers[reader]} exited without a result')
+            if message[0] == 'error':
+                errors.append(message[1])
+            else:
+                results[readers[reader]] = message[1]
+                print(f'[format-parser] Worker {readers[reader]} done: {len(message[1])} pages ({message[2]})')
+            pending.remove(reader)
 
-            pages = []
-            total_chars = 0
+    for process in processes:
+        process.join()
 
-            print(f'[format-parser] Extracting text...')
-            for page_num, page in enumerate(reader.pages):
-                try:
-                    text = (page.extract_text() or '').strip()
-                except Exception as e:
-                    print(f'[format-parser] Page {page_num}: extract_text failed: {e}')
-                    text = ''
-                pages.append({
-                    'page_index': page_num,
-                    'text': text,
-                })
-                total_chars += len(text)
-                if (page_num + 1) % 500 == 0:
-                    print(f'[format-parser] Extracted {page_num + 1}/{num_pages} pages')
+    if errors:
+        raise RuntimeError(f'Text extraction failed: {"; ".join(errors)}')
 
-        print(f'[format-parser] Done: {len(pages)} pages, {total_chars} chars')
+    return [page for range_start in sorted(results) for page in results[range_start]]
 
-        # Save to format-parser/result.json
-        result_data = {'pages': pages}
-        doc_bucket, base_path = get_document_base_path(file_uri)
-        result_key = f'{base_path}/format-parser/result.json'
 
-        s3_client.put_object(
-            Bucket=doc_bucket,
-            Key=result_key,
-            Body=json.dumps(result_data, ensure_ascii=False),
-            ContentType='application/json',
-        )
-        print(f'[format-parser] Saved result to s3://{doc_bucket}/{result_key}')
+def build_page_shards(page_count: int) -> list[dict]:
+    """Split a PDF into page ranges of PDF_SHARD_PAGES for the ExtractTextShards Map."""
+    return [
+        {'start_page': start, 'end_page': min(start + PDF_SHARD_PAGES, page_count)}
+        for start in range(0, page_count, PDF_SHARD_PAGES)
+    ]
 
-        return {
-            'status': 'completed',
-            'page_count': len(pages),
-            'total_chars': total_chars,
-        }
 
-    finally:
-        if os.path.exists(tmp_path):
-            os.remove(tmp_path)
+def get_shard_key(base_path: str, start_page: int) -> str:
+    return f'{base_path}/format-parser/shards/shard_{start_page:06d}.json'
+
+
+def save_format_parser_result(file_uri: str, records, kind: str = 'pages') -> str:
+    """Save page or chunk records to format-parser/result.jsonl and return its URI.
+
+    Records are keyed by page_index (kind='pages') or chunk_index (kind='chunks').
+    """
+    doc_bucket, base_path = get_document_base_path(file_uri)
+    index_field = 'page_index' if kind == 'pages' else 'chunk_index'
+
+    with PageResultsWriter(doc_bucket, f'{base_path}/format-parser/result.jsonl', meta={'kind': kind}) as writer:
+        for record in records:
+            writer.add(record, index=record.get(index_field, writer.count))
+        return writer.commit()
+
+
+def process_pdf(file_uri: str, page_count: int) -> dict:
+    """Extract text per page from a PDF in S3 and save as result.jsonl.
+
+    The PDF is read with ranged GETs: graphics are stripped before text
+    extraction, so image XObjects (most of the bytes in scanned documents)
+    are never fetched.
+    """
+    print(f'[format-parser] PDF has {page_count} pages')
+
+    pages = extract_pages_parallel(file_uri, 0, page_count)
+    total_chars = sum(len(p['text']) for p in pages)
+    print(f'[format-parser] Done: {len(pages)} pages, {total_chars} chars')
+
+    save_format_parser_result(file_uri, pages)
+
+    return {
+        'status': 'completed',
+        'page_count': len(pages),
+        'total_chars': total_chars,
+    }
+
+
+def handle_extract_pages(event) -> dict:
+    """Extract one page-range shard and save it. Called by Step Functions Map."""
+    file_uri = event['file_uri']
+    start_page = event['start_page']
+    end_page = event['end_page']
+
+    pages = extract_pages_parallel(file_uri, start_page, end_page)
+
+    bucket, base_path = get_document_base_path(file_uri)
+    get_s3_client().put_object(
+        Bucket=bucket,
+        Key=get_shard_key(base_path, start_page),
+        Body=json.dumps({'pages': pages}, ensure_ascii=False),
+        ContentType='application/json',
+    )
+    total_chars = sum(len(p['text']) for p in pages)
+    print(f'[format-parser] Saved shard {start_page}-{end_page - 1}: {len(pages)} pages, {total_chars} chars')
+    return {'start_page': start_page, 'end_page': end_page, 'total_chars': total_chars}
+
+
+def merge_page_shards(file_uri: str, shards: list[dict]) -> dict:
+    """Stream all shards into result.jsonl and delete the shards."""
+    s3_client = get_s3_client()
+    bucket, base_path = get_document_base_path(file_uri)
+    shard_keys = [get_shard_key(base_path, shard['start_page']) for shard in shards]
+
+    def _read_shard(key):
+        response = s3_client.get_object(Bucket=bucket, Key=key)
+        return json.loads(response['Body'].read().decode('utf-8'))['pages']
+
+    page_count = 0
+    total_chars = 0
+
+    def _iter_pages():
+        # Read a window of shards at a time so memory stays bounded by the window
+        nonlocal page_count, total_chars
+        with ThreadPoolExecutor(max_workers=SHARD_READ_WORKERS) as executor:
+            for start in range(0, len(shard_keys), SHARD_READ_WORKERS):
+                for pages in executor.map(_read_shard, shard_keys[start:start + SHARD_READ_WORKERS]):
+                    for page in pages:
+                        page_count += 1
+                        total_chars += len(page['text'])
+                        yield page
+
+    save_format_parser_result(file_uri, _iter_pages())
+
+    for i in range(0, len(shard_keys), 1000):
+        try:
+            s3_client.delete_objects(
+                Bucket=bucket,
+                Delete={'Objects': [{'Key': key} for key in shard_keys[i:i + 1000]], 'Quiet': True},
+            )
+        except Exception as e:
+            print(f'[WARN] Failed to delete format-parser shards: {e}')
+
+    print(f'[format-parser] Merged {len(shard_keys)} shards: {page_count} pages, {total_chars} chars')
+    return {
+        'status': 'completed',
+        'page_count': page_count,
+        'total_chars': total_chars,
+    }
 
 
 def chunk_text(text: str, chunk_size: int = TEXT_CHUNK_SIZE, overlap: int = TEXT_CHUNK_OVERLAP) -> list[str]:
@@ -251,18 +409,7 @@ def process_text_file(file_uri: str, file_type: str) -> dict:
         total_chars = sum(len(c['text']) for c in chunks_data)
         print(f'[format-parser] Done: {len(chunks_data)} chunks, {total_chars} chars')
 
-        # Save to format-parser/result.json
-        result_data = {'chunks': chunks_data}
-        doc_bucket, base_path = get_document_base_path(file_uri)
-        result_key = f'{base_path}/format-parser/result.json'
-
-        s3_client.put_object(
-            Bucket=doc_bucket,
-            Key=result_key,
-            Body=json.dumps(result_data, ensure_ascii=False),
-            ContentType='application/json',
-        )
-        print(f'[format-parser] Saved result to s3://{doc_bucket}/{result_key}')
+        save_format_parser_result(file_uri, chunks_data, kind='chunks')
 
         return {
             'status': 'completed',
@@ -448,16 +595,7 @@ def process_pptx(file_uri: str) -> dict:
 
         print(f'[format-parser] Done: {len(pages)} slides, {total_chars} chars')
 
-        # Save result.json
-        result_data = {'pages': pages}
-        result_key = f'{base_path}/format-parser/result.json'
-        s3_client.put_object(
-            Bucket=doc_bucket,
-            Key=result_key,
-            Body=json.dumps(result_data, ensure_ascii=False),
-            ContentType='application/json',
-        )
-        print(f'[format-parser] Saved result to s3://{doc_bucket}/{result_key}')
+        save_format_parser_result(file_uri, pages)
 
         return {
             'status': 'completed',
@@ -578,16 +716,7 @@ def process_docx(file_uri: str) -> dict:
 
         print(f'[format-parser] Done: {len(pages)} pages, {total_chars} chars')
 
-        # Save result.json
-        result_data = {'pages': pages}
-        result_key = f'{base_path}/format-parser/result.json'
-        s3_client.put_object(
-            Bucket=doc_bucket,
-            Key=result_key,
-            Body=json.dumps(result_data, ensure_ascii=False),
-            ContentType='application/json',
-        )
-        print(f'[format-parser] Saved result to s3://{doc_bucket}/{result_key}')
+        save_format_parser_result(file_uri, pages)
 
         return {
             'status': 'completed',
@@ -713,17 +842,7 @@ def process_spreadsheet(file_uri: str, file_type: str) -> dict:
         total_chars = sum(len(c['text']) for c in chunks_data)
         print(f'[format-parser] Done: {len(chunks_data)} sheets, {total_chars} chars')
 
-        result_data = {'chunks': chunks_data}
-        doc_bucket, base_path = get_document_base_path(file_uri)
-        result_key = f'{base_path}/format-parser/result.json'
-
-        s3_client.put_object(
-            Bucket=doc_bucket,
-            Key=result_key,
-            Body=json.dumps(result_data, ensure_ascii=False),
-            ContentType='application/json',
-        )
-        print(f'[format-parser] Saved result to s3://{doc_bucket}/{result_key}')
+        save_format_parser_result(file_uri, chunks_data, kind='chunks')
 
         return {
             'status': 'completed',
@@ -891,16 +1010,7 @@ def process_dxf(file_uri: str) -> dict:
 
         print(f'[format-parser] Done: {len(pages)} layouts, {total_chars} chars')
 
-        # Save result.json
-        result_data = {'pages': pages}
-        result_key = f'{base_path}/format-parser/result.json'
-        s3_client.put_object(
-            Bucket=doc_bucket,
-            Key=result_key,
-            Body=json.dumps(result_data, ensure_ascii=False),
-            ContentType='application/json',
-        )
-        print(f'[format-parser] Saved result to s3://{doc_bucket}/{result_key}')
+        save_format_parser_result(file_uri, pages)
 
         return {
             'status': 'completed',
@@ -915,11 +1025,29 @@ def process_dxf(file_uri: str) -> dict:
             shutil.rmtree(tmp_dir, ignore_errors=True)
 
 
+def record_failure(event: dict, error_msg: str) -> dict:
+    """Record a format parser failure as a step error; the workflow carries on without its text."""
+    entity_type = get_entity_prefix(event.get('file_type', ''))
+    update_workflow_status(event.get('document_id'), event.get('workflow_id'), WorkflowStatus.FAILED,
+                           entity_type=entity_type, error=error_msg)
+    record_step_error(event.get('workflow_id'), StepName.FORMAT_PARSER, error_msg)
+
+    return {
+        **event,
+        'format_parser': {
+            'status': 'failed',
+            'error': error_msg
+        }
+    }
+
+
 def handler(event, context):
     print(f'Event: {json.dumps(event)}')
 
+    if event.get('mode') == 'extract_pages':
+        return handle_extract_pages(event)
+
     workflow_id = event.get('workflow_id')
-    document_id = event.get('document_id')
     file_uri = event.get('file_uri')
     file_type = event.get('file_type', '')
 
@@ -941,9 +1069,40 @@ def handler(event, context):
             }
         }
 
+    if event.get('mode') == 'shards_failed':
+        # Caught from the ExtractTextShards Map
+        error_info = event.get('error_info') or {}
+        error_msg = f'Text extraction shard failed: {error_info.get("Error", "")} {error_info.get("Cause", "")}'.strip()
+        print(error_msg)
+        return record_failure(event, error_msg)
+
     try:
+        if event.get('mode') == 'merge_pages':
+            result = merge_page_shards(file_uri, event['text_shards'])
+            print(f'Format parser completed: {result}')
+            record_step_complete(workflow_id, StepName.FORMAT_PARSER)
+            return {
+                **event,
+                'format_parser': result
+            }
+
         record_step_start(workflow_id, StepName.FORMAT_PARSER)
 
+        if is_pdf:
+            page_count = get_pdf_page_count(file_uri)
+            if page_count > PDF_SHARD_PAGES:
+                text_shards = build_page_shards(page_count)
+                print(f'Sharding {page_count} pages into {len(text_shards)} text extraction ranges')
+                return {
+                    **event,
+                    'text_shards': text_shards,
+                    'format_parser': {
+                        'status': 'sharded',
+                        'page_count': page_count,
+                        'shard_count': len(text_shards),
+                    }
+                }
+
         if is_dxf_file:
             result = process_dxf(file_uri=file_uri)
         elif is_pptx:
@@ -951,7 +1110,7 @@ def handler(event, context):
         elif is_docx:
             result = process_docx(file_uri=file_uri)
         elif is_pdf:
-            result = process_pdf(file_uri=file_uri)
+            result = process_pdf(file_uri=file_uri, page_count=page_count)
         elif is_spread:
             result = process_spreadsheet(file_uri=file_uri, file_type=file_type)
         else:
@@ -970,14 +1129,4 @@ def handler(event, context):
         print(f'Error in format parser: {error_msg}')
         import traceback
         traceback.print_exc()
-        entity_type = get_entity_prefix(file_type)
-        update_workflow_status(document_id, workflow_id, WorkflowStatus.FAILED, entity_type=entity_type, error=error_msg)
-        record_step_error(workflow_id, StepName.FORMAT_PARSER, error_msg)
-
-        return {
-            **event,
-            'format_parser': {
-                'status': 'failed',
-                'error': error_msg
-            }
-        }
+        return record_failure(event, error_msg)
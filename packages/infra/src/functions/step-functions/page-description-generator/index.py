@@ -2,6 +2,7 @@
 
 Generates a searchable page description from segment analysis results.
 Runs in parallel with entity-extractor and analysis-finalizer in the Distributed Map.
+Batched Map items (see shared.segment_batches) are described per segment.
 """
 import json
 import os
@@ -14,6 +15,7 @@ from shared.s3_analysis import (
     get_segment_analysis,
     update_segment_analysis,
 )
+from shared.segment_batches import get_segment_indices, map_segments
 
 PAGE_DESCRIPTION_MODEL_ID = os.environ.get('PAGE_DESCRIPTION_MODEL_ID', '')
 PROMPTS = None
@@ -85,17 +87,12 @@ def generate_page_description(segment_data: dict, page_number: int, language: st
         return ''
 
 
-def handler(event, _context):
-    print(f'Event: {json.dumps(event)}')
-
+def describe_segment(event: dict, segment_index: int) -> dict:
+    """Generate and store the page description of one segment."""
     workflow_id = event.get('workflow_id')
-    segment_index = event.get('segment_index', 0)
     file_uri = event.get('file_uri', '')
     language = event.get('language', 'en')
 
-    if isinstance(segment_index, dict):
-        segment_index = segment_index.get('segment_index', 0)
-
     segment_data = get_segment_analysis(file_uri, segment_index)
     if not segment_data:
         print(f'Segment not found: {file_uri}, segment {segment_index}')
@@ -117,3 +114,19 @@ def handler(event, _context):
         'status': 'completed',
         'page_description_length': len(page_description),
     }
+
+
+def handler(event, _context):
+    print(f'Event: {json.dumps(event)}')
+
+    segment_indices = get_segment_indices(event)
+    results = map_segments(lambda i: describe_segment(event, i), segment_indices)
+    if len(results) == 1:
+        return results[0]
+    return {
+        'workflow_id': event.get('workflow_id'),
+        'segment_index': segment_indices[0],
+        'segment_indices': segment_indices,
+        'status': 'completed',
+        'results': results,
+    }
@@ -1,23 +1,101 @@
-import io
 import os
-import tempfile
+import re
 from typing import Optional
 from urllib.parse import urlparse
 
-import boto3
-from PIL import Image
+from botocore.config import Config
 from strands import Agent
 from strands.models import BedrockModel, CacheConfig
+from strands.types.content import SystemContentBlock
+from strands.types.exceptions import MaxTokensReachedException
 
+from shared.s3_analysis import get_s3_client
 from tools import (
+    AGENT_IMAGE_MAX_BYTES,
+    STATE_KEY,
+    AnalysisState,
+    SegmentImage,
     create_image_analyzer_tool,
     create_image_rotator_tool,
     create_script_extractor_tool,
     create_video_analyzer_tool,
+    detect_image_format,
+    load_prompt,
 )
 
+# Connections kept open to bedrock-runtime (agent model + concurrent tool calls)
+BEDROCK_MAX_POOL_CONNECTIONS = int(os.environ.get('BEDROCK_MAX_POOL_CONNECTIONS', '20'))
+# Video script extraction (Converse with a video input) can take minutes
+BEDROCK_READ_TIMEOUT = int(os.environ.get('BEDROCK_READ_TIMEOUT', '600'))
+# Output limit of the agent model; text batches are sized against it in segment-builder
+BEDROCK_MAX_TOKENS = int(os.environ.get('BEDROCK_MAX_TOKENS', '16384'))
+
+# Language display names for prompts
+LANGUAGE_NAMES = {
+    'ko': 'Korean',
+    'en': 'English',
+    'ja': 'Japanese',
+    'zh': 'Chinese'
+}
+
+
+# Raised so Step Functions can retry
+RETRYABLE_ERRORS = (
+    'ThrottlingException',
+    'TooManyRequestsException',
+    'ServiceUnavailableException',
+    'ModelTimeoutException',
+    'modelStreamErrorException',
+)
+# Raised so they surface clearly
+ACCESS_ERRORS = (
+    'AccessDeniedException',
+    'UnauthorizedAccess',
+    'ValidationException',
+)
+
+# Stands in for the user instructions while the system prompt template is split
+_INSTRUCTIONS_MARKER = '\x00user_instructions\x00'
+
+BATCH_SEGMENT_PATTERN = re.compile(r'<segment_analysis index="(\d+)">\s*(.*?)\s*</segment_analysis>', re.DOTALL)
+
+
+def _should_raise(e: Exception) -> bool:
+    """Log an agent error; True if it must be raised instead of recorded as a failed analysis."""
+    error_str = str(e)
+    error_type = type(e).__name__
+    print(f'Agent execution error ({error_type}): {error_str}')
+    return any(kw in error_str or kw in error_type for kw in RETRYABLE_ERRORS + ACCESS_ERRORS)
+
+
+def _log_usage(label: str, result) -> dict:
+    """Log the token usage of an agent run, including prompt cache reads and writes."""
+    usage = dict(result.metrics.accumulated_usage)
+    print(
+        f'Token usage for {label}: '
+        f'input={usage.get("inputTokens", 0)}, '
+        f'output={usage.get("outputTokens", 0)}, '
+        f'cache_read={usage.get("cacheReadInputTokens", 0)}, '
+        f'cache_write={usage.get("cacheWriteInputTokens", 0)}'
+    )
+    return usage
+
 
 class VisionReactAgent:
+    """Segment analysis agent.
+
+    The Bedrock model (and its bedrock-runtime client, shared with the tools)
+    and the tool instances are created once and reused across warm
+    invocations; per-segment data travels in an AnalysisState passed through
+    the agent's invocation_state.
+
+    Requests are laid out for Bedrock prompt caching, from most to least
+    shared: tool specs, the mode's system prompt template, the workflow's
+    instructions and language, then the segment itself in the user message.
+    Each of the first three sections ends in a cache point, so segments of
+    the same workflow only pay for their own content.
+    """
+
     def __init__(
         self,
         model_id: str,
@@ -29,65 +107,51 @@ class VisionReactAgent:
         self.video_model_id = video_model_id
         self.bucket_owner_account_id = bucket_owner_account_id
         self.region = region
-        self.s3_client = boto3.client('s3', region_name=region)
-        self.bedrock_client = boto3.client('bedrock-runtime', region_name=region)
-        self.analysis_steps = []
-        self.current_image_data = None
-        self.previous_context = ''
-        self.current_video_uri = ''
-        self.current_start_timecode = ''
-        self.current_end_timecode = ''
-
-    def _load_prompt(self, prompt_name: str) -> str:
-        bucket = os.environ.get('AGENT_STORAGE_BUCKET_NAME', '')
-        if not bucket:
-            print('AGENT_STORAGE_BUCKET_NAME not set')
-            return ''
-        s3_key = f'__prompts/analysis/{prompt_name}.txt'
-        try:
-            resp = self.s3_client.get_object(Bucket=bucket, Key=s3_key)
-            return resp['Body'].read().decode('utf-8')
-        except Exception as e:
-            print(f'Failed to load prompt from S3 ({s3_key}): {e}')
-            return ''
-
-    def _detect_image_format(self, image_data: bytes) -> str:
-        if image_data[:8] == b'\x89PNG\r\n\x1a\n':
-            return 'png'
-        if image_data[:2] == b'\xff\xd8':
-            return 'jpeg'
-        if image_data[:4] == b'GIF8':
-            return 'gif'
-        if image_data[:4] == b'RIFF' and image_data[8:12] == b'WEBP':
-            return 'webp'
-        return 'png'
-
-    def _prepare_image_for_agent(self, image_data: bytes, max_size_mb: float = 3.75) -> bytes:
-        max_bytes = int(max_size_mb * 1024 * 1024)
-        if len(image_data) <= max_bytes:
-            return image_data
-
-        try:
-            image = Image.open(io.BytesIO(image_data))
-            target_ratio = (max_bytes * 0.8 / len(image_data)) ** 0.5
-            new_size = (int(image.size[0] * target_ratio), int(image.size[1] * target_ratio))
-            resized = image.resize(new_size, Image.LANCZOS)
-
-            buf = io.BytesIO()
-            if image.mode in ('RGBA', 'LA'):
-                resized.save(buf, format='PNG', optimize=True)
+        self.s3_client = get_s3_client()
+        self.model = BedrockModel(
+            model_id=model_id,
+            region_name=region,
+            max_tokens=BEDROCK_MAX_TOKENS,
+            boto_client_config=Config(
+                read_timeout=BEDROCK_READ_TIMEOUT,
+                max_pool_connections=BEDROCK_MAX_POOL_CONNECTIONS,
+                tcp_keepalive=True,
+            ),
+            cache_tools='default',
+            cache_config=CacheConfig(strategy='auto')
+        )
+        self.bedrock_client = self.model.client
+        self._tools = {}
+
+    def _get_tools(self, mode: str) -> list:
+        """Tools for 'video', 'text' or 'image' segments, created on first use."""
+        if mode not in self._tools:
+            if mode == 'video':
+                self._tools[mode] = [
+                    create_script_extractor_tool(
+                        bedrock_client=self.bedrock_client,
+                        bucket_owner_account_id=self.bucket_owner_account_id
+                    ),
+                    create_video_analyzer_tool(
+                        model_id=self.video_model_id,
+                        bedrock_client=self.bedrock_client,
+                        bucket_owner_account_id=self.bucket_owner_account_id
+                    ),
+                ]
+            elif mode == 'text':
+                # Text-only analysis: no tools needed, just analyze from context
+                self._tools[mode] = []
             else:
-                if resized.mode == 'RGBA':
-                    resized = resized.convert('RGB')
-                resized.save(buf, format='JPEG', quality=85, optimize=True)
-
-            print(f'Agent image resized: {image.size} -> {new_size}')
-            return buf.getvalue()
-        except Exception as e:
-            print(f'Agent image resize failed: {e}')
-            return image_data
+                self._tools[mode] = [
+                    create_image_analyzer_tool(
+                        model_id=self.model_id,
+                        bedrock_client=self.bedrock_client
+                    ),
+                    create_image_rotator_tool(),
+                ]
+        return self._tools[mode]
 
-    def _download_image(self, image_uri: str) -> Optional[bytes]:
+    def _download_image(self, image_uri: str) -> Optional[SegmentImage]:
         if not image_uri:
             return None
 
@@ -97,137 +161,32 @@ class VisionReactAgent:
             key = parsed.path.lstrip('/')
 
             print(f'Downloading image from s3://{bucket}/{key}')
+            image = SegmentImage.from_s3(self.s3_client, bucket, key)
 
-            with tempfile.NamedTemporaryFile(delete=False) as tmp:
-                self.s3_client.download_file(bucket, key, tmp.name)
-                with open(tmp.name, 'rb') as f:
-                    image_data = f.read()
-                os.unlink(tmp.name)
+            size_mb = len(image.data) / (1024 * 1024)
+            print(f'Image downloaded: {size_mb:.2f}MB')
 
-                size_mb = len(image_data) / (1024 * 1024)
-                print(f'Image downloaded: {size_mb:.2f}MB')
-
-                return image_data
+            return image
         except Exception as e:
             print(f'Error downloading image: {e}')
             return None
 
-    def _get_image_data(self) -> Optional[bytes]:
-        return self.current_image_data
-
-    def _set_image_data(self, data: bytes) -> None:
-        self.current_image_data = data
-
-    def _get_previous_context(self) -> str:
-        return self.previous_context
-
-    def _get_video_uri(self) -> str:
-        return self.current_video_uri
-
-    def _get_timecode(self) -> tuple[str, str]:
-        return (self.current_start_timecode, self.current_end_timecode)
-
-    def analyze(
-        self,
-        document_id: str,
-        segment_id: str,
-        segment_index: int,
-        image_uri: Optional[str],
-        context: str,
-        file_type: str,
-        language: str = 'en',
-        user_instructions: str = '',
-        segment_type: str = 'PAGE',
-        video_uri: str = '',
-        start_timecode: str = '',
-        end_timecode: str = '',
-        transcribe_segments: Optional[list] = None
-    ) -> dict:
-        self.analysis_steps = []
-        self.previous_context = context
-
-        is_video = segment_type in ('VIDEO', 'CHAPTER')
-        is_text = segment_type in ('TEXT', 'WEB')
-
-        if is_video:
-            self.current_video_uri = video_uri
-            self.current_start_timecode = start_timecode
-            self.current_end_timecode = end_timecode
-            self.current_image_data = None
-            print(f'Video segment: {video_uri}, timecode: {start_timecode} - {end_timecode}')
-        elif image_uri:
-            self.current_image_data = self._download_image(image_uri)
-            self.current_video_uri = ''
-        else:
-            self.current_image_data = None
-            self.current_video_uri = ''
-
-        # Language display names for prompts
-        language_names = {
-            'ko': 'Korean',
-            'en': 'English',
-            'ja': 'Japanese',
-            'zh': 'Chinese'
-        }
-        language_name = language_names.get(language, 'English')
-
-        model = BedrockModel(
-            model_id=self.model_id,
-            region_name=self.region,
-            cache_tools='default',
-            cache_config=CacheConfig(strategy='auto')
-        )
-
-        tools = []
-
-        if is_video:
-            extract_script = create_script_extractor_tool(
-                video_uri_getter=self._get_video_uri,
-                timecode_getter=self._get_timecode,
-                transcribe_segments=transcribe_segments or [],
-                analysis_steps=self.analysis_steps,
-                region=self.region,
-                bucket_owner_account_id=self.bucket_owner_account_id,
-                language=language_name
-            )
-            analyze_video = create_video_analyzer_tool(
-                video_uri_getter=self._get_video_uri,
-                analysis_steps=self.analysis_steps,
-                model_id=self.video_model_id,
-                bedrock_client=self.bedrock_client,
-                bucket_owner_account_id=self.bucket_owner_account_id,
-                language=language_name
-            )
-            tools.extend([extract_script, analyze_video])
-        elif is_text:
-            # Text-only analysis: no tools needed, just analyze from context
-            pass
-        else:
-            analyze_image = create_image_analyzer_tool(
-                image_data_getter=self._get_image_data,
-                previous_context_getter=self._get_previous_context,
-                analysis_steps=self.analysis_steps,
-                model_id=self.model_id,
-                bedrock_client=self.bedrock_client,
-                language=language_name
-            )
-
-            rotate_image = create_image_rotator_tool(
-                image_data_getter=self._get_image_data,
-                image_data_setter=self._set_image_data,
-                analysis_steps=self.analysis_steps
-            )
-            tools.extend([analyze_image, rotate_image])
-
-        if is_video:
-            system_prompt = self._load_prompt('video_system_prompt')
-        elif is_text:
-            system_prompt = self._load_prompt('text_system_prompt')
+    def _build_system_prompt(self, mode: str, user_instructions: str, language_name: str) -> list[SystemContentBlock]:
+        """System prompt for 'video', 'text' or 'image' segments.
+
+        Returns two cache-pointed blocks: the mode's template, identical for
+        every workflow, and the user instructions and output language,
+        identical for every segment of a workflow.
+        """
+        if mode == 'video':
+            system_prompt = load_prompt('video_system_prompt')
+        elif mode == 'text':
+            system_prompt = load_prompt('text_system_prompt')
         else:
-            system_prompt = self._load_prompt('system_prompt')
+            system_prompt = load_prompt('system_prompt')
 
         if not system_prompt:
-            if is_video:
+            if mode == 'video':
                 system_prompt = """You are a Video Analysis Agent. Extract structured, searchable information from video content.
 
 Follow this workflow:
@@ -238,7 +197,7 @@ Follow this workflow:
 Do NOT report STT corrections or upstream processor fixes. Just output the correct content silently.
 
 {user_instructions}"""
-            elif is_text:
+            elif mode == 'text':
                 system_prompt = """You are a Text Document Analysis Agent. Extract structured, searchable information from text documents.
 
 Follow this workflow:
@@ -268,13 +227,59 @@ Use the analyze_image tool only when your direct vision cannot read specific con
 {user_instructions}
 </user_instructions>"""
 
-        system_prompt = system_prompt.format(user_instructions=user_instructions_block)
+        # Split at the user instructions: the template before them is shared across workflows
+        system_prompt = system_prompt.format(user_instructions=_INSTRUCTIONS_MARKER)
+        template, _, template_tail = system_prompt.partition(_INSTRUCTIONS_MARKER)
 
         # Add language instruction to system prompt
-        system_prompt = f"{system_prompt}\n\nIMPORTANT: You MUST use {language_name} for ALL output including: tool call questions (analyze_image, analyze_video, extract_video_script arguments), analysis text, section headers, and descriptions. The only exception is preserving original document text exactly as written."
+        workflow_prompt = f"{user_instructions_block}{template_tail}\n\nIMPORTANT: You MUST use {language_name} for ALL output including: tool call questions (analyze_image, analyze_video, extract_video_script arguments), analysis text, section headers, and descriptions. The only exception is preserving original document text exactly as written."
+
+        blocks = []
+        if template.strip():
+            blocks += [{'text': template}, {'cachePoint': {'type': 'default'}}]
+        blocks += [{'text': workflow_prompt.strip()}, {'cachePoint': {'type': 'default'}}]
+        return blocks
+
+    def analyze(
+        self,
+        document_id: str,
+        segment_id: str,
+        segment_index: int,
+        image_uri: Optional[str],
+        context: str,
+        file_type: str,
+        language: str = 'en',
+        user_instructions: str = '',
+        segment_type: str = 'PAGE',
+        video_uri: str = '',
+        start_timecode: str = '',
+        end_timecode: str = '',
+        transcribe_segments: Optional[list] = None
+    ) -> dict:
+        is_video = segment_type in ('VIDEO', 'CHAPTER')
+        is_text = segment_type in ('TEXT', 'WEB')
+        language_name = LANGUAGE_NAMES.get(language, 'English')
+
+        state = AnalysisState(
+            language=language_name,
+            previous_context=context,
+            transcribe_segments=transcribe_segments or []
+        )
 
         if is_video:
-            user_query = self._load_prompt('video_user_query')
+            state.video_uri = video_uri
+            state.start_timecode = start_timecode
+            state.end_timecode = end_timecode
+            print(f'Video segment: {video_uri}, timecode: {start_timecode} - {end_timecode}')
+        elif image_uri:
+            state.image = self._download_image(image_uri)
+
+        mode = 'video' if is_video else 'text' if is_text else 'image'
+        tools = self._get_tools(mode)
+        system_prompt = self._build_system_prompt(mode, user_instructions, language_name)
+
+        if is_video:
+            user_query = load_prompt('video_user_query')
             if user_query:
                 user_query = user_query.format(
                     segment_index=segment_index + 1,
@@ -295,7 +300,7 @@ Output as: ## Video Overview, ## Speech Content, ## Visual Content, ## Key Infor
 
 IMPORTANT: Provide all output in {language_name}."""
         elif is_text:
-            user_query = self._load_prompt('text_user_query')
+            user_query = load_prompt('text_user_query')
             if user_query:
                 user_query = user_query.format(
                     segment_index=segment_index + 1,
@@ -316,7 +321,7 @@ Output as: ## Original Text, ## Document Overview, ## Key Information
 
 IMPORTANT: Provide all output in {language_name}."""
         else:
-            user_query = self._load_prompt('user_query')
+            user_query = load_prompt('user_query')
             if user_query:
                 user_query = user_query.format(
                     segment_index=segment_index + 1,
@@ -338,7 +343,7 @@ Output as: ## Original Text, ## Document Overview, ## Key Information, ## Analys
 IMPORTANT: Provide all output in {language_name}."""
 
         agent = Agent(
-            model=model,
+            model=self.model,
             system_prompt=system_prompt,
             tools=tools
         )
@@ -348,9 +353,9 @@ IMPORTANT: Provide all output in {language_name}."""
             print(f'Segment type: {segment_type}, Video: {is_video}, Text: {is_text}')
 
             # Build user message: multimodal for PAGE with image
-            if self.current_image_data and not is_video and not is_text:
-                prepared = self._prepare_image_for_agent(self.current_image_data)
-                fmt = self._detect_image_format(prepared)
+            if state.image and not is_video and not is_text:
+                prepared = state.image.fit(AGENT_IMAGE_MAX_BYTES)
+                fmt = detect_image_format(prepared)
                 user_message = [
                     {'image': {'format': fmt, 'source': {'bytes': prepared}}},
                     {'text': user_query}
@@ -359,47 +364,125 @@ IMPORTANT: Provide all output in {language_name}."""
             else:
                 user_message = user_query
 
-            result = agent(user_message)
+            result = agent(user_message, invocation_state={STATE_KEY: state})
             response_text = str(result)
+            usage = _log_usage(f'segment {segment_index}', result)
 
-            print(f'Analysis completed. Steps: {len(self.analysis_steps)}')
+            print(f'Analysis completed. Steps: {len(state.analysis_steps)}')
             print(f'Response length: {len(response_text)} chars')
 
             return {
                 'success': True,
                 'response': response_text,
-                'analysis_steps': self.analysis_steps,
-                'iterations': len(self.analysis_steps)
+                'analysis_steps': state.analysis_steps,
+                'iterations': len(state.analysis_steps),
+                'usage': usage
             }
 
         except Exception as e:
-            error_str = str(e)
-            error_type = type(e).__name__
-            print(f'Agent execution error ({error_type}): {error_str}')
-
-            # Raise retryable errors so Step Functions can retry
-            retryable_keywords = [
-                'ThrottlingException',
-                'TooManyRequestsException',
-                'ServiceUnavailableException',
-                'ModelTimeoutException',
-                'modelStreamErrorException',
-            ]
-            if any(kw in error_str or kw in error_type for kw in retryable_keywords):
-                raise
-
-            # Raise access errors so they surface clearly
-            access_keywords = [
-                'AccessDeniedException',
-                'UnauthorizedAccess',
-                'ValidationException',
-            ]
-            if any(kw in error_str or kw in error_type for kw in access_keywords):
+            if _should_raise(e):
                 raise
 
             return {
                 'success': False,
                 'response': f'Analysis failed: {e}',
-                'analysis_steps': self.analysis_steps,
-                'iterations': len(self.analysis_steps)
+                'analysis_steps': state.analysis_steps,
+                'iterations': len(state.analysis_steps)
             }
+
+    def analyze_batch(
+        self,
+        document_id: str,
+        segments: list[dict],
+        language: str = 'en',
+        user_instructions: str = ''
+    ) -> dict:
+        """Analyze several text-only segments in one request.
+
+        Args:
+            document_id: Workflow ID (for logging)
+            segments: [{'segment_index': int, 'context': str}, ...] in document order
+            language: Output language code
+            user_instructions: Document prompt shared by all segments
+
+        Returns:
+            {'success': bool, 'responses': {segment_index: text}, 'usage': dict,
+            'truncated': bool}; segments missing from the model output (or cut
+            off at max_tokens) are absent from responses
+        """
+        language_name = LANGUAGE_NAMES.get(language, 'English')
+        system_prompt = self._build_system_prompt('text', user_instructions, language_name)
+
+        segments_block = '\n\n'.join(
+            f'<segment index="{seg["segment_index"] + 1}">\n{seg["context"]}\n</segment>'
+            for seg in segments
+        )
+        first = segments[0]['segment_index'] + 1
+        last = segments[-1]['segment_index'] + 1
+
+        user_query = load_prompt('text_batch_user_query')
+        if user_query:
+            user_query = user_query.format(
+                segment_count=len(segments),
+                first_segment=first,
+                last_segment=last,
+                segments=segments_block,
+                language=language_name
+            )
+        else:
+            user_query = f"""Analyze {len(segments)} text document segments (chunks {first}-{last}). Analyze each segment independently.
+
+{segments_block}
+
+For EACH segment:
+Step 1: ASSESS - Is this a segment with substantive content or empty/boilerplate?
+Step 2: EXTRACT - Reproduce all text exactly as provided with original structure and formatting.
+Step 3: ANALYZE - Add analysis only if needed.
+
+Output as: ## Original Text, ## Document Overview, ## Key Information
+
+Wrap the output of each segment in a block with the same index, in order, and write nothing outside the blocks:
+<segment_analysis index="N">
+...
+</segment_analysis>
+
+IMPORTANT: Provide all output in {language_name}."""
+
+        agent = Agent(
+            model=self.model,
+            system_prompt=system_prompt,
+            tools=self._get_tools('text')
+        )
+
+        try:
+            print(f'Starting batch analysis for document {document_id}, segments {first}-{last} ({len(segments)})')
+            truncated = False
+            try:
+                result = agent(user_query)
+                response_text = str(result)
+                usage = _log_usage(f'segments {first}-{last}', result)
+            except MaxTokensReachedException as e:
+                # The partial response is kept in agent.messages; its completed blocks are still valid
+                print(f'[WARN] Batch response hit max_tokens, keeping completed segments: {e}')
+                last_message = agent.messages[-1] if agent.messages else {}
+                response_text = ''.join(
+                    block.get('text', '') for block in last_message.get('content', [])
+                ) if last_message.get('role') == 'assistant' else ''
+                usage = {}
+                truncated = True
+
+            requested = {seg['segment_index'] for seg in segments}
+            responses = {}
+            for match in BATCH_SEGMENT_PATTERN.finditer(response_text):
+                segment_index = int(match.group(1)) - 1
+                if segment_index in requested and match.group(2):
+                    responses[segment_index] = match.group(2)
+
+            print(f'Batch analysis completed: {len(responses)}/{len(segments)} segments, {len(response_text)} chars')
+            return {'success': True, 'responses': responses, 'usage': usage, 'truncated': truncated}
+
+        except Exception as e:
+            if _should_raise(e):
+                raise
+
+            return {'success': False, 'responses': {}, 'error': str(e)}
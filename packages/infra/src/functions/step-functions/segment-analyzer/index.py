@@ -9,15 +9,18 @@ from shared.ddb_client import (
 )
 from shared.s3_analysis import (
     get_segment_analysis,
-    add_segment_ai_analysis,
-    update_segment_status,
+    SegmentStateBuffer,
     SegmentStatus,
 )
+from shared.segment_batches import get_segment_indices, is_batchable_segment, map_segments
 
 from agent import VisionReactAgent
 
 is_first_segment = {}
 
+# Concurrent single-segment analyses for batch segments the batch request did not cover
+ANALYSIS_FALLBACK_WORKERS = int(os.environ.get('ANALYSIS_FALLBACK_WORKERS', '4'))
+
 # Reuse agent across warm starts to avoid creating new boto3 clients each invocation
 _cached_agent = None
 
@@ -34,37 +37,38 @@ def _get_agent():
     return _cached_agent
 
 
-def handler(event, _context):
-    print(f'Event: {json.dumps(event)}')
+def build_context(segment_data: dict) -> str:
+    """Upstream processor results of a segment, as given to the agent."""
+    bda_content = segment_data.get('bda_indexer', '')
+    pdf_text = segment_data.get('format_parser', '')
+    ocr_text = segment_data.get('paddleocr', '')
+    webcrawler_content = segment_data.get('webcrawler_content', '')
+
+    context_parts = []
+    if bda_content:
+        context_parts.append(f'## BDA Indexer:\n{bda_content}')
+    if pdf_text:
+        context_parts.append(f'## Format Parser:\n{pdf_text}')
+    if ocr_text:
+        context_parts.append(f'## PaddleOCR:\n{ocr_text}')
+    if webcrawler_content:
+        context_parts.append(f'## Web Crawler:\n{webcrawler_content}')
+
+    return '\n\n'.join(context_parts) if context_parts else 'No prior analysis available.'
 
+
+def analyze_segment(event: dict, segment_index: int, language: str, document_prompt: str,
+                    segment_data: dict = None) -> dict:
+    """Analyze a single segment with the agent and commit its results."""
     workflow_id = event.get('workflow_id')
     document_id = event.get('document_id', '')
     project_id = event.get('project_id', 'default')
-    segment_index = event.get('segment_index', event)
     file_uri = event.get('file_uri')
     file_type = event.get('file_type')
-    segment_count = event.get('segment_count', 0)
-
-    if isinstance(segment_index, dict):
-        segment_index = segment_index.get('segment_index', 0)
-
-    # Get language: event (per-document override) > project default
-    language = event.get('language') or get_project_language(project_id)
-
-    # Document prompt: event (resolved at upload) > project default
-    document_prompt = event.get('document_prompt', '')
-    if not document_prompt:
-        document_prompt = get_project_document_prompt(project_id)
-    print(f'Project {project_id} language: {language}')
-    if document_prompt:
-        print(f'Using document prompt ({len(document_prompt)} chars)')
-
-    if workflow_id not in is_first_segment:
-        is_first_segment[workflow_id] = True
-        record_step_start(workflow_id, StepName.SEGMENT_ANALYZER)
 
     # Get segment data from S3
-    segment_data = get_segment_analysis(file_uri, segment_index)
+    if segment_data is None:
+        segment_data = get_segment_analysis(file_uri, segment_index)
 
     if not segment_data:
         print(f'Segment {segment_index} not found in S3 for file {file_uri}')
@@ -80,10 +84,6 @@ def handler(event, _context):
         }
 
     image_uri = segment_data.get('image_uri', '')
-    bda_content = segment_data.get('bda_indexer', '')
-    pdf_text = segment_data.get('format_parser', '')
-    ocr_text = segment_data.get('paddleocr', '')
-    webcrawler_content = segment_data.get('webcrawler_content', '')
     transcribe_segments = segment_data.get('transcribe_segments', [])
     segment_type = segment_data.get('segment_type', 'PAGE')
     video_uri = segment_data.get('file_uri', file_uri)
@@ -93,20 +93,13 @@ def handler(event, _context):
     # Check for reanalysis instructions (takes priority over project settings)
     reanalysis_instructions = segment_data.get('reanalysis_instructions', '')
 
-    context_parts = []
-    if bda_content:
-        context_parts.append(f'## BDA Indexer:\n{bda_content}')
-    if pdf_text:
-        context_parts.append(f'## Format Parser:\n{pdf_text}')
-    if ocr_text:
-        context_parts.append(f'## PaddleOCR:\n{ocr_text}')
-    if webcrawler_content:
-        context_parts.append(f'## Web Crawler:\n{webcrawler_content}')
-
-    context = '\n\n'.join(context_parts) if context_parts else 'No prior analysis available.'
+    context = build_context(segment_data)
 
-    # Update status to ANALYZING
-    update_segment_status(file_uri, segment_index, SegmentStatus.ANALYZING)
+    # Status and results are collected in memory and written in two round trips:
+    # the ANALYZING status now and everything else when the analysis ends
+    state = SegmentStateBuffer(file_uri, segment_index)
+    state.set_status(SegmentStatus.ANALYZING)
+    state.commit()
 
     try:
         agent = _get_agent()
@@ -139,24 +132,16 @@ def handler(event, _context):
         response_text = result.get('response', '')
         if response_text:
             label = f'Chapter {segment_index + 1} Analysis' if is_media else f'Page {segment_index + 1} Analysis'
-            add_segment_ai_analysis(
-                file_uri=file_uri,
-                segment_index=segment_index,
-                analysis_query=label,
-                content=response_text
-            )
+            state.add_ai_analysis(label, response_text)
 
         # Save tool call results after
         for step in analysis_steps:
             question = step.get('question', '')
             answer = step.get('answer', '')
             if question and answer:
-                add_segment_ai_analysis(
-                    file_uri=file_uri,
-                    segment_index=segment_index,
-                    analysis_query=question,
-                    content=answer
-                )
+                state.add_ai_analysis(question, answer)
+
+        state.commit()
 
         return {
             'workflow_id': workflow_id,
@@ -172,18 +157,11 @@ def handler(event, _context):
 
     except Exception as e:
         print(f'Error in segment analysis: {e}')
-        is_media = segment_type in ('VIDEO', 'CHAPTER', 'AUDIO')
-
-        # Update status to FAILED
-        update_segment_status(file_uri, segment_index, SegmentStatus.FAILED, error=str(e))
 
-        # Save error to S3
-        add_segment_ai_analysis(
-            file_uri=file_uri,
-            segment_index=segment_index,
-            analysis_query='Analysis error',
-            content=f'Analysis failed: {e}'
-        )
+        # Record FAILED status and the error together with any results collected so far
+        state.set_status(SegmentStatus.FAILED, error=str(e))
+        state.add_ai_analysis('Analysis error', f'Analysis failed: {e}')
+        state.commit()
 
         return {
             'workflow_id': workflow_id,
@@ -196,3 +174,109 @@ def handler(event, _context):
             'status': 'failed',
             'error': str(e)
         }
+
+
+def analyze_segment_batch(event: dict, segment_indices: list[int], language: str, document_prompt: str) -> dict:
+    """Analyze a batch of adjacent text-only segments in one agent request.
+
+    Segments that cannot share the request (not text-only, own reanalysis
+    instructions) or that are missing from the batch output (including a
+    response cut off at max_tokens) are analyzed individually.
+    """
+    workflow_id = event.get('workflow_id')
+    file_uri = event.get('file_uri')
+
+    segments = dict(zip(segment_indices, map_segments(
+        lambda i: get_segment_analysis(file_uri, i), segment_indices
+    )))
+    batch = [
+        i for i in segment_indices
+        if segments[i] and is_batchable_segment(segments[i]) and not segments[i].get('reanalysis_instructions')
+    ]
+
+    agent = _get_agent()
+    responses = {}
+    if len(batch) > 1:
+        try:
+            result = agent.analyze_batch(
+                document_id=workflow_id,
+                segments=[{'segment_index': i, 'context': build_context(segments[i])} for i in batch],
+                language=language,
+                user_instructions=document_prompt
+            )
+            responses = result.get('responses', {})
+        except Exception as e:
+            print(f'Error in batch analysis, analyzing segments individually: {e}')
+
+    def _commit(i: int) -> dict:
+        # Segment-builder already set ANALYZING, so a batched segment needs a single commit
+        state = SegmentStateBuffer(file_uri, i)
+        state.add_ai_analysis(f'Page {i + 1} Analysis', responses[i])
+        state.commit()
+        return {'segment_index': i, 'status': 'analyzed'}
+
+    committed = map_segments(_commit, [i for i in segment_indices if i in responses])
+    remaining = [i for i in segment_indices if i not in responses]
+    individual = []
+    if remaining:
+        print(f'Analyzing {len(remaining)} of {len(segment_indices)} segments individually')
+        # Each analysis runs its own Agent on the shared model and tools
+        individual = map_segments(
+            lambda i: analyze_segment(event, i, language, document_prompt, segments[i]),
+            remaining,
+            max_workers=ANALYSIS_FALLBACK_WORKERS
+        )
+
+    results = {r['segment_index']: r for r in committed + individual}
+    statuses = [results[i]['status'] for i in segment_indices]
+    print(f'Batch of {len(segment_indices)} segments: {len(committed)} analyzed together, statuses {statuses}')
+
+    if all(status == 'analyzed' for status in statuses):
+        status = 'analyzed'
+    elif 'analyzed' in statuses:
+        status = 'partial'
+    else:
+        status = 'failed'
+
+    return {
+        'workflow_id': workflow_id,
+        'document_id': event.get('document_id', ''),
+        'project_id': event.get('project_id', 'default'),
+        'segment_index': segment_indices[0],
+        'segment_indices': segment_indices,
+        'file_uri': file_uri,
+        'file_type': event.get('file_type'),
+        'language': language,
+        'status': status,
+        'analysis_count': statuses.count('analyzed'),
+        'results': [results[i] for i in segment_indices]
+    }
+
+
+def handler(event, _context):
+    print(f'Event: {json.dumps(event)}')
+
+    workflow_id = event.get('workflow_id')
+    project_id = event.get('project_id', 'default')
+
+    # Map item: a single segment index or a batch of text-only segments
+    segment_indices = get_segment_indices(event)
+
+    # Get language: event (per-document override) > project default
+    language = event.get('language') or get_project_language(project_id)
+
+    # Document prompt: event (resolved at upload) > project default
+    document_prompt = event.get('document_prompt', '')
+    if not document_prompt:
+        document_prompt = get_project_document_prompt(project_id)
+    print(f'Project {project_id} language: {language}')
+    if document_prompt:
+        print(f'Using document prompt ({len(document_prompt)} chars)')
+
+    if workflow_id not in is_first_segment:
+        is_first_segment[workflow_id] = True
+        record_step_start(workflow_id, StepName.SEGMENT_ANALYZER)
+
+    if len(segment_indices) > 1:
+        return analyze_segment_batch(event, segment_indices, language, document_prompt)
+    return analyze_segment(event, segment_indices[0], language, document_prompt)
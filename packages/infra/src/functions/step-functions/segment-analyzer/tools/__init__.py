@@ -1,11 +1,20 @@
 from .image_analyzer import create_image_analyzer_tool
 from .image_rotator import create_image_rotator_tool
+from .prompts import load_prompt
 from .script_extractor import create_script_extractor_tool
+from .segment_image import AGENT_IMAGE_MAX_BYTES, SegmentImage, detect_image_format
+from .state import STATE_KEY, AnalysisState
 from .video_analyzer import create_video_analyzer_tool
 
 __all__ = [
+    'AGENT_IMAGE_MAX_BYTES',
+    'AnalysisState',
+    'STATE_KEY',
+    'SegmentImage',
     'create_image_analyzer_tool',
     'create_image_rotator_tool',
     'create_script_extractor_tool',
     'create_video_analyzer_tool',
+    'detect_image_format',
+    'load_prompt',
 ]
@@ -1,25 +1,17 @@
-import io
-from typing import Callable
+from strands import ToolContext, tool
 
-from PIL import Image
-from strands import tool
+from .state import get_state
 
 
-def create_image_rotator_tool(
-    image_data_getter: Callable[[], bytes],
-    image_data_setter: Callable[[bytes], None],
-    analysis_steps: list
-):
-    """Create an image rotator tool with context.
+def create_image_rotator_tool():
+    """Create an image rotator tool.
 
-    Args:
-        image_data_getter: Function to get current image data
-        image_data_setter: Function to set new image data
-        analysis_steps: List to append analysis steps
+    The rotated image replaces the image in the AnalysisState passed in
+    the agent's invocation_state.
     """
 
-    @tool
-    def rotate_image(degrees: int) -> str:
+    @tool(context=True)
+    def rotate_image(degrees: int, tool_context: ToolContext) -> str:
         """Rotate the current document image by specified degrees.
 
         Use this tool when text appears upside down, sideways, or at an angle.
@@ -31,33 +23,14 @@ def create_image_rotator_tool(
                      Use 180 if text is upside down.
                      Use 270 for counter-clockwise rotation.
         """
-        image_data = image_data_getter()
-        if image_data is None:
+        state = get_state(tool_context)
+        if state.image is None:
             return 'No image available to rotate.'
 
         try:
-            img = Image.open(io.BytesIO(image_data))
+            state.image = state.image.rotated(degrees)
 
-            if degrees == 90:
-                img = img.transpose(Image.Transpose.ROTATE_90)
-            elif degrees == 180:
-                img = img.transpose(Image.Transpose.ROTATE_180)
-            elif degrees == 270:
-                img = img.transpose(Image.Transpose.ROTATE_270)
-            else:
-                img = img.rotate(-degrees, expand=True)
-
-            if img.mode == 'RGBA':
-                img = img.convert('RGB')
-
-            buffer = io.BytesIO()
-            img.save(buffer, format='JPEG', quality=95)
-            new_image_data = buffer.getvalue()
-
-            image_data_setter(new_image_data)
-
-            analysis_steps.append({
-                'step': len(analysis_steps) + 1,
+            state.add_step({
                 'tool': 'rotate_image',
                 'degrees': degrees,
                 'result': 'Image rotated successfully'
@@ -0,0 +1,46 @@
+import os
+import threading
+import time
+
+from shared.s3_analysis import get_s3_client
+
+# Analysis prompts are edited in the agent storage bucket; warm containers
+# pick up changes after this many seconds
+PROMPT_CACHE_TTL_SECONDS = int(os.environ.get('PROMPT_CACHE_TTL_SECONDS', '300'))
+
+_prompt_cache = {}
+_prompt_lock = threading.Lock()
+
+
+def load_prompt(prompt_name: str) -> str:
+    """Load __prompts/analysis/{prompt_name}.txt from the agent storage bucket.
+
+    Results (including missing prompts) are cached per container for
+    PROMPT_CACHE_TTL_SECONDS. Returns '' when the prompt is not available.
+    """
+    now = time.monotonic()
+    with _prompt_lock:
+        cached = _prompt_cache.get(prompt_name)
+    if cached and now - cached[0] < PROMPT_CACHE_TTL_SECONDS:
+        return cached[1]
+
+    bucket = os.environ.get('AGENT_STORAGE_BUCKET_NAME', '')
+    if not bucket:
+        print('AGENT_STORAGE_BUCKET_NAME not set')
+        return ''
+
+    s3_key = f'__prompts/analysis/{prompt_name}.txt'
+    client = get_s3_client()
+    try:
+        resp = client.get_object(Bucket=bucket, Key=s3_key)
+        content = resp['Body'].read().decode('utf-8')
+    except client.exceptions.NoSuchKey:
+        content = ''
+    except Exception as e:
+        # Not cached, so a transient failure is retried on the next call
+        print(f'Failed to load prompt from S3 ({s3_key}): {e}')
+        return ''
+
+    with _prompt_lock:
+        _prompt_cache[prompt_name] = (now, content)
+    return content
@@ -1,13 +1,9 @@
 import os
-from typing import Callable
 
-import boto3
-from botocore.config import Config
-from strands import tool
+from strands import ToolContext, tool
 
-_converse_client = None
-_s3_client = boto3.client('s3')
-_prompt_cache = {}
+from .prompts import load_prompt
+from .state import get_state
 
 DEFAULT_PROMPT = """Extract and verify the complete speech transcript from this video.{timecode_info}
 
@@ -37,59 +33,21 @@ Structure your output as:
 </instructions>"""
 
 
-def _get_converse_client(region: str):
-    global _converse_client
-    if _converse_client is None:
-        _converse_client = boto3.client(
-            'bedrock-runtime',
-            region_name=region,
-            config=Config(read_timeout=600)
-        )
-    return _converse_client
-
-
-def _load_prompt_from_s3(prompt_name: str) -> str:
-    if prompt_name in _prompt_cache:
-        return _prompt_cache[prompt_name]
-    bucket = os.environ.get('AGENT_STORAGE_BUCKET_NAME', '')
-    if not bucket:
-        return ''
-    s3_key = f'__prompts/analysis/{prompt_name}.txt'
-    try:
-        resp = _s3_client.get_object(Bucket=bucket, Key=s3_key)
-        content = resp['Body'].read().decode('utf-8')
-        _prompt_cache[prompt_name] = content
-        return content
-    except Exception as e:
-        print(f'Failed to load prompt from S3 ({s3_key}): {e}')
-        return ''
-
-
-def create_script_extractor_tool(
-    video_uri_getter: Callable[[], str],
-    timecode_getter: Callable[[], tuple[str, str]],
-    transcribe_segments: list,
-    analysis_steps: list,
-    region: str = 'us-east-1',
-    bucket_owner_account_id: str = '',
-    language: str = 'English'
-):
+def create_script_extractor_tool(bedrock_client, bucket_owner_account_id: str = ''):
     """Create a video script extractor tool using Nova 2 Lite.
 
+    The video URI, timecodes, upstream STT segments and target language are
+    read from the AnalysisState passed in the agent's invocation_state.
+
     Args:
-        video_uri_getter: Function to get video S3 URI
-        timecode_getter: Function to get (start, end) timecodes
-        transcribe_segments: STT transcription segments from upstream
-        analysis_steps: List to append analysis steps
-        region: AWS region
+        bedrock_client: Bedrock client (Converse API)
         bucket_owner_account_id: AWS account ID that owns the S3 bucket
-        language: Target language for analysis output
     """
     model_id = os.environ.get('NOVA_LITE_MODEL_ID', 'global.amazon.nova-2-lite-v1:0')
     max_reasoning_effort = os.environ.get('MAX_REASONING_EFFORT', 'low')
 
-    @tool
-    def extract_video_script() -> str:
+    @tool(context=True)
+    def extract_video_script(tool_context: ToolContext) -> str:
         """Extract and verify the speech transcript from the video segment.
 
         This tool analyzes the video using a video-capable model to extract an accurate
@@ -99,11 +57,14 @@ def create_script_extractor_tool(
         Call this tool FIRST before any visual analysis tools.
         No arguments needed - the video segment and STT data are pre-configured.
         """
-        video_uri = video_uri_getter()
+        state = get_state(tool_context)
+        language = state.language
+        transcribe_segments = state.transcribe_segments
+        video_uri = state.video_uri
         if not video_uri:
             return 'No video available for script extraction.'
 
-        start_timecode, end_timecode = timecode_getter()
+        start_timecode, end_timecode = state.start_timecode, state.end_timecode
 
         # Format STT segments
         stt_text = ''
@@ -132,7 +93,7 @@ def create_script_extractor_tool(
                 'Extract the speech transcript directly from the video audio.'
             )
 
-        prompt_template = _load_prompt_from_s3('script_extractor_prompt') or DEFAULT_PROMPT
+        prompt_template = load_prompt('script_extractor_prompt') or DEFAULT_PROMPT
         prompt = prompt_template.format(
             timecode_info=timecode_info,
             stt_section=stt_section,
@@ -178,8 +139,7 @@ def create_script_extractor_tool(
                 print(f'Timecode: {start_timecode} - {end_timecode}')
             print(f'STT segments: {len(transcribe_segments)}')
 
-            client = _get_converse_client(region)
-            response = client.converse(**converse_params)
+            response = bedrock_client.converse(**converse_params)
 
             output = response.get('output', {})
             message = output.get('message', {})
@@ -192,8 +152,7 @@ def create_script_extractor_tool(
 
             answer = '\n'.join(answer_parts)
 
-            analysis_steps.append({
-                'step': len(analysis_steps) + 1,
+            state.add_step({
                 'tool': 'extract_video_script',
                 'question': 'Video Script Extraction',
                 'answer': answer
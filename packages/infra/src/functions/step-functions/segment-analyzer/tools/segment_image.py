@@ -0,0 +1,111 @@
+import base64
+import io
+from typing import Optional
+
+from PIL import Image
+
+# Encoded size limits for the agent message and the analyze_image tool
+AGENT_IMAGE_MAX_BYTES = int(3.75 * 1024 * 1024)
+TOOL_IMAGE_MAX_BYTES = int(3.5 * 1024 * 1024)
+
+_TRANSPOSE = {
+    90: Image.Transpose.ROTATE_90,
+    180: Image.Transpose.ROTATE_180,
+    270: Image.Transpose.ROTATE_270,
+}
+
+
+def detect_image_format(image_data: bytes) -> str:
+    """Detect image format (png, jpeg, gif, webp) from magic bytes."""
+    if image_data[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'png'
+    if image_data[:2] == b'\xff\xd8':
+        return 'jpeg'
+    if image_data[:4] == b'GIF8':
+        return 'gif'
+    if image_data[:4] == b'RIFF' and image_data[8:12] == b'WEBP':
+        return 'webp'
+    return 'png'
+
+
+def _encode(image: Image.Image, fmt: str, **params) -> bytes:
+    if fmt == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, **params)
+    return buffer.getvalue()
+
+
+class SegmentImage:
+    """A segment image held in memory for one analysis.
+
+    The source bytes are decoded at most once; resized, rotated and base64
+    variants are derived lazily from the decoded image and memoized, so the
+    agent message and repeated analyze_image calls share the same work.
+    """
+
+    def __init__(self, data: Optional[bytes] = None, image: Optional[Image.Image] = None):
+        if data is None and image is None:
+            raise ValueError('SegmentImage needs encoded data or a decoded image')
+        self._data = data
+        self._image = image
+        self._variants = {}
+
+    @classmethod
+    def from_s3(cls, s3_client, bucket: str, key: str) -> 'SegmentImage':
+        response = s3_client.get_object(Bucket=bucket, Key=key)
+        return cls(response['Body'].read())
+
+    @property
+    def data(self) -> bytes:
+        """Encoded bytes (rotated images are encoded as JPEG on first use)."""
+        if self._data is None:
+            self._data = _encode(self._image, 'JPEG', quality=95)
+        return self._data
+
+    @property
+    def image(self) -> Image.Image:
+        """Decoded image, decoded on first use."""
+        if self._image is None:
+            self._image = Image.open(io.BytesIO(self._data))
+            self._image.load()
+        return self._image
+
+    def fit(self, max_bytes: int) -> bytes:
+        """Encoded bytes no larger than roughly max_bytes (resized if needed)."""
+        if len(self.data) <= max_bytes:
+            return self.data
+
+        key = ('fit', max_bytes)
+        if key not in self._variants:
+            try:
+                target_ratio = (max_bytes * 0.8 / len(self.data)) ** 0.5
+                new_size = (int(self.image.size[0] * target_ratio), int(self.image.size[1] * target_ratio))
+                resized = self.image.resize(new_size, Image.LANCZOS)
+                if self.image.mode in ('RGBA', 'LA'):
+                    self._variants[key] = _encode(resized, 'PNG', optimize=True)
+                else:
+                    self._variants[key] = _encode(resized, 'JPEG', quality=85, optimize=True)
+                print(f'Image resized: {self.image.size} -> {new_size}')
+            except Exception as e:
+                print(f'Image resize failed: {e}')
+                self._variants[key] = self.data
+        return self._variants[key]
+
+    def fit_base64(self, max_bytes: int) -> str:
+        key = ('base64', max_bytes)
+        if key not in self._variants:
+            self._variants[key] = base64.b64encode(self.fit(max_bytes)).decode('utf-8')
+        return self._variants[key]
+
+    def rotated(self, degrees: int) -> 'SegmentImage':
+        """Rotated copy of the image, encoded lazily."""
+        key = ('rotate', degrees)
+        if key not in self._variants:
+            transpose = _TRANSPOSE.get(degrees)
+            if transpose is not None:
+                image = self.image.transpose(transpose)
+            else:
+                image = self.image.rotate(-degrees, expand=True)
+            self._variants[key] = SegmentImage(image=image)
+        return self._variants[key]
@@ -0,0 +1,31 @@
+from dataclasses import dataclass, field
+from typing import Optional
+
+from .segment_image import SegmentImage
+
+# Key of the AnalysisState in the agent's invocation_state
+STATE_KEY = 'analysis_state'
+
+
+@dataclass
+class AnalysisState:
+    """Per-segment state read and updated by the analysis tools.
+
+    The tools are created once per container; each agent invocation passes
+    a fresh AnalysisState through invocation_state.
+    """
+    language: str = 'English'
+    previous_context: str = ''
+    image: Optional[SegmentImage] = None
+    video_uri: str = ''
+    start_timecode: str = ''
+    end_timecode: str = ''
+    transcribe_segments: list = field(default_factory=list)
+    analysis_steps: list = field(default_factory=list)
+
+    def add_step(self, step: dict) -> None:
+        self.analysis_steps.append({'step': len(self.analysis_steps) + 1, **step})
+
+
+def get_state(tool_context) -> AnalysisState:
+    return tool_context.invocation_state[STATE_KEY]
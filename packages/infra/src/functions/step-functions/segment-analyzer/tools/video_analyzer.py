@@ -1,52 +1,29 @@
 import json
-import os
-from typing import Callable
 
-import boto3
-from strands import tool
+from strands import ToolContext, tool
 
-_s3_client = boto3.client('s3')
-_prompt_cache = {}
-
-
-def _load_prompt_from_s3(prompt_name: str) -> str:
-    if prompt_name in _prompt_cache:
-        return _prompt_cache[prompt_name]
-    bucket = os.environ.get('AGENT_STORAGE_BUCKET_NAME', '')
-    if not bucket:
-        return ''
-    s3_key = f'__prompts/analysis/{prompt_name}.txt'
-    try:
-        resp = _s3_client.get_object(Bucket=bucket, Key=s3_key)
-        content = resp['Body'].read().decode('utf-8')
-        _prompt_cache[prompt_name] = content
-        return content
-    except Exception as e:
-        print(f'Failed to load prompt from S3 ({s3_key}): {e}')
-        return ''
+from .prompts import load_prompt
+from .state import get_state
 
 
 def create_video_analyzer_tool(
-    video_uri_getter: Callable[[], str],
-    analysis_steps: list,
     model_id: str,
     bedrock_client,
-    bucket_owner_account_id: str,
-    language: str = 'English'
+    bucket_owner_account_id: str
 ):
-    """Create a video analyzer tool with context.
+    """Create a video analyzer tool.
+
+    The video URI and output language are read from the AnalysisState
+    passed in the agent's invocation_state.
 
     Args:
-        video_uri_getter: Function to get video S3 URI
-        analysis_steps: List to append analysis steps
         model_id: Bedrock model ID for TwelveLabs Pegasus
         bedrock_client: Bedrock client
         bucket_owner_account_id: AWS account ID that owns the S3 bucket
-        language: Language for analysis output (e.g., 'Korean', 'English')
     """
 
-    @tool
-    def analyze_video(question: str) -> str:
+    @tool(context=True)
+    def analyze_video(question: str, tool_context: ToolContext) -> str:
         """Analyze the video segment with a specific question.
 
         Use this tool to examine specific aspects of the video content.
@@ -61,12 +38,14 @@ def create_video_analyzer_tool(
                       Be specific - e.g., "What actions are being performed in this segment?"
                       or "Describe the main subjects and their activities."
         """
-        video_uri = video_uri_getter()
+        state = get_state(tool_context)
+        language = state.language
+        video_uri = state.video_uri
         if not video_uri:
             return 'No video available for analysis.'
 
         try:
-            prompt_template = _load_prompt_from_s3('video_analysis_prompt')
+            prompt_template = load_prompt('video_analysis_prompt')
 
             if prompt_template:
                 analysis_prompt = prompt_template.format(
@@ -105,8 +84,7 @@ Provide detailed, professional analysis in {language}."""
             # TwelveLabs Pegasus returns response in 'message' field
             answer = result.get('message', '')
 
-            analysis_steps.append({
-                'step': len(analysis_steps) + 1,
+            state.add_step({
                 'tool': 'analyze_video',
                 'question': question,
                 'answer': answer[:3000]
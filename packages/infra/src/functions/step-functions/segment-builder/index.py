@@ -6,15 +6,22 @@ Merges all processing sources and creates segment JSON files for analysis.
 Reads from:
 - preprocessor/metadata.json - segment images from Preprocessor
 - bda-output/ - BDA analysis results (if use_bda=true)
-- paddleocr/result.json - OCR results
-- format-parser/result.json - PDF text extraction results
+- paddleocr/result.jsonl - OCR results (read lazily per page)
+- format-parser/result.jsonl - PDF text extraction results (read lazily per page)
 
 Creates:
 - analysis/segment_XXXX.json - merged segment data for SegmentAnalyzer
+
+Returns segment_ids as Map items; adjacent text-only segments are grouped
+into batches (see shared.segment_batches).
 """
 import json
+import os
 import re
-from typing import Optional
+import time
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
 
 from shared.ddb_client import (
     record_step_start,
@@ -27,6 +34,8 @@ from shared.ddb_client import (
         WorkflowStatus,
     StepName,
 )
+from shared.page_results import PageResultsReader, open_page_results
+from shared.segment_batches import estimate_tokens, is_batchable_segment, plan_analysis_items
 from shared.s3_analysis import (
     save_segment_analysis,
     get_segment_analysis,
@@ -35,6 +44,11 @@ from shared.s3_analysis import (
     SegmentStatus,
 )
 
+# Parallel S3 GET/PUT workers for the segment merge
+MERGE_MAX_WORKERS = int(os.environ.get('MERGE_MAX_WORKERS', '32'))
+# Segments per merge batch (progress is reported after each batch)
+MERGE_BATCH_SIZE = int(os.environ.get('MERGE_BATCH_SIZE', '200'))
+
 
 def download_json_from_s3(uri: str) -> Optional[dict]:
     """Download and parse JSON from S3. Returns None if not found."""
@@ -181,87 +195,109 @@ def parse_bda_output(bda_metadata_uri: str, bda_output_uri: str, is_video: bool)
     return results
 
 
-def parse_ocr_result(file_uri: str) -> dict:
-    """Read OCR result and return indexed by page."""
+class LazyPageResults(Mapping):
+    """Read-only mapping over a result.jsonl file; records are fetched and
+    transformed on first access, so memory does not grow with page count."""
+
+    def __init__(self, reader: PageResultsReader, transform: Callable[[dict], dict]):
+        self._reader = reader
+        self._transform = transform
+
+    def __getitem__(self, index: int) -> dict:
+        record = self._reader.get(index)
+        if record is None:
+            raise KeyError(index)
+        return self._transform(record)
+
+    def __contains__(self, index) -> bool:
+        return index in self._reader
+
+    def __iter__(self):
+        return iter(self._reader.indices())
+
+    def __len__(self) -> int:
+        return len(self._reader)
+
+
+def _ocr_page_entry(page: dict) -> dict:
+    if 'blocks' not in page:
+        # Single content (for single images)
+        return {'paddleocr': page.get('content', ''), 'paddleocr_blocks': {}}
+    return {
+        'paddleocr': page.get('content', ''),
+        'paddleocr_blocks': {
+            'blocks': page.get('blocks', []),
+            'width': page.get('width'),
+            'height': page.get('height')
+        }
+    }
+
+
+def _parser_chunk_entry(chunk: dict) -> dict:
+    text = chunk.get('text', '')
+    return {
+        'text_content': text,
+        'format_parser': text  # Also set format_parser for consistency
+    }
+
+
+def _parser_page_entry(page: dict) -> dict:
+    page_result = {
+        'format_parser': page.get('text', ''),
+    }
+    # Include image_uri if present (PPTX slides)
+    if page.get('image_uri'):
+        page_result['image_uri'] = page['image_uri']
+    return page_result
+
+
+def parse_ocr_result(file_uri: str) -> Mapping:
+    """Read OCR result and return indexed by page.
+
+    Reads paddleocr/result.jsonl lazily; falls back to the legacy result.json.
+    """
     bucket, base_path = get_document_base_path(file_uri)
-    ocr_uri = f's3://{bucket}/{base_path}/paddleocr/result.json'
+    reader = open_page_results(f's3://{bucket}/{base_path}/paddleocr/result.jsonl')
+    if reader is not None:
+        return LazyPageResults(reader, _ocr_page_entry)
 
-    result = download_json_from_s3(ocr_uri)
+    result = download_json_from_s3(f's3://{bucket}/{base_path}/paddleocr/result.json')
     if not result:
         return {}
 
-    ocr_results = {}
     pages = result.get('pages', [])
-
     if not pages:
-        # Single content (for single images)
         content = result.get('content', '')
-        if content:
-            ocr_results[0] = {
-                'paddleocr': content,
-                'paddleocr_blocks': {}
-            }
-        return ocr_results
-
-    for i, page in enumerate(pages):
-        page_content = page.get('content', '')
-        page_blocks = page.get('blocks', [])
-        page_width = page.get('width')
-        page_height = page.get('height')
-
-        ocr_results[i] = {
-            'paddleocr': page_content,
-            'paddleocr_blocks': {
-                'blocks': page_blocks,
-                'width': page_width,
-                'height': page_height
-            }
-        }
+        return {0: _ocr_page_entry({'content': content})} if content else {}
 
-    return ocr_results
+    return {i: _ocr_page_entry({'blocks': [], **page}) for i, page in enumerate(pages)}
 
 
-def parse_format_parser_result(file_uri: str, is_text: bool = False) -> dict:
+def parse_format_parser_result(file_uri: str, is_text: bool = False) -> Mapping:
     """Read format parser result and return indexed by page/chunk.
 
     For PDF: returns {'format_parser': text} per page
     For text files: returns {'text_content': text} per chunk
+
+    Reads format-parser/result.jsonl lazily; falls back to the legacy result.json.
     """
     bucket, base_path = get_document_base_path(file_uri)
-    parser_uri = f's3://{bucket}/{base_path}/format-parser/result.json'
+    reader = open_page_results(f's3://{bucket}/{base_path}/format-parser/result.jsonl')
+    if reader is not None:
+        is_chunks = reader.meta.get('kind') == 'chunks'
+        return LazyPageResults(reader, _parser_chunk_entry if is_chunks else _parser_page_entry)
 
-    result = download_json_from_s3(parser_uri)
+    result = download_json_from_s3(f's3://{bucket}/{base_path}/format-parser/result.json')
     if not result:
         return {}
 
-    parser_results = {}
-
     # Handle text files (chunks)
     chunks = result.get('chunks', [])
     if chunks:
-        for chunk in chunks:
-            chunk_index = chunk.get('chunk_index', 0)
-            text = chunk.get('text', '')
-            parser_results[chunk_index] = {
-                'text_content': text,
-                'format_parser': text  # Also set format_parser for consistency
-            }
-        return parser_results
+        return {chunk.get('chunk_index', 0): _parser_chunk_entry(chunk) for chunk in chunks}
 
     # Handle PDF/PPTX (pages)
-    pages = result.get('pages', [])
-    for page in pages:
-        page_index = page.get('page_index', 0)
-        text = page.get('text', '')
-        page_result = {
-            'format_parser': text,
-        }
-        # Include image_uri if present (PPTX slides)
-        if page.get('image_uri'):
-            page_result['image_uri'] = page['image_uri']
-        parser_results[page_index] = page_result
-
-    return parser_results
+    return {page.get('page_index', 0): _parser_page_entry(page) for page in result.get('pages', [])}
 
 
 def find_transcribe_result(file_uri: str) -> Optional[str]:
@@ -522,7 +558,7 @@ def is_office_document(file_type: str) -> bool:
     )
 
 
-def copy_office_document_images(file_uri: str, parser_results: dict) -> None:
+def copy_office_document_images(file_uri: str, parser_results: Mapping) -> None:
     """Copy format-parser page/slide images to preprocessed/ folder."""
     client = get_s3_client()
     bucket, base_path = get_document_base_path(file_uri)
@@ -544,6 +580,45 @@ def copy_office_document_images(file_uri: str, parser_results: dict) -> None:
         print(f'Copied page image {page_idx} to preprocessed/')
 
 
+def merge_segments_concurrently(
+    segment_indices: list[int],
+    merge_fn: Callable[[int], None],
+    max_workers: int = MERGE_MAX_WORKERS,
+    batch_size: int = MERGE_BATCH_SIZE,
+) -> int:
+    """Run merge_fn for every segment index on a bounded thread pool.
+
+    Indices are processed in batches so that only one batch of segment
+    payloads is in flight at a time, and progress is logged per batch.
+    The first exception raised by merge_fn is propagated.
+
+    Returns:
+        Number of merged segments
+    """
+    total = len(segment_indices)
+    if total == 0:
+        return 0
+
+    workers = max(1, min(max_workers, total))
+    batch_size = max(1, batch_size)
+    merged = 0
+    started = time.time()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for start in range(0, total, batch_size):
+            batch = segment_indices[start:start + batch_size]
+            batch_started = time.time()
+            list(executor.map(merge_fn, batch))
+            merged += len(batch)
+            print(
+                f'Merged {merged}/{total} segments '
+                f'(batch {len(batch)} in {time.time() - batch_started:.1f}s, '
+                f'total {time.time() - started:.1f}s)'
+            )
+
+    return merged
+
+
 def handler(event, _context):
     print(f'Event: {json.dumps(event)}')
 
@@ -657,9 +732,14 @@ def handler(event, _context):
             segment_count = len(preprocessor_segments)
             segment_indices = [seg['segment_index'] for seg in preprocessor_segments]
 
-        for i in segment_indices:
+        preprocessor_by_index = {s['segment_index']: s for s in preprocessor_segments}
+        doc_bucket, doc_base = get_document_base_path(file_uri)
+        # Estimated content tokens of text-only segments, for analysis batching
+        batchable_tokens = {}
+
+        def _merge_segment(i: int):
             # For text files, get segment info from preprocessor if available
-            seg = next((s for s in preprocessor_segments if s['segment_index'] == i), None)
+            seg = preprocessor_by_index.get(i)
 
             # Read existing segment data (created by segment-prep)
             segment_data = get_segment_analysis(file_uri, i)
@@ -680,7 +760,7 @@ def handler(event, _context):
 
             # Ensure media has file_uri
             if is_media and 'file_uri' not in segment_data:
-                segment_data['file_uri'] = seg.get('file_uri', file_uri)
+                segment_data['file_uri'] = seg.get('file_uri', file_uri) if seg else file_uri
 
             # Merge BDA results (only when use_bda=true and BDA produced results)
             if use_bda and i in bda_results:
@@ -710,7 +790,6 @@ def handler(event, _context):
                     segment_data['text_content'] = parser_data['text_content']
                 # For office documents, set image_uri from preprocessed path
                 if is_office_doc and parser_data.get('image_uri'):
-                    doc_bucket, doc_base = get_document_base_path(file_uri)
                     segment_data['image_uri'] = f's3://{doc_bucket}/{doc_base}/preprocessed/page_{i:04d}.png'
             elif 'format_parser' not in segment_data:
                 segment_data['format_parser'] = ''
@@ -744,9 +823,16 @@ def handler(event, _context):
                 if 'instruction' not in segment_data:
                     segment_data['instruction'] = ''
 
+            if is_batchable_segment(segment_data):
+                batchable_tokens[i] = sum(
+                    estimate_tokens(segment_data.get(field) or '')
+                    for field in ('bda_indexer', 'format_parser', 'paddleocr', 'webcrawler_content')
+                )
+
             # Save merged segment to S3
             save_segment_analysis(file_uri, i, segment_data)
-            print(f'Merged segment {i}')
+
+        merge_segments_concurrently(segment_indices, _merge_segment)
 
         # Update workflow total_segments when segment count was overridden
         # (office docs from format-parser pages/slides, text/spreadsheet files from format-parser chunks, webreq from webcrawler pages)
@@ -763,6 +849,10 @@ def handler(event, _context):
 
         print(f'Built {segment_count} segments')
 
+        segment_ids = plan_analysis_items(segment_count, batchable_tokens)
+        if len(segment_ids) < segment_count:
+            print(f'Batched text-only segments: {segment_count} segments -> {len(segment_ids)} analysis items')
+
         project_id = event.get('project_id', 'default')
         language = event.get('language') or get_project_language(project_id)
         document_prompt = event.get('document_prompt', '')
@@ -774,7 +864,7 @@ def handler(event, _context):
             'file_uri': file_uri,
             'file_type': file_type,
             'segment_count': segment_count,
-            'segment_ids': list(range(segment_count)),
+            'segment_ids': segment_ids,
             'language': language,
             'document_prompt': document_prompt,
             'is_reanalysis': event.get('is_reanalysis', False)
@@ -3,27 +3,37 @@
 Prepares segment metadata for downstream processing.
 
 Supported formats:
-- PDF: Render each page to PNG, create segment metadata
+- PDF: Render each page to an image (PAGE_IMAGE_FORMAT), create segment metadata
 - Image: Use original file, create single segment metadata
 - Video: Create single segment metadata (no image)
 
 Output structure:
   s3://bucket/{base_path}/preprocessed/
     metadata.json - segment info
-    page_0000.png - page images (for PDF)
+    page_0000.png - page images (for PDF; extension follows PAGE_IMAGE_FORMAT)
 """
 import io
 import json
+import multiprocessing
 import os
 import tempfile
+import threading
+import time
 from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import wait
 from urllib.parse import urlparse
 
+import boto3
 import pypdfium2 as pdfium
 from PIL import Image
 
 # Pages per batch for parallel rendering via Step Functions Map
 RENDER_BATCH_SIZE = int(os.environ.get('RENDER_BATCH_SIZE', '500'))
+# Render worker processes per batch (0 = one per vCPU)
+RENDER_WORKERS = int(os.environ.get('RENDER_WORKERS', '0'))
+# Upload threads and max rendered pages waiting for upload
+RENDER_UPLOAD_THREADS = int(os.environ.get('RENDER_UPLOAD_THREADS', '8'))
+RENDER_UPLOAD_QUEUE_SIZE = int(os.environ.get('RENDER_UPLOAD_QUEUE_SIZE', '16'))
 
 from shared.ddb_client import (
     record_step_start,
@@ -41,10 +51,29 @@ from shared.s3_analysis import (
     save_segment_analysis,
     SegmentStatus,
 )
+from shared.s3_range_file import S3RangeFile, get_pdf_page_count
 
 # Image quality settings for PDF rendering
 PDF_DPI = 150  # DPI for PDF page rendering
 
+# Page image encoding profile. Pages are rendered once at the size the vision
+# model consumes (long edge ~1568px), so segment-analyzer never has to resize.
+# png (default) and webp are lossless; jpeg is lossy and opt-in.
+PAGE_IMAGE_FORMAT = os.environ.get('PAGE_IMAGE_FORMAT', 'png').lower()  # png | webp | jpeg
+PAGE_IMAGE_QUALITY = int(os.environ.get('PAGE_IMAGE_QUALITY', '90'))  # jpeg only
+PAGE_IMAGE_MAX_PIXELS = int(os.environ.get('PAGE_IMAGE_MAX_PIXELS', str(1568 * 1568)))
+PAGE_IMAGE_MAX_BYTES = int(os.environ.get('PAGE_IMAGE_MAX_BYTES', str(3 * 1024 * 1024)))
+PAGE_IMAGE_MIN_QUALITY = 50
+# zlib's exhaustive search makes PNGs a little smaller but is much slower to encode
+PAGE_IMAGE_PNG_OPTIMIZE = os.environ.get('PAGE_IMAGE_PNG_OPTIMIZE', 'false').lower() == 'true'
+
+# format -> (PIL format, file extension, content type)
+PAGE_IMAGE_FORMATS = {
+    'webp': ('WEBP', 'webp', 'image/webp'),
+    'jpeg': ('JPEG', 'jpg', 'image/jpeg'),
+    'png': ('PNG', 'png', 'image/png'),
+}
+
 # Supported PDF extensions
 PDF_EXTENSIONS = {'.pdf'}
 
@@ -130,25 +159,65 @@ def save_metadata_to_s3(bucket: str, base_path: str, metadata: dict):
     return f's3://{bucket}/{key}'
 
 
+def get_page_image_format() -> tuple[str, str, str]:
+    """(PIL format, extension, content type) for the configured page image format."""
+    return PAGE_IMAGE_FORMATS.get(PAGE_IMAGE_FORMAT, PAGE_IMAGE_FORMATS['png'])
+
+
+def get_page_image_key(base_path: str, page_num: int) -> str:
+    _, ext, _ = get_page_image_format()
+    return f'{base_path}/preprocessed/page_{page_num:04d}.{ext}'
+
+
+def get_render_scale(width_pt: float, height_pt: float) -> float:
+    """Scale for PDF_DPI, reduced so the page stays within PAGE_IMAGE_MAX_PIXELS."""
+    scale = PDF_DPI / 72
+    pixels = width_pt * height_pt * scale * scale
+    if pixels > PAGE_IMAGE_MAX_PIXELS:
+        scale *= (PAGE_IMAGE_MAX_PIXELS / pixels) ** 0.5
+    return scale
+
+
+def encode_page_image(img: Image.Image) -> bytes:
+    """Encode a page with the configured profile, staying within PAGE_IMAGE_MAX_BYTES.
+
+    JPEG first lowers quality (down to PAGE_IMAGE_MIN_QUALITY); after that, or for
+    the lossless formats, the image is downscaled until it fits.
+    """
+    pil_format, _, _ = get_page_image_format()
+    if pil_format != 'PNG' and img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+
+    quality = PAGE_IMAGE_QUALITY
+    while True:
+        buf = io.BytesIO()
+        if pil_format == 'PNG':
+            img.save(buf, format='PNG', optimize=PAGE_IMAGE_PNG_OPTIMIZE)
+        elif pil_format == 'WEBP':
+            # Lossless; method 6 is the slowest, smallest encoder setting
+            img.save(buf, format='WEBP', lossless=True, quality=100, method=6)
+        else:
+            img.save(buf, format=pil_format, quality=quality, optimize=True)
+        data = buf.getvalue()
+
+        if len(data) <= PAGE_IMAGE_MAX_BYTES or min(img.size) < 256:
+            return data
+        if pil_format == 'JPEG' and quality > PAGE_IMAGE_MIN_QUALITY:
+            quality = max(PAGE_IMAGE_MIN_QUALITY, quality - 10)
+            continue
+        ratio = max(0.5, (PAGE_IMAGE_MAX_BYTES * 0.9 / len(data)) ** 0.5)
+        img = img.resize((int(img.size[0] * ratio), int(img.size[1] * ratio)), Image.LANCZOS)
+
+
 def process_pdf(file_uri: str, bucket: str, base_path: str) -> list[dict]:
     """Count PDF pages and create segments with predictable image_uri paths (no rendering)."""
-    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp:
-        tmp_path = tmp.name
-
-    try:
-        download_file_from_s3(file_uri, tmp_path)
-        doc = pdfium.PdfDocument(tmp_path)
-        page_count = len(doc)
-        doc.close()
-    finally:
-        if os.path.exists(tmp_path):
-            os.unlink(tmp_path)
+    page_count = get_pdf_page_count(file_uri)
 
     print(f'PDF has {page_count} pages (rendering deferred to Map)')
 
     segments = []
     for page_num in range(page_count):
-        image_key = f'{base_path}/preprocessed/page_{page_num:04d}.png'
+        image_key = get_page_image_key(base_path, page_num)
         segments.append({
             'segment_index': page_num,
             'segment_type': 'PAGE',
@@ -158,49 +227,126 @@ def process_pdf(file_uri: str, bucket: str, base_path: str) -> list[dict]:
     return segments
 
 
-def handle_render_pages(event):
-    """Render a batch of PDF pages and upload to S3. Called by Step Functions Map."""
-    file_uri = event['file_uri']
-    start_page = event['start_page']
-    end_page = event['end_page']
+def render_page_image(doc, page_num: int) -> bytes:
+    """Render a single PDF page and encode it with the page image profile."""
+    page = doc[page_num]
+    bitmap = page.render(scale=get_render_scale(*page.get_size()))
+    try:
+        return encode_page_image(bitmap.to_pil())
+    finally:
+        bitmap.close()
+        page.close()
 
-    bucket, base_path = get_document_base_path(file_uri)
-    scale = PDF_DPI / 72
 
-    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp:
-        tmp_path = tmp.name
+def render_worker(file_uri: str, page_numbers: list[int], conn):
+    """Worker process: render pages and stream ('page', page_num, image_bytes) to the parent.
 
+    The PDF is read with ranged GETs, so each worker only fetches the objects
+    its pages need. Ends with ('done', fetch_stats) or ('error', message).
+    Sends block once the pipe is full, which throttles rendering when uploads
+    fall behind.
+    """
     try:
-        download_file_from_s3(file_uri, tmp_path)
-        doc = pdfium.PdfDocument(tmp_path)
-        rendered = 0
+        # botocore clients must not be shared across fork
+        client = boto3.client('s3', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
+        stream = S3RangeFile.from_uri(file_uri, client=client)
+        doc = pdfium.PdfDocument(stream)
+        for page_num in page_numbers:
+            conn.send(('page', page_num, render_page_image(doc, page_num)))
+        doc.close()
+        conn.send(('done', stream.stats()))
+    except Exception as e:
+        conn.send(('error', f'{type(e).__name__}: {e}'))
+    finally:
+        conn.close()
 
-        for page_num in range(start_page, end_page):
-            page = doc[page_num]
-            bitmap = page.render(scale=scale)
-            img = bitmap.to_pil()
 
-            buf = io.BytesIO()
-            img.save(buf, format='PNG')
-            png_bytes = buf.getvalue()
+def render_pages_pipelined(file_uri: str, bucket: str, base_path: str, start_page: int, end_page: int) -> dict:
+    """Render pages in worker processes while a thread pool uploads finished pages.
+
+    Lambda has no /dev/shm, so workers use fork + Pipe instead of
+    multiprocessing.Pool. Pages are strided across workers for balance.
+    """
+    pages = list(range(start_page, end_page))
+    workers = max(1, min(RENDER_WORKERS or os.cpu_count() or 1, len(pages)))
+    ctx = multiprocessing.get_context('fork')
+
+    # Fork before any upload threads exist
+    processes, readers = [], []
+    for i in range(workers):
+        reader, writer = ctx.Pipe(duplex=False)
+        process = ctx.Process(target=render_worker, args=(file_uri, pages[i::workers], writer))
+        process.start()
+        writer.close()
+        processes.append(process)
+        readers.append(reader)
+
+    slots = threading.BoundedSemaphore(RENDER_UPLOAD_QUEUE_SIZE)
+    _, _, content_type = get_page_image_format()
+
+    def _upload(page_num: int, image_bytes: bytes):
+        try:
+            upload_image_to_s3(bucket, get_page_image_key(base_path, page_num), image_bytes, content_type)
+        finally:
+            slots.release()
+
+    started = time.monotonic()
+    rendered = 0
+    errors = []
+    futures = []
+    try:
+        with ThreadPoolExecutor(max_workers=RENDER_UPLOAD_THREADS) as executor:
+            pending = list(readers)
+            while pending:
+                for reader in wait(pending):
+                    try:
+                        message = reader.recv()
+                    except EOFError:
+                        message = ('error', 'render worker exited unexpectedly')
+
+                    if message[0] == 'page':
+                        slots.acquire()
+                        futures.append(executor.submit(_upload, message[1], message[2]))
+                        rendered += 1
+                        if rendered % 100 == 0:
+                            print(f'Rendered {rendered}/{len(pages)} pages')
+                        continue
+
+                    if message[0] == 'error':
+                        errors.append(message[1])
+                    else:
+                        print(f'Render worker done: {message[1]}')
+                    pending.remove(reader)
+
+            for future in futures:
+                future.result()
+    finally:
+        for process in processes:
+            process.join()
+
+    if errors:
+        raise RuntimeError(f'Page rendering failed: {errors[0]}')
 
-            image_key = f'{base_path}/preprocessed/page_{page_num:04d}.png'
-            upload_image_to_s3(bucket, image_key, png_bytes)
+    elapsed = time.monotonic() - started
+    pages_per_sec = rendered / elapsed if elapsed > 0 else 0.0
+    print(
+        f'Rendered and uploaded {rendered} pages in {elapsed:.1f}s '
+        f'({pages_per_sec:.1f} pages/sec, {workers} workers, {RENDER_UPLOAD_THREADS} upload threads)'
+    )
+    return {'rendered': rendered, 'workers': workers, 'pages_per_sec': round(pages_per_sec, 2)}
 
-            bitmap.close()
-            page.close()
-            rendered += 1
 
-            if rendered % 100 == 0:
-                print(f'Rendered {rendered}/{end_page - start_page} pages (page {page_num})')
+def handle_render_pages(event):
+    """Render a batch of PDF pages and upload to S3. Called by Step Functions Map."""
+    file_uri = event['file_uri']
+    start_page = event['start_page']
+    end_page = event['end_page']
 
-        doc.close()
-    finally:
-        if os.path.exists(tmp_path):
-            os.unlink(tmp_path)
+    bucket, base_path = get_document_base_path(file_uri)
+    stats = render_pages_pipelined(file_uri, bucket, base_path, start_page, end_page)
 
-    print(f'Rendered pages {start_page}-{end_page - 1} ({rendered} pages)')
-    return {'start_page': start_page, 'end_page': end_page, 'rendered': rendered}
+    print(f'Rendered pages {start_page}-{end_page - 1} ({stats["rendered"]} pages)')
+    return {'start_page': start_page, 'end_page': end_page, **stats}
 
 
 def process_image(file_uri: str, bucket: str, base_path: str) -> list[dict]:
@@ -144,6 +144,7 @@ export class AgentStack extends Stack {
       'video_analysis_prompt',
       'text_system_prompt',
       'text_user_query',
+      'text_batch_user_query',
       'script_extractor_prompt',
     ];
 
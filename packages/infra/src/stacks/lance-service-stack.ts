@@ -1,5 +1,7 @@
 import { Duration, Stack, StackProps } from 'aws-cdk-lib';
 import * as dynamodb from 'aws-cdk-lib/aws-dynamodb';
+import * as events from 'aws-cdk-lib/aws-events';
+import * as eventsTargets from 'aws-cdk-lib/aws-events-targets';
 import * as iam from 'aws-cdk-lib/aws-iam';
 import * as lambda from 'aws-cdk-lib/aws-lambda';
 import { StringParameter } from 'aws-cdk-lib/aws-ssm';
@@ -46,7 +48,8 @@ export class LanceServiceStack extends Stack {
         manifestPath: '../lambda/lancedb-service',
         architecture: lambda.Architecture.ARM_64,
         memorySize: 1024,
-        timeout: Duration.minutes(5),
+        // Scheduled optimize runs compaction over all tables
+        timeout: Duration.minutes(15),
         environment: {
           TOKA_FUNCTION_NAME: tokaFunction.functionName,
           LANCEDB_EXPRESS_BUCKET_NAME: lancedbExpressBucketName,
@@ -105,6 +108,21 @@ export class LanceServiceStack extends Stack {
       }),
     );
 
+    // Periodic compaction, version pruning and index optimization
+    new events.Rule(this, 'LanceDbOptimizeSchedule', {
+      ruleName: 'idp-v2-lancedb-optimize',
+      description: 'Compact LanceDB tables and refresh their indexes',
+      schedule: events.Schedule.rate(Duration.hours(6)),
+      targets: [
+        new eventsTargets.LambdaFunction(lanceDbServiceFunction, {
+          event: events.RuleTargetInput.fromObject({
+            action: 'optimize',
+            params: {},
+          }),
+        }),
+      ],
+    });
+
     new StringParameter(this, 'LanceDbServiceFunctionArnParam', {
       parameterName: SSM_KEYS.LANCE_SERVICE_FUNCTION_ARN,
       stringValue: lanceDbServiceFunction.functionArn,
@@ -222,8 +222,10 @@ export class OcrStack extends Stack {
       stringValue: ocrLambdaProcessor.functionName,
     });
 
-    // Permissions: DDB read/write, S3 write for results, invoke Rust OCR Lambda
+    // Permissions: DDB read/write, S3 write for results, read for the OCR cache
+    // manifest, invoke Rust OCR Lambda
     backendTable.grantReadWriteData(ocrLambdaProcessor);
+    documentBucket.grantRead(ocrLambdaProcessor);
     documentBucket.grantPut(ocrLambdaProcessor);
     paddleOcrFunction.grantInvoke(ocrLambdaProcessor);
 
@@ -719,7 +719,7 @@ export class WorkflowStack extends Stack {
         ...commonLambdaProps,
         functionName: 'idp-v2-page-description-generator',
         handler: 'index.handler',
-        timeout: Duration.minutes(5),
+        timeout: Duration.minutes(15),
         memorySize: 1024,
         code: lambda.Code.fromAsset(
           path.join(
@@ -740,7 +740,7 @@ export class WorkflowStack extends Stack {
       ...commonLambdaProps,
       functionName: 'idp-v2-entity-extractor',
       handler: 'index.handler',
-      timeout: Duration.minutes(5),
+      timeout: Duration.minutes(15),
       memorySize: 1024,
       code: lambda.Code.fromAsset(
         path.join(__dirname, '../functions/step-functions/entity-extractor'),
@@ -912,7 +912,9 @@ export class WorkflowStack extends Stack {
     // SQS trigger for LanceDB Writer
     lancedbWriter.addEventSourceMapping('LanceDBWriteQueueTrigger', {
       eventSourceArn: lancedbWriteQueue.queueArn,
-      batchSize: 1,
+      batchSize: 50,
+      maxBatchingWindow: Duration.seconds(5),
+      reportBatchItemFailures: true,
     });
 
     // ========================================
@@ -993,6 +995,107 @@ export class WorkflowStack extends Stack {
         'Extract raw text from document using format-specific parsers (PDF text extraction, DOCX/PPTX conversion). Runs independently from BDA/OCR',
     });
 
+    // Text extraction shard task (called by Map for large PDFs)
+    const extractTextShardTask = new tasks.LambdaInvoke(
+      this,
+      'ExtractTextShard',
+      {
+        lambdaFunction: formatParser,
+        outputPath: '$.Payload',
+        comment:
+          'Extract text for one PDF page range in worker processes and save it as a format-parser shard',
+      },
+    );
+
+    // Map state for parallel text extraction
+    const extractTextShardsMap = new sfn.DistributedMap(
+      this,
+      'ExtractTextShards',
+      {
+        comment:
+          'Distributed Map (max 10 concurrency): extract PDF text in page-range shards',
+        maxConcurrency: 10,
+        itemsPath: '$.text_shards',
+        resultPath: sfn.JsonPath.DISCARD,
+        itemSelector: {
+          mode: 'extract_pages',
+          'file_uri.$': '$.file_uri',
+          'start_page.$': '$$.Map.Item.Value.start_page',
+          'end_page.$': '$$.Map.Item.Value.end_page',
+        },
+        mapExecutionType: sfn.StateMachineType.STANDARD,
+      },
+    );
+    extractTextShardTask.addRetry({
+      errors: ['States.TaskFailed'],
+      interval: Duration.seconds(5),
+      maxAttempts: 1,
+      backoffRate: 2,
+      jitterStrategy: sfn.JitterType.FULL,
+    });
+    extractTextShardsMap.itemProcessor(extractTextShardTask);
+
+    // A shard that still fails is recorded as a format parser step error, like an
+    // unsharded failure, so the rest of preprocessing carries on without its text
+    const recordTextShardFailureTask = new tasks.LambdaInvoke(
+      this,
+      'RecordTextShardFailure',
+      {
+        lambdaFunction: formatParser,
+        payload: sfn.TaskInput.fromObject({
+          mode: 'shards_failed',
+          'workflow_id.$': '$.workflow_id',
+          'document_id.$': '$.document_id',
+          'file_uri.$': '$.file_uri',
+          'file_type.$': '$.file_type',
+          'error_info.$': '$.error_info',
+        }),
+        outputPath: '$.Payload',
+        comment:
+          'Record the format parser step as failed after a text extraction shard failed',
+      },
+    );
+    extractTextShardsMap.addCatch(recordTextShardFailureTask, {
+      resultPath: '$.error_info',
+    });
+
+    const mergeTextShardsTask = new tasks.LambdaInvoke(
+      this,
+      'MergeTextShards',
+      {
+        lambdaFunction: formatParser,
+        payload: sfn.TaskInput.fromObject({
+          mode: 'merge_pages',
+          'workflow_id.$': '$.workflow_id',
+          'document_id.$': '$.document_id',
+          'file_uri.$': '$.file_uri',
+          'file_type.$': '$.file_type',
+          'text_shards.$': '$.text_shards',
+        }),
+        outputPath: '$.Payload',
+        comment:
+          'Stream page-range shards into the indexed JSONL page results (format-parser/result.jsonl), delete the shards and record the format parser step as complete',
+      },
+    );
+
+    // Choice: large PDFs are extracted in page-range shards
+    const textShardingChoice = new sfn.Choice(this, 'NeedTextSharding', {
+      comment:
+        'Check format_parser.status: if sharded, extract page ranges via Map and merge; otherwise text is already extracted',
+    })
+      .when(
+        sfn.Condition.stringEquals('$.format_parser.status', 'sharded'),
+        extractTextShardsMap.next(mergeTextShardsTask),
+      )
+      .otherwise(
+        new sfn.Pass(this, 'SkipTextSharding', {
+          comment: 'Text extracted in a single invocation, skip sharding',
+        }),
+      );
+
+    // Chain: ParseFormat → Choice → (Map → Merge, or Skip)
+    const formatParserChain = formatParserTask.next(textShardingChoice);
+
     const checkAnalysisThrottleTask = new tasks.LambdaInvoke(
       this,
       'CheckAnalysisThrottle',
@@ -1045,7 +1148,7 @@ export class WorkflowStack extends Stack {
       lambdaFunction: ocrOrchestrator,
       outputPath: '$.Payload',
       comment:
-        'Determine OCR backend (Lambda or SageMaker), split PDF into chunks of N pages, and prepare chunk manifest for parallel processing',
+        'Determine OCR backend (Lambda or SageMaker), resolve pages already in the OCR cache, split the remaining PDF pages into chunks, and prepare chunk manifest for parallel processing',
     });
 
     const ocrCheckTask = new tasks.LambdaInvoke(this, 'CheckOcr', {
@@ -1088,7 +1191,7 @@ export class WorkflowStack extends Stack {
       lambdaFunction: segmentBuilder,
       outputPath: '$.Payload',
       comment:
-        'Build analysis-ready segments: count existing segments from S3, prepare segment_ids array for distributed Map processing',
+        'Build analysis-ready segments: count existing segments from S3, prepare segment_ids array for distributed Map processing (adjacent text-only segments grouped into batch items)',
     });
 
     const reanalysisPrepTask = new tasks.LambdaInvoke(
@@ -1286,7 +1389,7 @@ export class WorkflowStack extends Stack {
       'ProcessSegmentsInParallel',
       {
         comment:
-          'Distributed Map over segment_ids array: run AnalyzeSegment + FinalizeAnalysis per segment with up to 30 concurrent child executions',
+          'Distributed Map over segment_ids array: run AnalyzeSegment + FinalizeAnalysis per item (a segment or a batch of text-only segments) with up to 30 concurrent child executions',
         maxConcurrency: 30,
         itemsPath: '$.segment_ids',
         resultPath: sfn.JsonPath.DISCARD,
@@ -1362,6 +1465,25 @@ export class WorkflowStack extends Stack {
       comment:
         'Run PaddleOCR on a single PDF chunk via Lambda processor and save results to S3',
     });
+    // A failed chunk is retried once as concurrent smaller page ranges
+    const ocrChunkResplitTask = new tasks.LambdaInvoke(
+      this,
+      'ResplitOcrChunk',
+      {
+        lambdaFunction: ocrLambdaProcessor,
+        outputPath: '$.Payload',
+        comment:
+          'Retry a failed OCR chunk split into concurrent smaller page ranges; records the chunk as failed if this also fails',
+      },
+    );
+    ocrChunkInvokeTask.addCatch(
+      new sfn.Pass(this, 'MarkOcrChunkResplit', {
+        comment: 'Flag the chunk payload for re-split processing',
+        result: sfn.Result.fromBoolean(true),
+        resultPath: '$.resplit',
+      }).next(ocrChunkResplitTask),
+      { resultPath: '$.error' },
+    );
     ocrChunkMap.itemProcessor(ocrChunkInvokeTask);
 
     // SageMaker polling loop (async inference)
@@ -1386,7 +1508,7 @@ export class WorkflowStack extends Stack {
     // Route based on ocr_backend after orchestrator
     const ocrBackendChoice = new sfn.Choice(this, 'OcrBackendChoice', {
       comment:
-        'Route OCR processing: SKIPPED short-circuits to done; "lambda" runs parallel chunk Map then merge; "sagemaker" enters async polling loop',
+        'Route OCR processing: SKIPPED and COMPLETED (all pages cached) short-circuit to done; "lambda" runs parallel chunk Map then merge; "sagemaker" enters async polling loop',
     })
       .when(
         sfn.Condition.stringEquals('$.ocr_status', 'SKIPPED'),
@@ -1395,6 +1517,13 @@ export class WorkflowStack extends Stack {
             'OCR skipped for unsupported file type (e.g. pptx/docx handled by format parser)',
         }),
       )
+      .when(
+        sfn.Condition.stringEquals('$.ocr_status', 'COMPLETED'),
+        new sfn.Pass(this, 'OcrCachedDone', {
+          comment:
+            'Every page was found in the OCR cache; the orchestrator already saved the result',
+        }),
+      )
       .when(
         sfn.Condition.stringEquals('$.ocr_backend', 'lambda'),
         ocrChunkMap.next(ocrChunkMergerTask),
@@ -1583,7 +1712,7 @@ export class WorkflowStack extends Stack {
       },
     );
     parallelPreprocessing.branch(segmentPrepChain);
-    parallelPreprocessing.branch(formatParserTask);
+    parallelPreprocessing.branch(formatParserChain);
     parallelPreprocessing.branch(bdaBranch);
     parallelPreprocessing.branch(ocrBranch);
     parallelPreprocessing.branch(transcribeBranch);
@@ -0,0 +1,201 @@
+//! Recall / latency benchmark for the ANN vector index on a synthetic local table.
+//!
+//! ```sh
+//! BENCH_ROWS=200000 BENCH_NPROBES=10,20,50 BENCH_REFINE=0,5 \
+//!   VECTOR_INDEX_TYPE=ivf_pq VECTOR_INDEX_NUM_SUB_VECTORS=64 \
+//!   cargo run --release --example vector_index_bench
+//! ```
+//!
+//! Rows are clustered random unit vectors. Ground truth comes from a flat scan
+//! (`bypass_vector_index`); recall@k is measured for every nprobes/refine pair.
+
+use std::env;
+use std::sync::Arc;
+use std::time::{Duration, Instant};
+
+use arrow_array::cast::AsArray;
+use arrow_array::types::{Float32Type, Int64Type};
+use arrow_array::{FixedSizeListArray, Int64Array, RecordBatch};
+use arrow_schema::{DataType, Field, Schema};
+use futures::TryStreamExt;
+use lancedb::query::{ExecutableQuery, QueryBase, Select};
+use lancedb_service::db::vector_index::{VECTOR_COLUMN, VectorIndexConfig};
+
+const WRITE_BATCH_ROWS: usize = 10_000;
+
+fn env_or<T: std::str::FromStr>(key: &str, default: T) -> T {
+    env::var(key).ok().and_then(|v| v.parse().ok()).unwrap_or(default)
+}
+
+fn env_list<T: std::str::FromStr>(key: &str, default: &str) -> Vec<T> {
+    env::var(key)
+        .unwrap_or_else(|_| default.to_string())
+        .split(',')
+        .filter_map(|v| v.trim().parse().ok())
+        .collect()
+}
+
+/// xorshift64* - deterministic and dependency free
+struct Rng(u64);
+
+impl Rng {
+    fn next_f32(&mut self) -> f32 {
+        self.0 ^= self.0 >> 12;
+        self.0 ^= self.0 << 25;
+        self.0 ^= self.0 >> 27;
+        let v = self.0.wrapping_mul(0x2545_F491_4F6C_DD1D);
+        (v >> 40) as f32 / (1u64 << 24) as f32 * 2.0 - 1.0
+    }
+
+    fn unit_vector(&mut self, center: Option<&[f32]>, dim: usize, noise: f32) -> Vec<f32> {
+        let mut v: Vec<f32> = (0..dim)
+            .map(|i| center.map_or(0.0, |c| c[i]) + self.next_f32() * noise)
+            .collect();
+        let norm = v.iter().map(|x| x * x).sum::<f32>().sqrt().max(f32::EPSILON);
+        v.iter_mut().for_each(|x| *x /= norm);
+        v
+    }
+}
+
+fn percentile(sorted: &[Duration], p: f64) -> Duration {
+    let idx = ((sorted.len() as f64 - 1.0) * p).round() as usize;
+    sorted[idx]
+}
+
+async fn search_ids(
+    table: &lancedb::Table,
+    query: &[f32],
+    k: usize,
+    tune: Option<(&VectorIndexConfig, usize, u32)>,
+) -> Vec<i64> {
+    let mut q = table
+        .query()
+        .select(Select::columns(&["id"]))
+        .limit(k)
+        .nearest_to(query)
+        .unwrap();
+    q = match tune {
+        Some((config, nprobes, refine)) => config.tune_query(q, Some(nprobes), Some(refine)),
+        None => q.bypass_vector_index(),
+    };
+    let batches: Vec<RecordBatch> = q.execute().await.unwrap().try_collect().await.unwrap();
+    batches
+        .iter()
+        .flat_map(|b| {
+            b.column_by_name("id")
+                .unwrap()
+                .as_primitive::<Int64Type>()
+                .values()
+                .to_vec()
+        })
+        .collect()
+}
+
+#[tokio::main]
+async fn main() -> Result<(), Box<dyn std::error::Error + Send + Sync>> {
+    let rows: usize = env_or("BENCH_ROWS", 100_000);
+    let dim: usize = env_or("BENCH_DIM", 1024);
+    let clusters: usize = env_or("BENCH_CLUSTERS", 256);
+    let num_queries: usize = env_or("BENCH_QUERIES", 50);
+    let k: usize = env_or("BENCH_K", 10);
+    let nprobes_list: Vec<usize> = env_list("BENCH_NPROBES", "5,10,20,50");
+    let refine_list: Vec<u32> = env_list("BENCH_REFINE", "0,5");
+    let config = VectorIndexConfig::from_env();
+
+    let path = env::temp_dir().join("lancedb-vector-index-bench");
+    let _ = std::fs::remove_dir_all(&path);
+    let conn = lancedb::connect(path.to_str().unwrap()).execute().await?;
+
+    let schema = Arc::new(Schema::new(vec![
+        Field::new("id", DataType::Int64, false),
+        Field::new(
+            VECTOR_COLUMN,
+            DataType::FixedSizeList(Arc::new(Field::new("item", DataType::Float32, true)), dim as i32),
+            true,
+        ),
+    ]));
+    let table = conn.create_empty_table("bench", schema.clone()).execute().await?;
+
+    let mut rng = Rng(0x9E37_79B9_7F4A_7C15);
+    let centers: Vec<Vec<f32>> = (0..clusters).map(|_| rng.unit_vector(None, dim, 1.0)).collect();
+
+    println!("Writing {rows} x {dim} vectors ({clusters} clusters)...");
+    let started = Instant::now();
+    for start in (0..rows).step_by(WRITE_BATCH_ROWS) {
+        let end = (start + WRITE_BATCH_ROWS).min(rows);
+        let vectors = (start..end).map(|i| {
+            let v = rng.unit_vector(Some(centers[i % clusters].as_slice()), dim, 0.3);
+            Some(v.into_iter().map(Some))
+        });
+        let batch = RecordBatch::try_new(
+            schema.clone(),
+            vec![
+                Arc::new(Int64Array::from_iter_values(start as i64..end as i64)),
+                Arc::new(FixedSizeListArray::from_iter_primitive::<Float32Type, _, _>(vectors, dim as i32)),
+            ],
+        )?;
+        table.add(vec![batch]).execute().await?;
+    }
+    println!("  done in {:.1?}", started.elapsed());
+
+    let queries: Vec<Vec<f32>> = (0..num_queries)
+        .map(|i| rng.unit_vector(Some(centers[(i * 7) % clusters].as_slice()), dim, 0.3))
+        .collect();
+
+    println!("Computing ground truth (flat scan)...");
+    let mut truth = Vec::with_capacity(num_queries);
+    let mut flat_latencies = Vec::with_capacity(num_queries);
+    for q in &queries {
+        let started = Instant::now();
+        truth.push(search_ids(&table, q, k, None).await);
+        flat_latencies.push(started.elapsed());
+    }
+    flat_latencies.sort();
+
+    println!(
+        "Building {:?} index ({} partitions, {} sub-vectors)...",
+        config.kind,
+        config.partitions_for(rows),
+        config.num_sub_vectors
+    );
+    let started = Instant::now();
+    table
+        .create_index(&[VECTOR_COLUMN], config.index(rows))
+        .execute()
+        .await?;
+    println!("  done in {:.1?}", started.elapsed());
+
+    println!();
+    println!("{:>8} {:>7} {:>10} {:>10} {:>10}", "nprobes", "refine", "recall@k", "p50", "p95");
+    println!(
+        "{:>8} {:>7} {:>10.3} {:>10.1?} {:>10.1?}",
+        "flat",
+        "-",
+        1.0,
+        percentile(&flat_latencies, 0.5),
+        percentile(&flat_latencies, 0.95)
+    );
+    for &nprobes in &nprobes_list {
+        for &refine in &refine_list {
+            let mut hits = 0usize;
+            let mut latencies = Vec::with_capacity(num_queries);
+            for (q, expected) in queries.iter().zip(&truth) {
+                let started = Instant::now();
+                let ids = search_ids(&table, q, k, Some((&config, nprobes, refine))).await;
+                latencies.push(started.elapsed());
+                hits += ids.iter().filter(|id| expected.contains(id)).count();
+            }
+            latencies.sort();
+            println!(
+                "{:>8} {:>7} {:>10.3} {:>10.1?} {:>10.1?}",
+                nprobes,
+                refine,
+                hits as f64 / (num_queries * k) as f64,
+                percentile(&latencies, 0.5),
+                percentile(&latencies, 0.95)
+            );
+        }
+    }
+
+    Ok(())
+}
@@ -23,6 +23,8 @@ pub struct AddRecordParams {
     pub qa_index: Option<u32>,
     pub question: Option<String>,
     pub content_combined: String,
+    /// Precomputed embedding (e.g. from the caller's embedding cache); skips Bedrock when present
+    pub vector: Option<Vec<f32>>,
     pub language: Option<String>,
     pub file_uri: String,
     pub file_type: String,
@@ -37,28 +39,47 @@ pub struct AddRecordOutput {
     pub qa_id: String,
 }
 
-pub async fn execute(
-    conn: &Connection,
+/// A record with keywords and embedding resolved, ready to be written to LanceDB.
+pub struct PreparedRecord {
+    pub workflow_id: String,
+    pub document_id: String,
+    pub segment_id: String,
+    pub qa_id: String,
+    pub segment_index: u32,
+    pub qa_index: u32,
+    pub question: String,
+    pub content: String,
+    pub vector: Vec<f32>,
+    pub keywords: String,
+    pub file_uri: String,
+    pub file_type: String,
+    pub image_uri: Option<String>,
+    pub created_at_micros: i64,
+}
+
+pub fn qa_id_of(params: &AddRecordParams) -> String {
+    format!(
+        "{}_{:04}_{:02}",
+        params.workflow_id,
+        params.segment_index,
+        params.qa_index.unwrap_or(0)
+    )
+}
+
+/// Extract keywords (Toka) and resolve the embedding (precomputed or Bedrock) for one record.
+pub async fn prepare_record(
     lambda_client: &aws_sdk_lambda::Client,
     bedrock_client: &aws_sdk_bedrockruntime::Client,
     params: AddRecordParams,
-) -> Result<AddRecordOutput, Box<dyn std::error::Error + Send + Sync>> {
-    let project_id = &params.project_id;
+) -> Result<PreparedRecord, Box<dyn std::error::Error + Send + Sync>> {
     let workflow_id = &params.workflow_id;
     let segment_index = params.segment_index;
     let qa_index = params.qa_index.unwrap_or(0);
-    let question = params.question.as_deref().unwrap_or("");
     let content = &params.content_combined;
     let lang = params.language.as_deref().unwrap_or("ko");
 
     let segment_id = format!("{workflow_id}_{segment_index:04}");
-    let qa_id = format!("{workflow_id}_{segment_index:04}_{qa_index:02}");
-
-    info!("[add_record] project_id: {project_id}, qa_id: {qa_id}");
-
-    // Get or create table
-    info!("[add_record] Getting or creating table...");
-    let table = db::table::get_or_create_table(conn, project_id, document_record_schema()).await?;
+    let qa_id = qa_id_of(&params);
 
     // Extract keywords via Toka Lambda
     info!(
@@ -75,9 +96,19 @@ pub async fn execute(
         &keywords.chars().take(100).collect::<String>()
     );
 
-    // Generate embedding via Bedrock
-    info!("[add_record] Generating embedding...");
-    let vector = client::bedrock::generate_embedding(bedrock_client, content).await?;
+    // Use precomputed embedding if provided, otherwise generate via Bedrock
+    let vector = match params.vector {
+        Some(v) if v.len() == client::bedrock::EMBEDDING_DIMENSION => {
+            info!("[add_record] Using precomputed embedding");
+            v
+        }
+        _ => {
+            info!("[add_record] Generating embedding...");
+            // Same normalization as the writer's precomputed embeddings
+            let embedding_input = client::bedrock::strip_markup(content);
+            client::bedrock::generate_embedding(bedrock_client, &embedding_input).await?
+        }
+    };
 
     // Parse created_at
     let created_at = if let Some(ref s) = params.created_at {
@@ -85,41 +116,93 @@ pub async fn execute(
     } else {
         Utc::now()
     };
-    let created_at_micros = created_at.timestamp_micros();
 
-    // Build Arrow RecordBatch
+    Ok(PreparedRecord {
+        workflow_id: params.workflow_id,
+        document_id: params.document_id,
+        segment_id,
+        qa_id,
+        segment_index,
+        qa_index,
+        question: params.question.unwrap_or_default(),
+        content: params.content_combined,
+        vector,
+        keywords,
+        file_uri: params.file_uri,
+        file_type: params.file_type,
+        image_uri: params.image_uri,
+        created_at_micros: created_at.timestamp_micros(),
+    })
+}
+
+/// Build one Arrow RecordBatch (document_record_schema) from prepared records.
+pub fn build_record_batch(
+    records: &[PreparedRecord],
+) -> Result<RecordBatch, arrow_schema::ArrowError> {
     let schema = document_record_schema();
-    let values = Arc::new(Float32Array::from(vector)) as arrow_array::ArrayRef;
+    let values = Arc::new(Float32Array::from(
+        records
+            .iter()
+            .flat_map(|r| r.vector.iter().copied())
+            .collect::<Vec<f32>>(),
+    )) as arrow_array::ArrayRef;
     let field = Arc::new(Field::new("item", DataType::Float32, true));
-    let vector_array = FixedSizeListArray::new(field, 1024, values, None);
+    let vector_array = FixedSizeListArray::try_new(
+        field,
+        client::bedrock::EMBEDDING_DIMENSION as i32,
+        values,
+        None,
+    )?;
 
-    let batch = RecordBatch::try_new(
+    RecordBatch::try_new(
         schema,
         vec![
-            Arc::new(StringArray::from(vec![workflow_id.as_str()])),
-            Arc::new(StringArray::from(vec![params.document_id.as_str()])),
-            Arc::new(StringArray::from(vec![segment_id.as_str()])),
-            Arc::new(StringArray::from(vec![qa_id.as_str()])),
-            Arc::new(Int64Array::from(vec![segment_index as i64])),
-            Arc::new(Int64Array::from(vec![qa_index as i64])),
-            Arc::new(StringArray::from(vec![question])),
-            Arc::new(StringArray::from(vec![content.as_str()])),
+            Arc::new(StringArray::from_iter_values(records.iter().map(|r| r.workflow_id.as_str()))),
+            Arc::new(StringArray::from_iter_values(records.iter().map(|r| r.document_id.as_str()))),
+            Arc::new(StringArray::from_iter_values(records.iter().map(|r| r.segment_id.as_str()))),
+            Arc::new(StringArray::from_iter_values(records.iter().map(|r| r.qa_id.as_str()))),
+            Arc::new(Int64Array::from_iter_values(records.iter().map(|r| r.segment_index as i64))),
+            Arc::new(Int64Array::from_iter_values(records.iter().map(|r| r.qa_index as i64))),
+            Arc::new(StringArray::from_iter_values(records.iter().map(|r| r.question.as_str()))),
+            Arc::new(StringArray::from_iter_values(records.iter().map(|r| r.content.as_str()))),
             Arc::new(vector_array),
-            Arc::new(StringArray::from(vec![keywords.as_str()])),
-            Arc::new(StringArray::from(vec![params.file_uri.as_str()])),
-            Arc::new(StringArray::from(vec![params.file_type.as_str()])),
-            Arc::new(StringArray::from(vec![params.image_uri.as_deref()])),
-            Arc::new(TimestampMicrosecondArray::from(vec![created_at_micros])),
+            Arc::new(StringArray::from_iter_values(records.iter().map(|r| r.keywords.as_str()))),
+            Arc::new(StringArray::from_iter_values(records.iter().map(|r| r.file_uri.as_str()))),
+            Arc::new(StringArray::from_iter_values(records.iter().map(|r| r.file_type.as_str()))),
+            Arc::new(StringArray::from(
+                records.iter().map(|r| r.image_uri.as_deref()).collect::<Vec<_>>(),
+            )),
+            Arc::new(TimestampMicrosecondArray::from_iter_values(
+                records.iter().map(|r| r.created_at_micros),
+            )),
         ],
-    )?;
+    )
+}
+
+pub async fn execute(
+    conn: &Connection,
+    lambda_client: &aws_sdk_lambda::Client,
+    bedrock_client: &aws_sdk_bedrockruntime::Client,
+    params: AddRecordParams,
+) -> Result<AddRecordOutput, Box<dyn std::error::Error + Send + Sync>> {
+    let project_id = params.project_id.clone();
+
+    info!("[add_record] project_id: {project_id}, qa_id: {}", qa_id_of(&params));
+
+    // Get or create table
+    info!("[add_record] Getting or creating table...");
+    let table = db::table::get_or_create_table(conn, &project_id, document_record_schema()).await?;
+
+    let record = prepare_record(lambda_client, bedrock_client, params).await?;
+    let batch = build_record_batch(std::slice::from_ref(&record))?;
 
     info!("[add_record] Adding record to table...");
     table.add(vec![batch]).execute().await?;
 
-    info!("[add_record] Record added successfully: qa_id={qa_id}");
+    info!("[add_record] Record added successfully: qa_id={}", record.qa_id);
     Ok(AddRecordOutput {
         success: true,
-        segment_id,
-        qa_id,
+        segment_id: record.segment_id,
+        qa_id: record.qa_id,
     })
 }
@@ -0,0 +1,102 @@
+use futures::{StreamExt, stream};
+use lancedb::Connection;
+use serde::{Deserialize, Serialize};
+use tracing::{info, warn};
+
+use crate::action::add_record::{self, AddRecordParams, PreparedRecord};
+use crate::db;
+use crate::db::model::document_record_schema;
+
+/// Records prepared (Toka keywords + embedding) concurrently per request
+const PREPARE_CONCURRENCY: usize = 8;
+
+#[derive(Deserialize)]
+pub struct AddRecordsParams {
+    pub project_id: String,
+    pub records: Vec<AddRecordParams>,
+}
+
+#[derive(Serialize)]
+pub struct FailedRecord {
+    /// Position of the record in the request
+    pub index: usize,
+    pub qa_id: String,
+    pub error: String,
+}
+
+#[derive(Serialize)]
+pub struct AddRecordsOutput {
+    pub success: bool,
+    pub added: usize,
+    pub qa_ids: Vec<String>,
+    pub failed: Vec<FailedRecord>,
+}
+
+/// Add many records to a project table with a single commit.
+///
+/// Records that fail preparation (keyword extraction, embedding, project mismatch)
+/// are reported in `failed` and skipped; the rest are written as one RecordBatch.
+pub async fn execute(
+    conn: &Connection,
+    lambda_client: &aws_sdk_lambda::Client,
+    bedrock_client: &aws_sdk_bedrockruntime::Client,
+    params: AddRecordsParams,
+) -> Result<AddRecordsOutput, Box<dyn std::error::Error + Send + Sync>> {
+    let project_id = &params.project_id;
+    let total = params.records.len();
+    info!("[add_records] project_id: {project_id}, records: {total}");
+
+    let results: Vec<(usize, String, Result<PreparedRecord, String>)> =
+        stream::iter(params.records.into_iter().enumerate())
+            .map(|(index, record)| async move {
+                let qa_id = add_record::qa_id_of(&record);
+                let result = if &record.project_id != project_id {
+                    Err(format!(
+                        "project_id mismatch: {} != {project_id}",
+                        record.project_id
+                    ))
+                } else {
+                    add_record::prepare_record(lambda_client, bedrock_client, record)
+                        .await
+                        .map_err(|e| e.to_string())
+                };
+                (index, qa_id, result)
+            })
+            .buffered(PREPARE_CONCURRENCY)
+            .collect()
+            .await;
+
+    let mut prepared = Vec::with_capacity(total);
+    let mut failed = Vec::new();
+    for (index, qa_id, result) in results {
+        match result {
+            Ok(record) => prepared.push(record),
+            Err(error) => {
+                warn!("[add_records] Failed to prepare {qa_id}: {error}");
+                failed.push(FailedRecord { index, qa_id, error });
+            }
+        }
+    }
+
+    let qa_ids: Vec<String> = prepared.iter().map(|r| r.qa_id.clone()).collect();
+    if !prepared.is_empty() {
+        let table =
+            db::table::get_or_create_table(conn, project_id, document_record_schema()).await?;
+        let batch = add_record::build_record_batch(&prepared)?;
+
+        info!("[add_records] Adding {} records in one batch...", prepared.len());
+        table.add(vec![batch]).execute().await?;
+    }
+
+    info!(
+        "[add_records] Added {} records, {} failed",
+        qa_ids.len(),
+        failed.len()
+    );
+    Ok(AddRecordsOutput {
+        success: failed.is_empty(),
+        added: qa_ids.len(),
+        qa_ids,
+        failed,
+    })
+}
@@ -1,15 +1,46 @@
+use std::collections::HashMap;
+use std::time::Instant;
+
 use arrow_array::RecordBatch;
 use futures::TryStreamExt;
 use lance_index::scalar::FullTextSearchQuery;
-use lancedb::Connection;
-use lancedb::index::Index;
 use lancedb::query::{ExecutableQuery, QueryBase, Select};
+use lancedb::{Connection, Table};
 use serde::{Deserialize, Serialize};
 use tracing::info;
 
 use crate::client;
 use crate::db;
 use crate::db::model::ScoredSegment;
+use crate::db::vector_index::VectorIndexConfig;
+
+const SELECT_COLUMNS: [&str; 10] = [
+    "workflow_id",
+    "document_id",
+    "segment_id",
+    "qa_id",
+    "segment_index",
+    "qa_index",
+    "question",
+    "content",
+    "keywords",
+    "file_uri",
+];
+
+/// Each leg fetches `limit * overfetch` candidates before fusion
+const DEFAULT_OVERFETCH: u32 = 3;
+const DEFAULT_RRF_K: f32 = 60.0;
+const DEFAULT_VECTOR_WEIGHT: f32 = 0.5;
+
+#[derive(Deserialize, Clone, Copy, Debug, Default, PartialEq)]
+#[serde(rename_all = "lowercase")]
+pub enum FusionMode {
+    /// Reciprocal rank fusion: sum of 1 / (rrf_k + rank) over both legs
+    #[default]
+    Rrf,
+    /// Min-max normalized leg scores combined with `vector_weight`
+    Weighted,
+}
 
 #[derive(Deserialize)]
 pub struct HybridSearchParams {
@@ -18,12 +49,30 @@ pub struct HybridSearchParams {
     pub document_id: Option<String>,
     pub limit: Option<u32>,
     pub language: Option<String>,
+    /// ANN tuning overrides (defaults from VectorIndexConfig)
+    pub nprobes: Option<usize>,
+    pub refine_factor: Option<u32>,
+    pub fusion: Option<FusionMode>,
+    pub overfetch: Option<u32>,
+    pub rrf_k: Option<f32>,
+    pub vector_weight: Option<f32>,
+}
+
+#[derive(Serialize, Default)]
+pub struct SearchTimings {
+    /// Toka keyword extraction and query embedding (run concurrently)
+    pub prepare_ms: u128,
+    pub vector_ms: u128,
+    pub fts_ms: u128,
+    pub fusion_ms: u128,
+    pub total_ms: u128,
 }
 
 #[derive(Serialize)]
 pub struct HybridSearchOutput {
     pub success: bool,
     pub results: Vec<ScoredSegment>,
+    pub timings: SearchTimings,
 }
 
 pub async fn execute(
@@ -32,71 +81,251 @@ pub async fn execute(
     bedrock_client: &aws_sdk_bedrockruntime::Client,
     params: HybridSearchParams,
 ) -> lancedb::error::Result<HybridSearchOutput> {
+    let started = Instant::now();
+    let mut timings = SearchTimings::default();
+
     let table_names = db::table::list_tables(conn).await?;
     if !table_names.contains(&params.project_id) {
         return Ok(HybridSearchOutput {
             success: true,
             results: vec![],
+            timings,
         });
     }
 
     let table = conn.open_table(&params.project_id).execute().await?;
 
-    info!("[hybrid_search] Creating FTS index on keywords...");
-    table
-        .create_index(&["keywords"], Index::FTS(Default::default()))
-        .replace(true)
-        .execute()
-        .await?;
+    db::table::ensure_fts_index(&table, "keywords").await?;
 
     let lang = params.language.as_deref().unwrap_or("ko");
-    let keywords = client::toka::extract_keywords(lambda_client, &params.query, lang)
-        .await
-        .map_err(|e| lancedb::error::Error::Runtime {
-            message: format!("toka error: {e}"),
-        })?;
-
-    let embedding = client::bedrock::generate_embedding(bedrock_client, &params.query)
-        .await
-        .map_err(|e| lancedb::error::Error::Runtime {
-            message: format!("bedrock error: {e}"),
-        })?;
+    let prepare_started = Instant::now();
+    let (keywords, embedding) = tokio::join!(
+        client::toka::extract_keywords(lambda_client, &params.query, lang),
+        client::bedrock::generate_embedding(bedrock_client, &params.query),
+    );
+    let keywords = keywords.map_err(|e| lancedb::error::Error::Runtime {
+        message: format!("toka error: {e}"),
+    })?;
+    let embedding = embedding.map_err(|e| lancedb::error::Error::Runtime {
+        message: format!("bedrock error: {e}"),
+    })?;
+    timings.prepare_ms = prepare_started.elapsed().as_millis();
 
     let limit = params.limit.unwrap_or(10) as usize;
-    let fts_query = FullTextSearchQuery::new(keywords);
+    let candidates = limit * params.overfetch.unwrap_or(DEFAULT_OVERFETCH).max(1) as usize;
+    let filter = params
+        .document_id
+        .as_ref()
+        .map(|doc_id| format!("document_id = '{doc_id}'"));
+    let index_config = VectorIndexConfig::from_env();
 
-    info!("[hybrid_search] Executing hybrid search, limit: {limit}");
-    let mut query = table
-        .query()
-        .full_text_search(fts_query)
-        .select(Select::columns(&[
-            "workflow_id",
-            "document_id",
-            "segment_id",
-            "qa_id",
-            "segment_index",
-            "qa_index",
-            "question",
-            "content",
-            "keywords",
-            "file_uri",
-        ]))
-        .limit(limit)
-        .nearest_to(embedding.as_slice())
-        .map_err(|e| lancedb::error::Error::Runtime {
-            message: format!("nearest_to error: {e}"),
-        })?;
-
-    if let Some(doc_id) = &params.document_id {
-        query = query.only_if(format!("document_id = '{doc_id}'"));
-    }
+    info!("[hybrid_search] Executing vector + FTS legs, limit: {limit}, candidates: {candidates}");
+    let vector_leg = async {
+        let leg_started = Instant::now();
+        let mut query = table
+            .query()
+            .select(Select::columns(&SELECT_COLUMNS))
+            .limit(candidates)
+            .nearest_to(embedding.as_slice())
+            .map_err(|e| lancedb::error::Error::Runtime {
+                message: format!("nearest_to error: {e}"),
+            })?;
+        query = index_config.tune_query(query, params.nprobes, params.refine_factor);
+        if let Some(filter) = &filter {
+            query = query.only_if(filter.clone());
+        }
+        let batches: Vec<RecordBatch> = query.execute().await?.try_collect().await?;
+        let results: Vec<ScoredSegment> = batches
+            .iter()
+            .flat_map(|b| ScoredSegment::from_batch_with_score(b, "_distance"))
+            .collect();
+        Ok::<_, lancedb::error::Error>((results, leg_started.elapsed().as_millis()))
+    };
+    let fts_leg = fts_search(&table, &keywords, candidates, filter.as_deref());
 
-    let batches: Vec<RecordBatch> = query.execute().await?.try_collect().await?;
-    let results: Vec<ScoredSegment> = batches.iter().flat_map(ScoredSegment::from_batch).collect();
-    info!("[hybrid_search] Found {} results", results.len());
+    let (vector_results, fts_results) = tokio::join!(vector_leg, fts_leg);
+    let (vector_results, vector_ms) = vector_results?;
+    let (fts_results, fts_ms) = fts_results?;
+    timings.vector_ms = vector_ms;
+    timings.fts_ms = fts_ms;
+
+    let fusion_started = Instant::now();
+    let results = fuse(
+        vector_results,
+        fts_results,
+        params.fusion.unwrap_or_default(),
+        params.rrf_k.unwrap_or(DEFAULT_RRF_K),
+        params.vector_weight.unwrap_or(DEFAULT_VECTOR_WEIGHT),
+        limit,
+    );
+    timings.fusion_ms = fusion_started.elapsed().as_millis();
+    timings.total_ms = started.elapsed().as_millis();
+
+    info!(
+        "[hybrid_search] Found {} results (prepare {}ms, vector {}ms, fts {}ms, total {}ms)",
+        results.len(),
+        timings.prepare_ms,
+        timings.vector_ms,
+        timings.fts_ms,
+        timings.total_ms
+    );
 
     Ok(HybridSearchOutput {
         success: true,
         results,
+        timings,
     })
 }
+
+async fn fts_search(
+    table: &Table,
+    keywords: &str,
+    candidates: usize,
+    filter: Option<&str>,
+) -> lancedb::error::Result<(Vec<ScoredSegment>, u128)> {
+    let leg_started = Instant::now();
+    if keywords.trim().is_empty() {
+        return Ok((vec![], 0));
+    }
+
+    let mut query = table
+        .query()
+        .full_text_search(FullTextSearchQuery::new(keywords.to_string()))
+        .select(Select::columns(&SELECT_COLUMNS))
+        .limit(candidates);
+    if let Some(filter) = filter {
+        query = query.only_if(filter);
+    }
+    let batches: Vec<RecordBatch> = query.execute().await?.try_collect().await?;
+    let results = batches
+        .iter()
+        .flat_map(|b| ScoredSegment::from_batch_with_score(b, "_score"))
+        .collect();
+    Ok((results, leg_started.elapsed().as_millis()))
+}
+
+/// Min-max normalize to [0, 1]; `higher_is_better = false` flips distances.
+fn normalize(values: &[f32], higher_is_better: bool) -> Vec<f32> {
+    let min = values.iter().copied().fold(f32::INFINITY, f32::min);
+    let max = values.iter().copied().fold(f32::NEG_INFINITY, f32::max);
+    let range = max - min;
+    values
+        .iter()
+        .map(|&v| {
+            if range <= f32::EPSILON {
+                1.0
+            } else if higher_is_better {
+                (v - min) / range
+            } else {
+                (max - v) / range
+            }
+        })
+        .collect()
+}
+
+/// Merge vector and FTS results by `qa_id`.
+///
+/// Both legs must be ordered best-first (ascending distance / descending score).
+/// The fused value becomes `score`; raw leg scores are kept in
+/// `vector_distance` and `fts_score`.
+pub fn fuse(
+    vector: Vec<ScoredSegment>,
+    fts: Vec<ScoredSegment>,
+    mode: FusionMode,
+    rrf_k: f32,
+    vector_weight: f32,
+    limit: usize,
+) -> Vec<ScoredSegment> {
+    let vector_weight = vector_weight.clamp(0.0, 1.0);
+    let vector_norm = normalize(&vector.iter().map(|r| r.score).collect::<Vec<_>>(), false);
+    let fts_norm = normalize(&fts.iter().map(|r| r.score).collect::<Vec<_>>(), true);
+
+    let mut merged: HashMap<String, (ScoredSegment, f32)> = HashMap::new();
+    let legs = [(vector, vector_norm, true), (fts, fts_norm, false)];
+    for (results, normalized, is_vector) in legs {
+        for (rank, (mut result, norm)) in results.into_iter().zip(normalized).enumerate() {
+            let contribution = match mode {
+                FusionMode::Rrf => 1.0 / (rrf_k + rank as f32 + 1.0),
+                FusionMode::Weighted if is_vector => vector_weight * norm,
+                FusionMode::Weighted => (1.0 - vector_weight) * norm,
+            };
+            let raw = result.score;
+            let entry = merged
+                .entry(result.segment.qa_id.clone())
+                .or_insert_with(|| {
+                    result.score = 0.0;
+                    (result, 0.0)
+                });
+            if is_vector {
+                entry.0.vector_distance = Some(raw);
+            } else {
+                entry.0.fts_score = Some(raw);
+            }
+            entry.1 += contribution;
+        }
+    }
+
+    let mut fused: Vec<ScoredSegment> = merged
+        .into_values()
+        .map(|(mut result, score)| {
+            result.score = score;
+            result
+        })
+        .collect();
+    fused.sort_by(|a, b| b.score.total_cmp(&a.score));
+    fused.truncate(limit);
+    fused
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use crate::db::model::Segment;
+
+    fn scored(qa_id: &str, score: f32) -> ScoredSegment {
+        ScoredSegment {
+            segment: Segment {
+                workflow_id: "wf".to_string(),
+                document_id: "doc".to_string(),
+                segment_id: "seg".to_string(),
+                qa_id: qa_id.to_string(),
+                segment_index: 0,
+                qa_index: 0,
+                question: String::new(),
+                content: String::new(),
+            },
+            keywords: String::new(),
+            file_uri: String::new(),
+            score,
+            vector_distance: None,
+            fts_score: None,
+        }
+    }
+
+    #[test]
+    fn rrf_prefers_results_found_by_both_legs() {
+        let vector = vec![scored("a", 0.1), scored("b", 0.2), scored("c", 0.3)];
+        let fts = vec![scored("c", 9.0), scored("d", 5.0)];
+
+        let fused = fuse(vector, fts, FusionMode::Rrf, 60.0, 0.5, 3);
+
+        assert_eq!(fused[0].segment.qa_id, "c");
+        assert_eq!(fused[0].vector_distance, Some(0.3));
+        assert_eq!(fused[0].fts_score, Some(9.0));
+        assert_eq!(fused.len(), 3);
+    }
+
+    #[test]
+    fn weighted_fusion_respects_vector_weight() {
+        let vector = vec![scored("a", 0.1), scored("b", 0.9)];
+        let fts = vec![scored("b", 10.0), scored("a", 1.0)];
+
+        let vector_first = fuse(vector, fts, FusionMode::Weighted, 60.0, 0.9, 2);
+        assert_eq!(vector_first[0].segment.qa_id, "a");
+
+        let vector = vec![scored("a", 0.1), scored("b", 0.9)];
+        let fts = vec![scored("b", 10.0), scored("a", 1.0)];
+        let fts_first = fuse(vector, fts, FusionMode::Weighted, 60.0, 0.1, 2);
+        assert_eq!(fts_first[0].segment.qa_id, "b");
+    }
+}
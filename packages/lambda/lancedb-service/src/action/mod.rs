@@ -1,5 +1,6 @@
 pub mod add_graph_keywords;
 pub mod add_record;
+pub mod add_records;
 pub mod count;
 pub mod delete_by_workflow;
 pub mod delete_graph_keywords_by_project_id;
@@ -11,4 +12,5 @@ pub mod get_graph_keywords;
 pub mod get_segments_by_document_id;
 pub mod hybrid_search;
 pub mod list_tables;
+pub mod optimize;
 pub mod search_graph_keywords;
@@ -0,0 +1,139 @@
+use lancedb::table::{CompactionOptions, OptimizeAction, OptimizeOptions};
+use lancedb::Connection;
+use serde::{Deserialize, Serialize};
+use tracing::{info, warn};
+
+use crate::db;
+use crate::db::model::GRAPH_KEYWORDS_TABLE;
+use crate::db::vector_index::{self, VectorIndexConfig};
+
+/// Versions older than this are pruned unless overridden per call
+const DEFAULT_PRUNE_OLDER_THAN_HOURS: i64 = 24;
+
+#[derive(Deserialize)]
+pub struct OptimizeParams {
+    /// Table to optimize; all tables when omitted (scheduled run)
+    pub project_id: Option<String>,
+    pub prune_older_than_hours: Option<i64>,
+}
+
+#[derive(Serialize, Default)]
+pub struct TableOptimizeResult {
+    pub table: String,
+    pub fragments_before: usize,
+    pub fragments_after: usize,
+    pub small_fragments_before: usize,
+    pub small_fragments_after: usize,
+    pub fragments_removed: usize,
+    pub fragments_added: usize,
+    pub versions_pruned: u64,
+    pub bytes_removed: u64,
+    pub indices: usize,
+    pub vector_index_created: bool,
+    pub error: Option<String>,
+}
+
+#[derive(Serialize)]
+pub struct OptimizeOutput {
+    pub success: bool,
+    pub tables: Vec<TableOptimizeResult>,
+}
+
+/// Compact small fragments, prune old versions and fold new rows into existing
+/// indexes (vector and FTS). The ANN index is created once a table passes
+/// `VECTOR_INDEX_MIN_ROWS`. Fragment counts are reported before and after.
+pub async fn execute(
+    conn: &Connection,
+    params: OptimizeParams,
+) -> lancedb::error::Result<OptimizeOutput> {
+    let table_names = db::table::list_tables(conn).await?;
+    let targets: Vec<String> = match params.project_id {
+        Some(project_id) if table_names.contains(&project_id) => vec![project_id],
+        Some(project_id) => {
+            info!("[optimize] Table not found: {project_id}, skipping");
+            vec![]
+        }
+        None => table_names,
+    };
+    let older_than =
+        chrono::Duration::hours(params.prune_older_than_hours.unwrap_or(DEFAULT_PRUNE_OLDER_THAN_HOURS));
+
+    let index_config = VectorIndexConfig::from_env();
+
+    let mut tables = Vec::with_capacity(targets.len());
+    for name in targets {
+        let mut result = TableOptimizeResult {
+            table: name.clone(),
+            ..Default::default()
+        };
+        // One failing table (e.g. a concurrent delete) must not block the rest
+        if let Err(e) = optimize_table(conn, &name, older_than, &index_config, &mut result).await {
+            warn!("[optimize] Failed to optimize {name}: {e}");
+            result.error = Some(e.to_string());
+        }
+        tables.push(result);
+    }
+
+    Ok(OptimizeOutput {
+        success: tables.iter().all(|t| t.error.is_none()),
+        tables,
+    })
+}
+
+async fn optimize_table(
+    conn: &Connection,
+    name: &str,
+    older_than: chrono::Duration,
+    index_config: &VectorIndexConfig,
+    result: &mut TableOptimizeResult,
+) -> lancedb::error::Result<()> {
+    let table = conn.open_table(name).execute().await?;
+
+    let before = table.stats().await?;
+    result.fragments_before = before.fragment_stats.num_fragments;
+    result.small_fragments_before = before.fragment_stats.num_small_fragments;
+    info!(
+        "[optimize] {name}: {} fragments ({} small), {} rows",
+        before.fragment_stats.num_fragments, before.fragment_stats.num_small_fragments, before.num_rows
+    );
+
+    let compaction = table
+        .optimize(OptimizeAction::Compact {
+            options: CompactionOptions::default(),
+            remap_options: None,
+        })
+        .await?;
+    if let Some(metrics) = compaction.compaction {
+        result.fragments_removed = metrics.fragments_removed;
+        result.fragments_added = metrics.fragments_added;
+    }
+
+    let prune = table
+        .optimize(OptimizeAction::Prune {
+            older_than: Some(older_than),
+            delete_unverified: Some(false),
+            error_if_tagged_old_versions: Some(false),
+        })
+        .await?;
+    if let Some(stats) = prune.prune {
+        result.versions_pruned = stats.old_versions;
+        result.bytes_removed = stats.bytes_removed;
+    }
+
+    let fts_column = if name == GRAPH_KEYWORDS_TABLE { "name" } else { "keywords" };
+    db::table::ensure_fts_index(&table, fts_column).await?;
+    result.vector_index_created = vector_index::ensure_vector_index(&table, index_config).await?;
+    table
+        .optimize(OptimizeAction::Index(OptimizeOptions::default()))
+        .await?;
+
+    let after = table.stats().await?;
+    result.fragments_after = after.fragment_stats.num_fragments;
+    result.small_fragments_after = after.fragment_stats.num_small_fragments;
+    result.indices = after.num_indices;
+    info!(
+        "[optimize] {name}: {} -> {} fragments, pruned {} versions ({} bytes)",
+        result.fragments_before, result.fragments_after, result.versions_pruned, result.bytes_removed
+    );
+    Ok(())
+}
@@ -2,12 +2,12 @@ use arrow_array::RecordBatch;
 use futures::TryStreamExt;
 use lance_index::scalar::FullTextSearchQuery;
 use lancedb::Connection;
-use lancedb::index::Index;
 use lancedb::query::{ExecutableQuery, QueryBase, Select};
 use serde::{Deserialize, Serialize};
 use tracing::info;
 
 use crate::client;
+use crate::db;
 use crate::db::model::{ScoredKeyword, GRAPH_KEYWORDS_TABLE};
 
 use super::get_graph_keywords::SELECT_COLUMNS;
@@ -39,11 +39,7 @@ pub async fn execute(
         params.query, params.project_id
     );
 
-    table
-        .create_index(&["name"], Index::FTS(Default::default()))
-        .replace(true)
-        .execute()
-        .await?;
+    db::table::ensure_fts_index(&table, "name").await?;
 
     let embedding = client::bedrock::generate_embedding(bedrock_client, &params.query)
         .await
@@ -4,7 +4,7 @@ use serde::{Deserialize, Serialize};
 use tracing::info;
 
 const DEFAULT_MODEL_ID: &str = "amazon.nova-2-multimodal-embeddings-v1:0";
-const EMBEDDING_DIMENSION: usize = 1024;
+pub const EMBEDDING_DIMENSION: usize = 1024;
 
 #[derive(Serialize)]
 struct EmbeddingRequest<'a> {
@@ -40,6 +40,73 @@ struct EmbeddingEntry {
     embedding: Vec<f32>,
 }
 
+/// Strip HTML tags and markdown headers for cleaner embedding input.
+///
+/// Mirrors `strip_markup` in the workflow's shared embeddings module, so a
+/// record gets the same vector whether the writer precomputed it or this
+/// service embeds it.
+pub fn strip_markup(text: &str) -> String {
+    // <[^>]+> -> ' '
+    let mut without_tags = String::with_capacity(text.len());
+    let mut rest = text;
+    while let Some(start) = rest.find('<') {
+        without_tags.push_str(&rest[..start]);
+        match rest[start + 1..].find('>') {
+            Some(len) if len > 0 => {
+                without_tags.push(' ');
+                rest = &rest[start + 1 + len + 1..];
+            }
+            _ => {
+                without_tags.push('<');
+                rest = &rest[start + 1..];
+            }
+        }
+    }
+    without_tags.push_str(rest);
+
+    // ^#{1,6}\s+ (multiline) -> ''
+    let chars: Vec<char> = without_tags.chars().collect();
+    let mut without_headers = String::with_capacity(without_tags.len());
+    let mut i = 0;
+    while i < chars.len() {
+        if i == 0 || chars[i - 1] == '\n' {
+            let hashes = chars[i..].iter().take(6).take_while(|c| **c == '#').count();
+            if hashes > 0 && chars.get(i + hashes).is_some_and(|c| c.is_whitespace()) {
+                i += hashes;
+                while i < chars.len() && chars[i].is_whitespace() {
+                    i += 1;
+                }
+                continue;
+            }
+        }
+        without_headers.push(chars[i]);
+        i += 1;
+    }
+
+    let unescaped = without_headers
+        .replace("&amp;", "&")
+        .replace("&lt;", "<")
+        .replace("&gt;", ">")
+        .replace("&nbsp;", " ");
+
+    // \n{3,} -> \n\n
+    let mut collapsed = String::with_capacity(unescaped.len());
+    let mut newlines = 0;
+    for c in unescaped.chars() {
+        if c == '\n' {
+            newlines += 1;
+            if newlines > 2 {
+                continue;
+            }
+        } else {
+            newlines = 0;
+        }
+        collapsed.push(c);
+    }
+
+    collapsed.trim().to_string()
+}
+
 pub async fn generate_embedding(client: &Client, text: &str) -> Result<Vec<f32>, aws_sdk_bedrockruntime::Error> {
     let value = text.trim();
     if value.is_empty() {
@@ -75,3 +142,21 @@ pub async fn generate_embedding(client: &Client, text: &str) -> Result<Vec<f32>,
 
     Ok(embedding)
 }
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn strip_markup_removes_tags_and_headers() {
+        let text = "## Title\n<p>A &amp; B</p>\n\n\n\n# Next\nbody";
+        assert_eq!(strip_markup(text), "Title\n A & B \n\nNext\nbody");
+    }
+
+    #[test]
+    fn strip_markup_keeps_non_markup() {
+        assert_eq!(strip_markup("a <> b #tag\n####### seven"), "a <> b #tag\n####### seven");
+        assert_eq!(strip_markup("x < y"), "x < y");
+        assert_eq!(strip_markup("  &lt;b&gt;  "), "<b>");
+    }
+}
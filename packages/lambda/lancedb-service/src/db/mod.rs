@@ -1,5 +1,6 @@
 pub mod model;
 pub mod table;
+pub mod vector_index;
 
 use std::env;
 use std::time::Duration;
@@ -55,14 +55,25 @@ pub struct ScoredSegment {
     pub keywords: String,
     pub file_uri: String,
     pub score: f32,
+    /// Raw leg scores kept through hybrid fusion
+    #[serde(skip_serializing_if = "Option::is_none")]
+    pub vector_distance: Option<f32>,
+    #[serde(skip_serializing_if = "Option::is_none")]
+    pub fts_score: Option<f32>,
 }
 
 impl ScoredSegment {
     pub fn from_batch(batch: &RecordBatch) -> Vec<Self> {
+        Self::from_batch_with_score(batch, "_relevance_score")
+    }
+
+    /// Build segments whose `score` is read from `score_column`
+    /// (`_distance` for vector queries, `_score` for FTS queries).
+    pub fn from_batch_with_score(batch: &RecordBatch, score_column: &str) -> Vec<Self> {
         let segments = Segment::from_batch(batch);
         let keywords_col = batch.column_by_name("keywords").unwrap().as_string::<i32>();
         let file_uris = batch.column_by_name("file_uri").unwrap().as_string::<i32>();
-        let scores = batch.column_by_name("_relevance_score").unwrap().as_primitive::<arrow_array::types::Float32Type>();
+        let scores = batch.column_by_name(score_column).unwrap().as_primitive::<arrow_array::types::Float32Type>();
 
         segments
             .into_iter()
@@ -72,6 +83,8 @@ impl ScoredSegment {
                 keywords: keywords_col.value(i).to_string(),
                 file_uri: file_uris.value(i).to_string(),
                 score: scores.value(i),
+                vector_distance: None,
+                fts_score: None,
             })
             .collect()
     }
@@ -1,6 +1,7 @@
 use std::sync::Arc;
 
 use arrow_schema::Schema;
+use lancedb::index::Index;
 use lancedb::{Connection, Table};
 use tracing::info;
 
@@ -29,6 +30,27 @@ pub async fn get_or_create_table(
     }
 }
 
+/// Create an FTS index on `column` unless the table already has one (or lacks the column).
+///
+/// Existing indexes are refreshed by the `optimize` action rather than rebuilt per query.
+pub async fn ensure_fts_index(table: &Table, column: &str) -> lancedb::error::Result<()> {
+    let schema = table.schema().await?;
+    if schema.field_with_name(column).is_err() {
+        return Ok(());
+    }
+
+    let indices = table.list_indices().await?;
+    if indices.iter().any(|index| index.columns.iter().any(|c| c == column)) {
+        return Ok(());
+    }
+
+    info!("[ensure_fts_index] Creating FTS index on {column}...");
+    table
+        .create_index(&[column], Index::FTS(Default::default()))
+        .execute()
+        .await
+}
+
 pub async fn drop_table(db: &Connection, project_id: &str) -> lancedb::error::Result<()> {
     info!("[drop_table] Dropping table: {project_id}");
     db.drop_table(project_id, &[]).await?;
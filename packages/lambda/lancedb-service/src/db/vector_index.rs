@@ -0,0 +1,155 @@
+use std::env;
+use std::str::FromStr;
+
+use lancedb::Table;
+use lancedb::index::Index;
+use lancedb::index::vector::{IvfHnswSqIndexBuilder, IvfPqIndexBuilder};
+use lancedb::query::VectorQuery;
+use tracing::info;
+
+pub const VECTOR_COLUMN: &str = "vector";
+
+#[derive(Clone, Copy, Debug, PartialEq)]
+pub enum VectorIndexKind {
+    IvfPq,
+    IvfHnswSq,
+}
+
+impl FromStr for VectorIndexKind {
+    type Err = String;
+
+    fn from_str(s: &str) -> Result<Self, Self::Err> {
+        match s.to_ascii_lowercase().as_str() {
+            "ivf_pq" => Ok(Self::IvfPq),
+            "ivf_hnsw_sq" | "hnsw" => Ok(Self::IvfHnswSq),
+            other => Err(format!("unknown vector index type: {other}")),
+        }
+    }
+}
+
+/// ANN index settings, read from the environment with defaults tuned for
+/// 1024-dim Nova embeddings.
+///
+/// | Env | Default |
+/// |-----|---------|
+/// | `VECTOR_INDEX_TYPE` | `ivf_pq` (`ivf_hnsw_sq` also supported) |
+/// | `VECTOR_INDEX_MIN_ROWS` | `10000` (tables below this stay brute-force) |
+/// | `VECTOR_INDEX_NUM_PARTITIONS` | `sqrt(rows)` |
+/// | `VECTOR_INDEX_NUM_SUB_VECTORS` | `64` (must divide the dimension) |
+/// | `VECTOR_INDEX_NPROBES` | `20` |
+/// | `VECTOR_INDEX_REFINE_FACTOR` | unset (no re-ranking) |
+#[derive(Clone, Debug)]
+pub struct VectorIndexConfig {
+    pub kind: VectorIndexKind,
+    pub min_rows: usize,
+    pub num_partitions: Option<u32>,
+    pub num_sub_vectors: u32,
+    pub nprobes: usize,
+    pub refine_factor: Option<u32>,
+}
+
+impl Default for VectorIndexConfig {
+    fn default() -> Self {
+        Self {
+            kind: VectorIndexKind::IvfPq,
+            min_rows: 10_000,
+            num_partitions: None,
+            num_sub_vectors: 64,
+            nprobes: 20,
+            refine_factor: None,
+        }
+    }
+}
+
+fn env_parse<T: FromStr>(key: &str) -> Option<T> {
+    env::var(key).ok().and_then(|v| v.parse().ok())
+}
+
+impl VectorIndexConfig {
+    pub fn from_env() -> Self {
+        let default = Self::default();
+        Self {
+            kind: env_parse("VECTOR_INDEX_TYPE").unwrap_or(default.kind),
+            min_rows: env_parse("VECTOR_INDEX_MIN_ROWS").unwrap_or(default.min_rows),
+            num_partitions: env_parse("VECTOR_INDEX_NUM_PARTITIONS"),
+            num_sub_vectors: env_parse("VECTOR_INDEX_NUM_SUB_VECTORS").unwrap_or(default.num_sub_vectors),
+            nprobes: env_parse("VECTOR_INDEX_NPROBES").unwrap_or(default.nprobes),
+            refine_factor: env_parse("VECTOR_INDEX_REFINE_FACTOR"),
+        }
+    }
+
+    /// Partition count for a table of `rows` rows (sqrt heuristic unless configured).
+    pub fn partitions_for(&self, rows: usize) -> u32 {
+        self.num_partitions
+            .unwrap_or_else(|| ((rows as f64).sqrt() as u32).clamp(1, 4096))
+    }
+
+    pub fn index(&self, rows: usize) -> Index {
+        let num_partitions = self.partitions_for(rows);
+        match self.kind {
+            VectorIndexKind::IvfPq => Index::IvfPq(
+                IvfPqIndexBuilder::default()
+                    .num_partitions(num_partitions)
+                    .num_sub_vectors(self.num_sub_vectors),
+            ),
+            VectorIndexKind::IvfHnswSq => {
+                Index::IvfHnswSq(IvfHnswSqIndexBuilder::default().num_partitions(num_partitions))
+            }
+        }
+    }
+
+    /// Apply query-time tuning, with optional per-request overrides.
+    pub fn tune_query(
+        &self,
+        query: VectorQuery,
+        nprobes: Option<usize>,
+        refine_factor: Option<u32>,
+    ) -> VectorQuery {
+        let query = query.nprobes(nprobes.unwrap_or(self.nprobes));
+        match refine_factor.or(self.refine_factor) {
+            Some(factor) if factor > 0 => query.refine_factor(factor),
+            _ => query,
+        }
+    }
+}
+
+pub async fn has_vector_index(table: &Table) -> lancedb::error::Result<bool> {
+    let indices = table.list_indices().await?;
+    Ok(indices
+        .iter()
+        .any(|index| index.columns.iter().any(|c| c == VECTOR_COLUMN)))
+}
+
+/// Create the ANN index once a table reaches `config.min_rows` rows.
+///
+/// Returns true when an index was created. Existing indexes are left to
+/// `OptimizeAction::Index`, which adds new rows without retraining.
+pub async fn ensure_vector_index(
+    table: &Table,
+    config: &VectorIndexConfig,
+) -> lancedb::error::Result<bool> {
+    let schema = table.schema().await?;
+    if schema.field_with_name(VECTOR_COLUMN).is_err() || has_vector_index(table).await? {
+        return Ok(false);
+    }
+
+    let rows = table.count_rows(None).await?;
+    if rows < config.min_rows {
+        info!(
+            "[ensure_vector_index] {} rows < {}, keeping brute-force search",
+            rows, config.min_rows
+        );
+        return Ok(false);
+    }
+
+    info!(
+        "[ensure_vector_index] Creating {:?} index over {rows} rows ({} partitions)",
+        config.kind,
+        config.partitions_for(rows)
+    );
+    table
+        .create_index(&[VECTOR_COLUMN], config.index(rows))
+        .execute()
+        .await?;
+    Ok(true)
+}
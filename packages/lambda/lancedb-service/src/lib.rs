@@ -14,6 +14,9 @@ pub enum LanceDbAction {
     #[serde(rename = "add_record")]
     AddRecord(add_record::AddRecordParams),
 
+    #[serde(rename = "add_records")]
+    AddRecords(add_records::AddRecordsParams),
+
     #[serde(rename = "delete_record")]
     DeleteRecord(delete_record::DeleteRecordParams),
 
@@ -47,6 +50,9 @@ pub enum LanceDbAction {
     #[serde(rename = "count")]
     Count(count::CountParams),
 
+    #[serde(rename = "optimize")]
+    Optimize(optimize::OptimizeParams),
+
     #[serde(rename = "drop_table")]
     DropTable(drop_table::DropTableParams),
 }
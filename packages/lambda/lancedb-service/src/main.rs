@@ -1,6 +1,6 @@
 use lambda_runtime::{Error, LambdaEvent, service_fn};
 use lancedb_service::LanceDbAction;
-use lancedb_service::action::{add_graph_keywords, add_record, count, delete_by_workflow, delete_graph_keywords_by_project_id, delete_record, drop_table, get_by_qa_ids, get_by_segment_ids, get_graph_keywords, get_segments_by_document_id, hybrid_search, list_tables, search_graph_keywords};
+use lancedb_service::action::{add_graph_keywords, add_record, add_records, count, delete_by_workflow, delete_graph_keywords_by_project_id, delete_record, drop_table, get_by_qa_ids, get_by_segment_ids, get_graph_keywords, get_segments_by_document_id, hybrid_search, list_tables, optimize, search_graph_keywords};
 use lancedb_service::db;
 use serde::Serialize;
 use tracing::info;
@@ -72,6 +72,9 @@ async fn handler(
         LanceDbAction::AddRecord(params) => add_record::execute(&conn, lambda_client, bedrock_client, params).await
             .map_err(|e| (500, e.to_string()))
             .and_then(|v| serde_json::to_value(v).map_err(|e| (500, e.to_string()))),
+        LanceDbAction::AddRecords(params) => add_records::execute(&conn, lambda_client, bedrock_client, params).await
+            .map_err(|e| (500, e.to_string()))
+            .and_then(|v| serde_json::to_value(v).map_err(|e| (500, e.to_string()))),
         LanceDbAction::SearchGraphKeywords(params) => search_graph_keywords::execute(&conn, bedrock_client, params).await
             .map_err(|e| (500, e.to_string()))
             .and_then(|v| serde_json::to_value(v).map_err(|e| (500, e.to_string()))),
@@ -87,6 +90,9 @@ async fn handler(
         LanceDbAction::DeleteGraphKeywordsByProjectId(params) => delete_graph_keywords_by_project_id::execute(&conn, params).await
             .map_err(|e| (500, e.to_string()))
             .and_then(|v| serde_json::to_value(v).map_err(|e| (500, e.to_string()))),
+        LanceDbAction::Optimize(params) => optimize::execute(&conn, params).await
+            .map_err(|e| (500, e.to_string()))
+            .and_then(|v| serde_json::to_value(v).map_err(|e| (500, e.to_string()))),
         LanceDbAction::DropTable(params) => drop_table::execute(&conn, params).await
             .map_err(|e| (500, e.to_string()))
             .and_then(|v| serde_json::to_value(v).map_err(|e| (500, e.to_string()))),
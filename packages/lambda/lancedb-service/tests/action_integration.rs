@@ -1,7 +1,7 @@
 use lancedb_service::action::{
-    add_graph_keywords, add_record, count, delete_by_workflow, delete_record, drop_table,
+    add_graph_keywords, add_record, add_records, count, delete_by_workflow, delete_record, drop_table,
     get_by_qa_ids, get_by_segment_ids, get_graph_keywords, get_segments_by_document_id,
-    hybrid_search, list_tables, search_graph_keywords,
+    hybrid_search, list_tables, optimize, search_graph_keywords,
 };
 use lancedb_service::db;
 use tracing::info;
@@ -169,6 +169,24 @@ async fn test_action_drop_table() {
     info!("output: {:?}", serde_json::to_value(&output).unwrap());
 }
 
+#[tokio::test]
+#[ignore]
+async fn test_action_optimize() {
+    init_tracing();
+    dotenvy::dotenv().ok();
+    let conn = db::connect().await.unwrap();
+    let output = optimize::execute(
+        &conn,
+        optimize::OptimizeParams {
+            project_id: Some("test".to_string()),
+            prune_older_than_hours: Some(0),
+        },
+    )
+    .await
+    .unwrap();
+    info!("output: {:?}", serde_json::to_value(&output).unwrap());
+}
+
 #[tokio::test]
 #[ignore]
 async fn test_action_get_graph_keywords() {
@@ -355,15 +373,57 @@ async fn test_action_add_record() {
             qa_index: Some(0),
             question: Some("테스트 질문".to_string()),
             content_combined: "테스트 컨텐츠입니다.".to_string(),
+            vector: None,
+            language: Some("ko".to_string()),
+            file_uri: "s3://test/file.pdf".to_string(),
+            file_type: "pdf".to_string(),
+            image_uri: None,
+            created_at: None,
+        },
+    )
+    .await
+    .unwrap();
+    info!("output: {:?}", serde_json::to_value(&output).unwrap());
+}
+
+#[tokio::test]
+#[ignore]
+async fn test_action_add_records() {
+    init_tracing();
+    dotenvy::dotenv().ok();
+    let conn = db::connect().await.unwrap();
+    let aws_config = aws_config::load_defaults(aws_config::BehaviorVersion::latest()).await;
+    let lambda_client = aws_sdk_lambda::Client::new(&aws_config);
+    let bedrock_client = aws_sdk_bedrockruntime::Client::new(&aws_config);
+    let records = (0..3)
+        .map(|i| add_record::AddRecordParams {
+            project_id: "test".to_string(),
+            workflow_id: "wf_test".to_string(),
+            document_id: "doc_test".to_string(),
+            segment_index: i,
+            qa_index: Some(0),
+            question: Some("테스트 질문".to_string()),
+            content_combined: format!("테스트 컨텐츠 {i}입니다."),
+            vector: None,
             language: Some("ko".to_string()),
             file_uri: "s3://test/file.pdf".to_string(),
             file_type: "pdf".to_string(),
             image_uri: None,
             created_at: None,
+        })
+        .collect();
+    let output = add_records::execute(
+        &conn,
+        &lambda_client,
+        &bedrock_client,
+        add_records::AddRecordsParams {
+            project_id: "test".to_string(),
+            records,
         },
     )
     .await
     .unwrap();
+    assert_eq!(output.added, 3);
     info!("output: {:?}", serde_json::to_value(&output).unwrap());
 }
 
@@ -386,6 +446,8 @@ async fn test_action_hybrid_search() {
             document_id: None,
             limit: Some(5),
             language: Some("ko".to_string()),
+            nprobes: None,
+            refine_factor: None,
         },
     )
     .await
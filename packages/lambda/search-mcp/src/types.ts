@@ -17,6 +17,8 @@ export interface HybridResult {
   content: string;
   keywords: string;
   score: number;
+  vector_distance?: number;
+  fts_score?: number;
 }
 
 export interface SearchAnswer {